@@ -0,0 +1,189 @@
+"""
+Measure what the desktop caching profile saves per request.
+
+Starts the Kolibri server the way the app does on Linux and macOS
+(``kolibri_app --run-as-server``), once with KOLIBRI_APP_DESKTOP_CACHING off
+and once with it on, signs in as a learner if credentials are given, and times
+sequential requests to the endpoints the Learn page loads. Prints the median
+latency per endpoint for both runs and the time saved per request.
+
+Run it against a KOLIBRI_HOME that already has a facility, a learner and
+content, so that requests go through a real session rather than an anonymous
+one.
+
+Usage:
+    python scripts/benchmark_caching.py --username learner --password pass --facility <facility id>
+    python scripts/benchmark_caching.py --requests 500 --paths /learn/ /api/auth/session/current/
+"""
+import argparse
+import http.client
+import http.cookies
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmark_http import stop_server
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+LEARN_PATHS = [
+    "/learn/",
+    "/api/auth/session/current/",
+    "/api/learn/learnerclassroom/",
+    "/api/content/channel/?available=true",
+]
+
+
+def start_server(port, caching):
+    env = os.environ.copy()
+    env["PYTHONPATH"] = os.pathsep.join(
+        [
+            os.path.join(ROOT_DIR, "src"),
+            os.path.join(ROOT_DIR, "kolibrisrc"),
+            env.get("PYTHONPATH", ""),
+        ]
+    )
+    env["KOLIBRI_HTTP_PORT"] = str(port)
+    env["KOLIBRI_APP_SERVER_IDLE_TIMEOUT"] = "0"
+    env["KOLIBRI_APP_WARMUP_ENABLED"] = "0"
+    env["KOLIBRI_APP_MULTIPROCESS_SERVING"] = "0"
+    env["KOLIBRI_APP_DESKTOP_CACHING"] = "1" if caching else "0"
+    return subprocess.Popen(
+        [sys.executable, "-m", "kolibri_app", "--run-as-server"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+class Client(object):
+    """A keep-alive connection that keeps the cookies the server sets."""
+
+    def __init__(self, port):
+        self.port = port
+        self.cookies = http.cookies.SimpleCookie()
+        self.connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+
+    def request(self, method, path, body=None):
+        headers = {"Accept": "application/json"}
+        if self.cookies:
+            headers["Cookie"] = "; ".join(
+                "{}={}".format(name, morsel.value)
+                for name, morsel in self.cookies.items()
+            )
+        if body is not None:
+            body = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+        except (OSError, http.client.HTTPException):
+            # The server closed the kept alive connection, retry on a new one.
+            self.connection.close()
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+        response.read()
+        for header in response.headers.get_all("Set-Cookie") or ():
+            self.cookies.load(header)
+        if response.status >= 400:
+            raise http.client.HTTPException(
+                "HTTP {} for {}".format(response.status, path)
+            )
+        return response
+
+    def close(self):
+        self.connection.close()
+
+
+def wait_until_serving(port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        client = Client(port)
+        try:
+            client.request("GET", "/api/public/info/")
+            return True
+        except (OSError, http.client.HTTPException):
+            time.sleep(0.5)
+        finally:
+            client.close()
+    return False
+
+
+def time_paths(client, paths, requests):
+    medians = {}
+    for path in paths:
+        # Warm up the caches and the lazily loaded code of the view.
+        for _ in range(5):
+            client.request("GET", path)
+        latencies = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            client.request("GET", path)
+            latencies.append(time.perf_counter() - start)
+        medians[path] = statistics.median(latencies)
+    return medians
+
+
+def run(args, caching):
+    server = start_server(args.port, caching)
+    try:
+        if not wait_until_serving(args.port, args.startup_timeout):
+            raise SystemExit("The server did not start")
+        client = Client(args.port)
+        if args.username:
+            client.request(
+                "POST",
+                "/api/auth/session/",
+                {
+                    "username": args.username,
+                    "password": args.password,
+                    "facility": args.facility,
+                },
+            )
+        medians = time_paths(client, args.paths, args.requests)
+        client.close()
+        return medians
+    finally:
+        stop_server(server)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--paths", nargs="+", default=LEARN_PATHS)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--username")
+    parser.add_argument("--password", default="")
+    parser.add_argument("--facility")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    uncached = run(args, caching=False)
+    cached = run(args, caching=True)
+    print(
+        "{} sequential requests per endpoint, {}\n".format(
+            args.requests, "as " + args.username if args.username else "anonymous"
+        )
+    )
+    print(
+        "{:<40} {:>12} {:>12} {:>12}".format(
+            "endpoint", "off [ms]", "on [ms]", "saved [ms]"
+        )
+    )
+    for path in args.paths:
+        print(
+            "{:<40} {:>12.2f} {:>12.2f} {:>12.2f}".format(
+                path,
+                uncached[path] * 1000,
+                cached[path] * 1000,
+                (uncached[path] - cached[path]) * 1000,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
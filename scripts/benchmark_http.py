@@ -0,0 +1,196 @@
+"""
+Measure how HTTP throughput scales with the number of server processes.
+
+For each worker count, starts the Kolibri server the way the app does on Linux
+(``kolibri_app --run-as-server``) with multi-process serving on, waits until
+every worker is accepting connections, and then has a pool of client processes
+hammer an API endpoint for a fixed time. Prints requests per second and latency
+percentiles per worker count.
+
+Run it against a KOLIBRI_HOME that already has a facility and content, so the
+numbers reflect a real classroom rather than an empty database.
+
+Usage:
+    python scripts/benchmark_http.py --workers 1 2 4 8
+    python scripts/benchmark_http.py --path /api/content/channel/ --clients 32
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def start_server(port, workers):
+    env = os.environ.copy()
+    env["PYTHONPATH"] = os.pathsep.join(
+        [
+            os.path.join(ROOT_DIR, "src"),
+            os.path.join(ROOT_DIR, "kolibrisrc"),
+            env.get("PYTHONPATH", ""),
+        ]
+    )
+    env["KOLIBRI_HTTP_PORT"] = str(port)
+    env["KOLIBRI_APP_SERVER_IDLE_TIMEOUT"] = "0"
+    env["KOLIBRI_APP_WARMUP_ENABLED"] = "0"
+    env["KOLIBRI_APP_MULTIPROCESS_SERVING"] = "1" if workers > 1 else "0"
+    env["KOLIBRI_APP_HTTP_WORKERS"] = str(workers)
+    return subprocess.Popen(
+        [sys.executable, "-m", "kolibri_app", "--run-as-server"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def count_listeners(port):
+    """Number of sockets listening on port, from /proc/net/tcp{,6}."""
+    hex_port = ":{:04X}".format(port)
+    listeners = 0
+    for table in ("/proc/net/tcp", "/proc/net/tcp6"):
+        try:
+            with open(table) as f:
+                next(f)
+                for line in f:
+                    fields = line.split()
+                    # State 0A is LISTEN
+                    if fields[1].endswith(hex_port) and fields[3] == "0A":
+                        listeners += 1
+        except OSError:
+            pass
+    return listeners
+
+
+def wait_until_serving(port, path, workers, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            request(port, path)
+            if count_listeners(port) >= workers:
+                return True
+        except (OSError, http.client.HTTPException):
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def request(port, path):
+    # A new connection for every request, so that the kernel spreads them across
+    # workers the way it would for many classroom devices.
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        connection.request("GET", path)
+        response = connection.getresponse()
+        response.read()
+    finally:
+        connection.close()
+    if response.status >= 500:
+        raise http.client.HTTPException("HTTP {}".format(response.status))
+
+
+def client(port, path, duration, results):
+    latencies = []
+    errors = 0
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        start = time.perf_counter()
+        try:
+            request(port, path)
+            latencies.append(time.perf_counter() - start)
+        except (OSError, http.client.HTTPException):
+            errors += 1
+    results.put((latencies, errors))
+
+
+def run_load(port, path, clients, duration):
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=client, args=(port, path, duration, results))
+        for _ in range(clients)
+    ]
+    for process in processes:
+        process.start()
+    latencies = []
+    errors = 0
+    for _ in processes:
+        client_latencies, client_errors = results.get()
+        latencies.extend(client_latencies)
+        errors += client_errors
+    for process in processes:
+        process.join()
+    return latencies, errors
+
+
+def stop_server(server):
+    os.killpg(server.pid, signal.SIGTERM)
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        os.killpg(server.pid, signal.SIGKILL)
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=2 * (os.cpu_count() or 1))
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--path", default="/api/public/info/")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    if not sys.platform.startswith("linux"):
+        raise SystemExit("Multi-process serving is only supported on Linux")
+
+    print(
+        "{} client processes, {} s per run, GET {}\n".format(
+            args.clients, args.duration, args.path
+        )
+    )
+    print(
+        "{:>8} {:>10} {:>10} {:>10} {:>8}".format(
+            "workers", "req/s", "p50 [ms]", "p95 [ms]", "errors"
+        )
+    )
+    baseline = None
+    for workers in args.workers:
+        server = start_server(args.port, workers)
+        try:
+            if not wait_until_serving(
+                args.port, args.path, workers, args.startup_timeout
+            ):
+                print("{:>8} server did not start".format(workers))
+                continue
+            latencies, errors = run_load(
+                args.port, args.path, args.clients, args.duration
+            )
+        finally:
+            stop_server(server)
+        if not latencies:
+            print("{:>8} no successful requests".format(workers))
+            continue
+        rps = len(latencies) / args.duration
+        baseline = baseline or rps
+        quantiles = statistics.quantiles(latencies, n=20)
+        print(
+            "{:>8} {:>10.1f} {:>10.1f} {:>10.1f} {:>8}   x{:.2f}".format(
+                workers,
+                rps,
+                statistics.median(latencies) * 1000,
+                quantiles[18] * 1000,
+                errors,
+                rps / baseline,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
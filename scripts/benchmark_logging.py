@@ -0,0 +1,153 @@
+"""
+Benchmark the app's logging pipeline.
+
+Compares, for the same number of records written from several threads, the
+time callers spend in log calls with a file handler attached directly to the
+logger against the queue handler that kolibri_app.logger uses. Also compares
+the old quadratic LoggerWriter with the current one, by writing a large burst
+of output in small chunks, the way a traceback or a chatty library does on the
+redirected sys.stdout and sys.stderr.
+
+Usage:
+    python scripts/benchmark_logging.py
+    python scripts/benchmark_logging.py --records 200000 --threads 8
+"""
+import argparse
+import io
+import logging
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+class QuadraticLoggerWriter(io.IOBase):
+    """The LoggerWriter as it was before the queue based pipeline."""
+
+    def __init__(self, writer):
+        self._writer = writer
+        self._msg = ""
+
+    def write(self, message):
+        self._msg = self._msg + message
+        while "\n" in self._msg:
+            pos = self._msg.find("\n")
+            self._writer(self._msg[:pos])
+            self._msg = self._msg[pos + 1 :]
+
+
+def make_logger(name, handler):
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.handlers = [handler]
+    return logger
+
+
+def time_log_calls(logger, records, threads):
+    per_thread = records // threads
+    durations = []
+
+    def run():
+        start = time.perf_counter()
+        for i in range(per_thread):
+            logger.info(
+                "Benchmark record %d from %s", i, threading.current_thread().name
+            )
+        durations.append(time.perf_counter() - start)
+
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start, max(durations)
+
+
+def benchmark_handlers(app_logger, log_dir, records, threads):
+    from kolibri.utils.logger import KolibriTimedRotatingFileHandler
+
+    print("{} records from {} threads".format(records, threads))
+    print("{:<24} {:>14} {:>18}".format("handler", "records/s", "max caller [s]"))
+
+    direct = KolibriTimedRotatingFileHandler(
+        os.path.join(log_dir, "direct.txt"), encoding="utf-8", when="midnight"
+    )
+    wall, caller = time_log_calls(make_logger("bench.direct", direct), records, threads)
+    direct.close()
+    print("{:<24} {:>14.0f} {:>18.3f}".format("file handler", records / wall, caller))
+
+    file_handler = KolibriTimedRotatingFileHandler(
+        os.path.join(log_dir, "queued.txt"), encoding="utf-8", when="midnight"
+    )
+    log_queue = queue.Queue(app_logger.LOG_QUEUE_SIZE)
+    handler = app_logger.BoundedQueueHandler(log_queue)
+    listener = app_logger.BlockingSentinelQueueListener(log_queue, file_handler)
+    listener.start()
+    start = time.perf_counter()
+    _, caller = time_log_calls(make_logger("bench.queued", handler), records, threads)
+    listener.stop()
+    wall = time.perf_counter() - start
+    file_handler.close()
+    print(
+        "{:<24} {:>14.0f} {:>18.3f}   ({} dropped)".format(
+            "queue handler", records / wall, caller, handler.dropped
+        )
+    )
+    print()
+
+
+def benchmark_writers(app_logger, log_dir, lines, chunk):
+    # A burst of output delivered in small writes, without newlines at the
+    # chunk boundaries.
+    burst = "".join(
+        "Traceback line {} of a long burst of output\n".format(i) for i in range(lines)
+    )
+    chunks = [burst[i : i + chunk] for i in range(0, len(burst), chunk)]
+
+    print("{} lines written in {}-character chunks".format(lines, chunk))
+    print("{:<24} {:>14} {:>14}".format("writer", "seconds", "lines/s"))
+
+    null_logger = make_logger("bench.writer", logging.NullHandler())
+    writers = [
+        ("quadratic", QuadraticLoggerWriter(null_logger.info)),
+        ("linear", app_logger.LoggerWriter(null_logger, logging.INFO)),
+        ("linear, level disabled", app_logger.LoggerWriter(null_logger, logging.DEBUG)),
+    ]
+    for name, writer in writers:
+        start = time.perf_counter()
+        for piece in chunks:
+            writer.write(piece)
+        elapsed = time.perf_counter() - start
+        print("{:<24} {:>14.3f} {:>14.0f}".format(name, elapsed, lines / elapsed))
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--lines", type=int, default=20000)
+    parser.add_argument("--chunk", type=int, default=4096)
+    args = parser.parse_args()
+
+    sys.path[:0] = [os.path.join(ROOT_DIR, "src"), os.path.join(ROOT_DIR, "kolibrisrc")]
+    with tempfile.TemporaryDirectory() as kolibri_home:
+        # Keep the benchmark's output out of the real log files.
+        os.environ["KOLIBRI_HOME"] = kolibri_home
+        stdout = sys.stdout
+        import kolibri_app.logger as app_logger
+
+        # kolibri_app.logger redirects stdout into the log, undo that to print.
+        sys.stdout = stdout
+        benchmark_handlers(app_logger, kolibri_home, args.records, args.threads)
+        benchmark_writers(app_logger, kolibri_home, args.lines, args.chunk)
+
+
+if __name__ == "__main__":
+    main()
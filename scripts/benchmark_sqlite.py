@@ -0,0 +1,155 @@
+"""
+Benchmark the SQLite tuning of kolibri_app.sqlite_tuning.
+
+Runs the same workload against a database in a temporary directory, once with
+the pragmas Kolibri sets itself and once with the app's tuned "default"
+profile: single-row writes, each in its own transaction the way Django commits
+in autocommit mode, then indexed point reads and range scans from several
+threads. Run it with --dir on the disk to measure, e.g. an SD card, since the
+gain from synchronous=NORMAL depends on how slow the disk is to flush.
+
+Usage:
+    python scripts/benchmark_sqlite.py
+    python scripts/benchmark_sqlite.py --writes 5000 --reads 50000 --threads 8 --dir /media/sdcard
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# What Kolibri runs on its connections without the app's tuning, see
+# kolibri.core.sqlite.pragmas
+KOLIBRI_PRAGMAS = [("journal_mode", "WAL"), ("wal_autocheckpoint", 500)]
+
+SCHEMA = """
+CREATE TABLE node (
+    id INTEGER PRIMARY KEY,
+    parent_id INTEGER,
+    title TEXT,
+    description TEXT
+);
+CREATE INDEX node_parent ON node (parent_id);
+"""
+
+
+def connect(path, pragmas, busy_timeout):
+    connection = sqlite3.connect(
+        path, timeout=100, isolation_level=None, check_same_thread=False
+    )
+    for name, value in pragmas:
+        connection.execute("PRAGMA {}={}".format(name, value)).fetchall()
+    if busy_timeout:
+        connection.execute("PRAGMA busy_timeout={}".format(busy_timeout))
+    return connection
+
+
+def run_writes(connection, writes):
+    text = "x" * 400
+    start = time.perf_counter()
+    for i in range(writes):
+        connection.execute("BEGIN")
+        connection.execute(
+            "INSERT INTO node (parent_id, title, description) VALUES (?, ?, ?)",
+            (i // 20, "Node {}".format(i), text),
+        )
+        connection.execute("COMMIT")
+    return time.perf_counter() - start
+
+
+def run_reads(path, pragmas, busy_timeout, reads, threads, max_id):
+    per_thread = reads // threads
+
+    def run():
+        connection = connect(path, pragmas, busy_timeout)
+        rng = random.Random(threading.get_ident())
+        for i in range(per_thread):
+            if i % 10:
+                connection.execute(
+                    "SELECT * FROM node WHERE id = ?", (rng.randint(1, max_id),)
+                ).fetchall()
+            else:
+                connection.execute(
+                    "SELECT id, title FROM node WHERE parent_id = ? ORDER BY title",
+                    (rng.randint(0, max_id // 20),),
+                ).fetchall()
+        connection.close()
+
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start
+
+
+def benchmark(name, directory, pragmas, busy_timeout, args):
+    path = os.path.join(directory, "{}.sqlite3".format(name.replace(" ", "_")))
+    connection = connect(path, pragmas, busy_timeout)
+    connection.executescript(SCHEMA)
+    write_time = run_writes(connection, args.writes)
+    connection.close()
+    read_time = run_reads(
+        path, pragmas, busy_timeout, args.reads, args.threads, args.writes
+    )
+    print(
+        "{:<16} {:>14.0f} {:>14.0f}".format(
+            name, args.writes / write_time, args.reads / read_time
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--reads", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument(
+        "--dir", help="Directory for the databases, a temporary one by default"
+    )
+    args = parser.parse_args()
+
+    sys.path[:0] = [os.path.join(ROOT_DIR, "src"), os.path.join(ROOT_DIR, "kolibrisrc")]
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        # The app options are read from a throwaway Kolibri home, so that only
+        # their defaults and KOLIBRI_APP_* environment variables apply.
+        os.environ["KOLIBRI_HOME"] = directory
+        from kolibri_app.options import get_app_option
+        from kolibri_app.sqlite_tuning import get_pragmas
+        from kolibri_app.sqlite_tuning import PROFILE_DEFAULT
+
+        tuned_pragmas = KOLIBRI_PRAGMAS + [
+            pragma
+            for pragma in get_pragmas(PROFILE_DEFAULT)
+            if pragma not in KOLIBRI_PRAGMAS
+        ]
+        print("SQLite {} in {}".format(sqlite3.sqlite_version, directory))
+        print(
+            "Tuned: {}".format(
+                ", ".join("{}={}".format(*pragma) for pragma in tuned_pragmas)
+            )
+        )
+        print(
+            "{} single-row write transactions, {} reads from {} threads".format(
+                args.writes, args.reads, args.threads
+            )
+        )
+        print("{:<16} {:>14} {:>14}".format("pragmas", "writes/s", "reads/s"))
+        benchmark("kolibri", directory, KOLIBRI_PRAGMAS, 0, args)
+        benchmark(
+            "tuned",
+            directory,
+            tuned_pragmas,
+            get_app_option("SQLITE_BUSY_TIMEOUT"),
+            args,
+        )
+
+
+if __name__ == "__main__":
+    main()
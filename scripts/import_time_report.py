@@ -0,0 +1,176 @@
+"""
+Report how long the kolibri_app startup path spends importing modules.
+
+Runs a fresh interpreter with ``-X importtime`` for each repetition and keeps the
+median per module, so that the numbers are stable enough to compare between
+branches. The report can be saved as JSON and later used as a baseline; any
+module whose cumulative import time grew by more than the threshold is listed
+and the script exits with a non-zero status.
+
+Usage:
+    python scripts/import_time_report.py
+    python scripts/import_time_report.py --json import_times.json
+    python scripts/import_time_report.py --baseline import_times.json
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+DEFAULT_MODULES = ["kolibri_app.__main__", "kolibri_app.application"]
+
+# The importtime lines end up in the log output once kolibri_app.logger has
+# replaced sys.stderr, so match them anywhere in the line.
+IMPORT_TIME_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def run_once(modules, kolibri_home):
+    env = os.environ.copy()
+    env["PYTHONPATH"] = os.pathsep.join(
+        [
+            os.path.join(ROOT_DIR, "src"),
+            os.path.join(ROOT_DIR, "kolibrisrc"),
+            env.get("PYTHONPATH", ""),
+        ]
+    )
+    # Keep the log output of the measured interpreter out of the real home folder.
+    env["KOLIBRI_HOME"] = kolibri_home
+    code = "; ".join("import {}".format(module) for module in modules)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        raise SystemExit("Importing {} failed".format(", ".join(modules)))
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_RE.search(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            timings[name] = {
+                "self": int(self_us),
+                "cumulative": int(cumulative_us),
+                "top_level": len(indent) == 1,
+            }
+    return timings
+
+
+def collect(modules, repeat):
+    runs = []
+    with tempfile.TemporaryDirectory() as kolibri_home:
+        for _ in range(repeat):
+            runs.append(run_once(modules, kolibri_home))
+
+    report = {}
+    for name in set().union(*runs):
+        samples = [run[name] for run in runs if name in run]
+        report[name] = {
+            "self": statistics.median(s["self"] for s in samples),
+            "cumulative": statistics.median(s["cumulative"] for s in samples),
+            "top_level": samples[0]["top_level"],
+        }
+    return report
+
+
+def print_table(title, rows):
+    print(title)
+    print("{:>12} {:>12}  {}".format("self [ms]", "cumul. [ms]", "module"))
+    for name, timing in rows:
+        print(
+            "{:>12.1f} {:>12.1f}  {}".format(
+                timing["self"] / 1000, timing["cumulative"] / 1000, name
+            )
+        )
+    print()
+
+
+def compare(report, baseline, threshold, min_delta_us):
+    regressions = []
+    for name, timing in report.items():
+        if name not in baseline:
+            if timing["cumulative"] >= min_delta_us and timing["top_level"]:
+                regressions.append((name, 0, timing["cumulative"]))
+            continue
+        before = baseline[name]["cumulative"]
+        after = timing["cumulative"]
+        if after - before >= min_delta_us and after > before * (1 + threshold):
+            regressions.append((name, before, after))
+    return sorted(regressions, key=lambda r: r[2] - r[1], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--module",
+        action="append",
+        dest="modules",
+        help="Module to import, can be given several times (default: the UI entry point)",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument("--baseline", help="Compare against a previously saved report")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Relative growth of cumulative time that counts as a regression",
+    )
+    parser.add_argument(
+        "--min-delta-ms",
+        type=float,
+        default=5.0,
+        help="Ignore changes smaller than this many milliseconds",
+    )
+    args = parser.parse_args()
+
+    modules = args.modules or DEFAULT_MODULES
+    report = collect(modules, args.repeat)
+
+    total = sum(t["cumulative"] for t in report.values() if t["top_level"])
+    print(
+        "Total import time for {}: {:.1f} ms (median of {} runs, {} modules)\n".format(
+            ", ".join(modules), total / 1000, args.repeat, len(report)
+        )
+    )
+    by_cumulative = sorted(
+        report.items(), key=lambda item: item[1]["cumulative"], reverse=True
+    )
+    print_table("Slowest by cumulative time", by_cumulative[: args.top])
+    by_self = sorted(report.items(), key=lambda item: item[1]["self"], reverse=True)
+    print_table("Slowest by self time", by_self[: args.top])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"modules": modules, "timings": report}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["timings"]
+        regressions = compare(
+            report, baseline, args.threshold, args.min_delta_ms * 1000
+        )
+        if regressions:
+            print("Import time regressions against {}:".format(args.baseline))
+            for name, before, after in regressions:
+                print(
+                    "  {}: {:.1f} ms -> {:.1f} ms".format(
+                        name, before / 1000, after / 1000
+                    )
+                )
+            sys.exit(1)
+        print("No import time regressions against {}".format(args.baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Precompress Kolibri's static assets for the app bundle.
+
+Writes a brotli sibling (x.js.br) next to every compressible file under a
+static directory of the given Kolibri source tree, and a gzip sibling (x.js.gz)
+where the wheel did not ship one. Kolibri's wheel truncates some assets to
+zero bytes and only ships their gzip sibling; those are compressed from the
+decompressed sibling. Siblings that would not be smaller are skipped, and files
+whose siblings are newer than they are not compressed again, so the script can
+run on every build.
+
+At runtime the app serves the smallest sibling the client accepts, see
+kolibri_app.static_files.
+
+Usage:
+    python scripts/precompress_static.py kolibrisrc/kolibri
+    python scripts/precompress_static.py kolibrisrc/kolibri --jobs 4
+"""
+import argparse
+import gzip
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Text based formats, the others (images, woff fonts...) are compressed already
+COMPRESSIBLE_EXTENSIONS = (
+    ".js",
+    ".mjs",
+    ".css",
+    ".svg",
+    ".json",
+    ".html",
+    ".txt",
+    ".xml",
+    ".ttf",
+    ".otf",
+    ".eot",
+)
+# A sibling is only kept when it is at most this fraction of the original
+MAX_RATIO = 0.95
+
+
+def find_assets(root):
+    for directory, _, names in os.walk(root):
+        if "static" not in directory.split(os.sep):
+            continue
+        for name in names:
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                yield os.path.join(directory, name)
+
+
+def is_fresh(sibling, sources):
+    try:
+        mtime = os.path.getmtime(sibling)
+    except OSError:
+        return False
+    return all(mtime >= os.path.getmtime(source) for source in sources)
+
+
+def read_original(path):
+    gz_path = path + ".gz"
+    if os.path.getsize(path) == 0 and os.path.exists(gz_path):
+        with gzip.open(gz_path, "rb") as f:
+            return f.read()
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def write_sibling(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def compress_asset(path):
+    """
+    Returns the (original, gzip, brotli) sizes, None for a sibling that is not
+    smaller, or None if no sibling was written.
+    """
+    import brotli
+
+    gz_path = path + ".gz"
+    br_path = path + ".br"
+    sources = [path] + ([gz_path] if os.path.exists(gz_path) else [])
+    if is_fresh(br_path, sources):
+        return None
+    data = read_original(path)
+    if not data:
+        return None
+    limit = len(data) * MAX_RATIO
+
+    gz_size = None
+    written = False
+    if os.path.exists(gz_path):
+        gz_size = os.path.getsize(gz_path)
+    else:
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(compressed) <= limit:
+            write_sibling(gz_path, compressed)
+            gz_size = len(compressed)
+            written = True
+
+    br_size = None
+    compressed = brotli.compress(data, quality=11)
+    if len(compressed) <= min(limit, gz_size or limit):
+        write_sibling(br_path, compressed)
+        br_size = len(compressed)
+        written = True
+    return (len(data), gz_size, br_size) if written else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("root", help="Kolibri source tree, e.g. kolibrisrc/kolibri")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        raise SystemExit("brotli is missing, install the build requirements first")
+
+    assets = sorted(find_assets(args.root))
+    totals = [0, 0, 0]
+    compressed = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        for sizes in executor.map(compress_asset, assets, chunksize=8):
+            if sizes is None:
+                continue
+            compressed += 1
+            original, gz_size, br_size = sizes
+            totals[0] += original
+            totals[1] += gz_size or original
+            totals[2] += br_size or gz_size or original
+    print(
+        "{} of {} assets compressed: {:.1f} MB, {:.1f} MB as gzip, {:.1f} MB as brotli".format(
+            compressed, len(assets), *(total / 1024 / 1024 for total in totals)
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -36,5 +36,5 @@ setup(
         "cffi==1.14.4",
         "pywin32==311; sys_platform == 'win32'",
     ],
-    extras_require={"dev": ["pre-commit"]},
+    extras_require={"dev": ["pre-commit", "pytest"]},
 )
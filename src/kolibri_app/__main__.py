@@ -1,10 +1,11 @@
+import atexit
 import datetime
 import sys
 from multiprocessing import freeze_support
 
-from kolibri_app.application import KolibriApp
 from kolibri_app.constants import WINDOWS
 from kolibri_app.logger import logging
+from kolibri_app.tracer import tracer
 
 
 def main():
@@ -12,6 +13,32 @@ def main():
         from kolibri_app.windows_utils import handle_windows_commands
 
         handle_windows_commands()
+    elif "--run-as-http-worker" in sys.argv:
+        # HTTP worker of a multi-process server, see http_workers
+        tracer.enabled = False
+        from kolibri_app.http_workers import run_worker
+
+        flag_index = sys.argv.index("--run-as-http-worker")
+        port, index = sys.argv[flag_index + 1 : flag_index + 3]
+        run_worker(int(port), int(index))
+        sys.exit(0)
+    elif "--run-as-server" in sys.argv:
+        # Server subprocess of the UI on Linux and macOS, see server_process_posix
+        from kolibri_app.log_forwarding import install_log_forwarding
+
+        # Before anything is logged, the UI process owns kolibri-app.txt
+        install_log_forwarding()
+        logging.info("Starting in server mode...")
+        tracer.process_name = "Kolibri server"
+
+        from kolibri_app.server_process_posix import ServerProcess
+
+        ServerProcess().run()
+        sys.exit(0)
+
+    tracer.process_name = "Kolibri UI"
+    # If the app exits before the first page loaded, keep what was recorded.
+    atexit.register(tracer.write)
 
     # Check for tray-only mode
     tray_only = "--tray-only" in sys.argv
@@ -23,6 +50,10 @@ def main():
     if tray_only:
         logging.info("Starting in tray-only mode")
 
+    # Imported here so that one-shot Windows commands (service configuration) and
+    # the server subprocess never pay for loading wx and the UI modules.
+    from kolibri_app.application import KolibriApp
+
     app = KolibriApp(tray_only=tray_only)
     app.MainLoop()
 
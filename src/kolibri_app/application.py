@@ -1,37 +1,53 @@
 import atexit
-import json
 import os
 import webbrowser
 
 import wx
-from kolibri.main import enable_plugin
 from kolibri.utils.conf import KOLIBRI_HOME
 
 from kolibri_app.constants import APP_NAME
 from kolibri_app.constants import WINDOWS
+from kolibri_app.i18n import _
 from kolibri_app.logger import logging
+from kolibri_app.rendezvous import StartupRendezvous
+from kolibri_app.startup_progress import FINISHED
+from kolibri_app.state import StateStore
+from kolibri_app.state import URL
+from kolibri_app.tracer import tracer
 from kolibri_app.view import KolibriView
+from kolibri_app.webview_data import configure_webview_data
 
+# Only the modules needed to put the first window on screen are imported here.
+# The server manager, the taskbar icon and anything that pulls in Django or the
+# Kolibri plugin machinery are imported on demand, see get_server_manager_class.
 if WINDOWS:
-    from kolibri_app.server_manager_windows import WindowsServerManager as ServerManager
-    from kolibri_app.taskbar_icon import KolibriTaskBarIcon
     from kolibri_app.windows_registry import is_webview2_installed
     import win32con
     import win32gui
     import ctypes
-else:
-    from kolibri_app.server_manager_posix import PosixServerManager as ServerManager
-    from kolibri.core.device.utils import app_initialize_url
 
 STATE_FILE = "app_state.json"
 
-# State keys
-URL = "URL"
-
 # Custom Windows message for showing UI
 WM_SHOW_KOLIBRI_UI = win32con.WM_USER + 1 if WINDOWS else None
 
 
+def get_server_manager_class():
+    if WINDOWS:
+        from kolibri_app.server_manager_windows import WindowsServerManager
+
+        return WindowsServerManager
+    from kolibri_app.options import get_app_option
+
+    if get_app_option("SERVER_MODE") == "subprocess":
+        from kolibri_app.server_manager_posix import PosixSubprocessServerManager
+
+        return PosixSubprocessServerManager
+    from kolibri_app.server_manager_posix import PosixServerManager
+
+    return PosixServerManager
+
+
 class KolibriApp(wx.App):
     def __init__(self, tray_only=False):
         self.tray_only = tray_only
@@ -39,6 +55,7 @@ class KolibriApp(wx.App):
         self.server_start_timer = None  # Timer to show "server starting" notifications
         super(KolibriApp, self).__init__()
 
+    @tracer.traced("KolibriApp.OnInit")
     def OnInit(self):
         """
         Start your UI and app run loop here.
@@ -46,9 +63,6 @@ class KolibriApp(wx.App):
 
         self.SetAppName(APP_NAME)
 
-        if WINDOWS:
-            self.task_bar_icon = KolibriTaskBarIcon(self)
-
         instance_name = "{}_{}".format(APP_NAME, wx.GetUserId())
         self._checker = wx.SingleInstanceChecker(instance_name)
 
@@ -62,24 +76,42 @@ class KolibriApp(wx.App):
                     logging.info("Sent show UI message to existing instance")
                 else:
                     logging.error("Could not find existing instance window")
-
-                # Clean up our taskbar icon if we created one
-                if hasattr(self, "task_bar_icon"):
-                    self.task_bar_icon.Destroy()
             return False  # Exit this instance
 
         # We are the first/only instance
-        if WINDOWS:
-            # Create a hidden window to receive messages
-            self.create_hidden_window()
+        # Label the run before any server subprocess is spawned, so it inherits it.
+        tracer.instant("app start", start_type=tracer.get_start_type(KOLIBRI_HOME))
 
-        enable_plugin("kolibri_app")
+        self.state = StateStore(os.path.join(KOLIBRI_HOME, STATE_FILE))
         self.windows = []
         self.kolibri_origin = None
         self.kolibri_url = None
+        self.watchdog = None
+        # The last startup progress event of the server, and the phases it finished
+        self.startup_progress = None
+        self.startup_phases = []
+        # Whether a window has loaded Kolibri, which signs the app user in
+        self.kolibri_loaded = False
+        # load_kolibri runs once both the UI and the server are ready, whichever is last
+        self.rendezvous = StartupRendezvous(self.load_kolibri)
+
+        if WINDOWS:
+            from kolibri_app.taskbar_icon import KolibriTaskBarIcon
+
+            self.task_bar_icon = KolibriTaskBarIcon(self)
+            # Create a hidden window to receive messages
+            self.create_hidden_window()
 
-        self.server_manager = ServerManager(self)
+        self.server_manager = get_server_manager_class()(self)
 
+        atexit.register(self.cleanup_on_exit)
+        # Start bootstrapping the server before building any windows, so that
+        # initialize() runs in parallel with the wx and WebView construction.
+        self.start_server()
+        # Before any window is created, WebView2 reads its data folder when it starts.
+        configure_webview_data()
+
+        self.rendezvous.ui_started()
         # Only create main window if not in tray-only mode and WebView2 is available
         if not self.tray_only:
             if WINDOWS and not is_webview2_installed():
@@ -87,10 +119,8 @@ class KolibriApp(wx.App):
                     "WebView2 not available, browser will open when server is ready"
                 )
             else:
-                self.create_kolibri_window()
-
-        atexit.register(self.cleanup_on_exit)
-        self.start_server()
+                self.restore_windows()
+        self.rendezvous.ui_ready()
 
         return True
 
@@ -166,6 +196,7 @@ class KolibriApp(wx.App):
             self.Bind(wx.EVT_TIMER, self.on_server_start_timer, self.server_start_timer)
             self.server_start_timer.Start(5000)
 
+        self.rendezvous.server_started()
         self.server_manager.start()
 
     def on_server_start_timer(self, event):
@@ -181,13 +212,31 @@ class KolibriApp(wx.App):
             self.server_start_timer.Stop()
             self.server_start_timer = None
 
+        self.stop_watchdog()
         self.server_manager.shutdown()
+        self.state.flush()
 
     def cleanup_on_exit(self):
         """Cleanup function called on app exit."""
         self.shutdown()
 
-    def create_kolibri_window(self, url=None):
+    def restore_windows(self):
+        """
+        Recreate the windows of the last session. The focused one loads right
+        away, the others are placeholders until they are first activated.
+        """
+        saved_windows = self.state.get_windows()
+        self.create_kolibri_window(saved=saved_windows[0] if saved_windows else None)
+        for saved in saved_windows[1:]:
+            self.create_kolibri_window(url=saved.get(URL), saved=saved, lazy=True)
+        if len(saved_windows) > 1:
+            logging.info(
+                "Restored {} windows, {} of them lazily".format(
+                    len(saved_windows), len(saved_windows) - 1
+                )
+            )
+
+    def create_kolibri_window(self, url=None, saved=None, lazy=False):
         # On Windows, check if WebView2 is available
         if WINDOWS and not is_webview2_installed():
             # WebView2 not available, open in browser instead
@@ -201,7 +250,7 @@ class KolibriApp(wx.App):
                 )
             return None
 
-        window = KolibriView(self, url=url)
+        window = KolibriView(self, url=url, saved=saved, lazy=lazy)
 
         self.windows.append(window)
         window.show()
@@ -218,27 +267,44 @@ class KolibriApp(wx.App):
 
         return True
 
-    def get_state(self):
-        try:
-            with open(
-                os.path.join(KOLIBRI_HOME, STATE_FILE), "r", encoding="utf-8"
-            ) as f:
-                return json.load(f)
-        except (IOError, PermissionError, ValueError):
-            return {}
-
     def save_state(self, view=None):
-        try:
-            state = {}
-            if view and view.get_url():
-                state[URL] = view.get_url()
-            with open(
-                os.path.join(KOLIBRI_HOME, STATE_FILE), "w", encoding="utf-8"
-            ) as f:
-                return json.dump(state, f)
-        except (IOError, ValueError):
-            return {}
+        """
+        Record the state of the open windows, or of view when it is the last
+        one and already closing. The store writes it out in the background.
+        """
+        if not self.kolibri_origin:
+            # Nothing but the loading page was shown, keep the last saved state.
+            return
+        views = self.windows or ([view] if view else [])
+        self.state.set_windows([window.get_state() for window in views])
+
+    def server_ready(self, listen_port, root_url=None):
+        """
+        Called by the server manager, from any thread, once Kolibri is serving.
+        """
+        tracer.mark("server ready")
+        self.rendezvous.server_ready(listen_port, root_url=root_url)
+
+    def on_startup_progress(self, events):
+        """
+        Called on the main thread with the startup progress events of the
+        server, see startup_progress, which the windows on the loading screen
+        show. Finished phases are logged with the time they took.
+        """
+        for event in events:
+            if event["status"] == FINISHED and "duration" in event:
+                name = event["phase"]
+                if event.get("detail"):
+                    name = "{} ({})".format(name, event["detail"])
+                self.startup_phases.append((name, event["duration"]))
+                logging.info(
+                    "Startup phase {} took {:.2f} s".format(name, event["duration"])
+                )
+            self.startup_progress = event
+        for window in self.windows:
+            window.show_progress(self.startup_progress)
 
+    @tracer.traced("load_kolibri")
     def load_kolibri(self, listen_port, root_url=None):
         self.kolibri_origin = "http://localhost:{}".format(listen_port)
 
@@ -247,22 +313,26 @@ class KolibriApp(wx.App):
             self.server_start_timer = None
 
         # Check for saved URL, which exists when the app was put to sleep last time it ran
-        saved_state = self.get_state()
-        logging.debug("Persisted State: {}".format(saved_state))
+        saved_windows = self.state.get_windows()
+        logging.debug("Persisted windows: {}".format(saved_windows))
 
         # activate app mode
         next_url = None
-        if URL in saved_state and saved_state[URL].startswith(self.kolibri_origin):
-            next_url = saved_state[URL]
+        saved_url = saved_windows[0].get(URL) if saved_windows else None
+        if saved_url and saved_url.startswith(self.kolibri_origin):
+            next_url = saved_url
 
         if root_url:
             # On Windows, root_url is provided by the server process
             final_url = f"{root_url}?next={next_url}" if next_url else root_url
         else:
             # On other platforms, we construct the URL ourselves
+            from kolibri.core.device.utils import app_initialize_url
+
             final_url = self.kolibri_origin + app_initialize_url(next_url=next_url)
         self.kolibri_url = final_url
         logging.info(f"Loading Kolibri at: {final_url}")
+        self.start_watchdog(listen_port)
 
         # Show notification that server is ready
         if WINDOWS:
@@ -282,6 +352,64 @@ class KolibriApp(wx.App):
         else:
             logging.info("Running in tray-only mode, URL ready for when UI is opened")
 
+    def on_kolibri_loaded(self):
+        self.kolibri_loaded = True
+        if tracer.mark("Kolibri shown"):
+            logging.info(
+                "Kolibri shown {:.0f} ms after the server was ready".format(
+                    (tracer.since("server ready") or 0) / 1000
+                )
+            )
+            if self.startup_phases:
+                logging.info(
+                    "Startup phases: {}".format(
+                        ", ".join(
+                            "{} {:.2f} s".format(name, duration)
+                            for name, duration in self.startup_phases
+                        )
+                    )
+                )
+            # This is the end of startup, write the trace for this run.
+            tracer.write()
+        # Restored windows that were activated while Kolibri was starting
+        for window in self.windows:
+            window.load_pending_url()
+
+    def start_watchdog(self, listen_port):
+        """Watch the server, again after every restart, as the port may change."""
+        from kolibri_app.options import get_app_option
+
+        self.stop_watchdog()
+        if not get_app_option("WATCHDOG_ENABLED"):
+            return
+        from kolibri_app.watchdog import ServerWatchdog
+
+        self.watchdog = ServerWatchdog(self, listen_port)
+        self.watchdog.start()
+
+    def stop_watchdog(self):
+        if self.watchdog is not None:
+            self.watchdog.stop()
+            self.watchdog = None
+
+    def on_server_unresponsive(self):
+        """Called by the watchdog when the server stopped answering requests."""
+        if WINDOWS:
+            self.task_bar_icon.notify_server_unresponsive()
+        else:
+            import wx.adv
+
+            wx.adv.NotificationMessage(
+                _("Kolibri is not responding"),
+                _(
+                    "Kolibri stopped responding. Restart Kolibri if this does not clear."
+                ),
+            ).Show()
+
+    def on_server_recovered(self):
+        if WINDOWS:
+            self.task_bar_icon.notify_server_recovered()
+
     def notify_server_failed(self):
         """Called when server fails to start."""
         if self.server_start_timer:
@@ -0,0 +1,22 @@
+from django.apps import AppConfig
+
+
+class KolibriAppConfig(AppConfig):
+    name = "kolibri_app"
+
+    def ready(self):
+        from django.conf import settings
+
+        from kolibri_app import log_files
+        from kolibri_app import sessions
+        from kolibri_app import sqlite_tuning
+        from kolibri_app import startup_progress
+        from kolibri_app import static_files
+
+        sqlite_tuning.install()
+        static_files.install()
+        startup_progress.install()
+        # Catch up on the logs rotated while no app process was running
+        log_files.log_maintenance.request()
+        if settings.SESSION_ENGINE == sessions.__name__:
+            sessions.install()
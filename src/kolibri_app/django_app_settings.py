@@ -1,4 +1,35 @@
 from kolibri.deployment.default.settings.base import *  # noqa
 
+from kolibri_app.options import get_app_option
+
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
 SESSION_COOKIE_AGE = 52560000
+
+# First, so that the time spent in Kolibri's middleware is measured too.
+MIDDLEWARE = ["kolibri_app.metrics.MetricsMiddleware"] + MIDDLEWARE  # noqa: F405
+
+# Keep the SQLite connections of each server thread open across requests, so a
+# request does not pay for opening and tuning them, see sqlite_tuning.
+for _database in DATABASES.values():  # noqa: F405
+    if _database["ENGINE"].endswith("sqlite3"):
+        _database["CONN_MAX_AGE"] = get_app_option("SQLITE_CONN_MAX_AGE")
+
+# Desktop caching profile, see sessions. Every process has its own in-memory
+# cache, so with several HTTP workers a session changed in one of them would
+# be stale in the others; the session engine then stays Kolibri's.
+_local_cache = CACHES["default"]["BACKEND"].endswith("LocMemCache")  # noqa: F405
+if get_app_option("DESKTOP_CACHING"):
+    if not (_local_cache and get_app_option("MULTIPROCESS_SERVING")):
+        SESSION_ENGINE = "kolibri_app.sessions"
+    # Django only caches compiled templates by default outside of DEBUG, keep
+    # doing so when Kolibri runs with DEBUG on as well.
+    TEMPLATES[0]["APP_DIRS"] = False  # noqa: F405
+    TEMPLATES[0]["OPTIONS"]["loaders"] = [  # noqa: F405
+        (
+            "django.template.loaders.cached.Loader",
+            [
+                "django.template.loaders.filesystem.Loader",
+                "django.template.loaders.app_directories.Loader",
+            ],
+        )
+    ]
@@ -0,0 +1,205 @@
+"""
+Fast path for initialize() on installs that have not changed since the last start.
+
+Besides setting up Django, initialize() checks on every start whether Kolibri or
+its plugins were upgraded, runs the updates and migrations that calls for,
+checks that the databases are migrated and provisions the device from a file.
+On an install that has not changed, none of that has anything to do, but it
+still delays the server. So after a full initialize() the app stores a
+fingerprint of what those steps depend on in KOLIBRI_HOME, and a later start
+that computes the same fingerprint calls initialize(skip_update=True).
+
+The fingerprint covers the Kolibri and app versions, the version Kolibri last
+upgraded its data to, the installed, disabled and updated plugins, options.ini,
+and the schema of every SQLite database: the schema_version SQLite increments on
+every schema change and the migrations Django recorded. The databases are read
+directly, as the decision has to be made before Django is set up. Any mismatch,
+or anything that cannot be read, takes the full path.
+
+Kolibri's OPTIONS must not be read before initialize(), as that loads the
+plugin registry, after which the full path could not update the plugins. So
+the few Kolibri options the fingerprint needs are read from their environment
+variables and options.ini directly, as get_app_option does.
+"""
+import hashlib
+import json
+import os
+import pathlib
+import sqlite3
+
+from kolibri.utils.conf import KOLIBRI_HOME
+
+from kolibri_app.logger import logging
+from kolibri_app.options import get_app_option
+from kolibri_app.options import read_options_ini
+from kolibri_app.startup_progress import INITIALIZE
+from kolibri_app.startup_progress import PROGRESS
+from kolibri_app.startup_progress import progress
+
+FINGERPRINT_FILE = os.path.join(KOLIBRI_HOME, "app_initialize_fingerprint.json")
+
+
+def get_database_schema(path):
+    """The schema state of a SQLite database, read without writing to it."""
+    uri = pathlib.Path(path).resolve().as_uri() + "?mode=ro"
+    connection = sqlite3.connect(uri, uri=True)
+    try:
+        (schema_version,) = connection.execute("PRAGMA schema_version").fetchone()
+        migrations, last_migration = connection.execute(
+            "SELECT COUNT(*), MAX(id) FROM django_migrations"
+        ).fetchone()
+    finally:
+        connection.close()
+    return {
+        "schema_version": schema_version,
+        "migrations": migrations,
+        "last_migration": last_migration,
+    }
+
+
+def get_kolibri_option(section, name):
+    """
+    A Kolibri option as a string, from its environment variables, options.ini
+    or its default, without reading OPTIONS.
+    """
+    from kolibri.utils.options import base_option_spec
+
+    spec = base_option_spec[section][name]
+    for envvar in ("KOLIBRI_{}".format(name),) + tuple(spec.get("envvars", ())):
+        if envvar in os.environ:
+            return os.environ[envvar]
+    value = read_options_ini(section).get(name)
+    if value is None:
+        value = spec.get("default")
+    return value or ""
+
+
+def get_kolibri_path_option(section, name):
+    """A path option, resolved against KOLIBRI_HOME as Kolibri does."""
+    value = get_kolibri_option(section, name)
+    if not value:
+        return value
+    return os.path.join(KOLIBRI_HOME, os.path.expanduser(value))
+
+
+def get_database_paths():
+    """The SQLite databases Kolibri migrates, by name, see sqlite_db_names."""
+    from kolibri.deployment.default.sqlite_db_names import (
+        ADDITIONAL_SQLITE_DATABASES,
+    )
+    from kolibri.deployment.default.sqlite_db_names import JOB_STORAGE
+
+    paths = {
+        "default": os.path.join(
+            KOLIBRI_HOME,
+            get_kolibri_option("Database", "DATABASE_NAME") or "db.sqlite3",
+        )
+    }
+    for name in ADDITIONAL_SQLITE_DATABASES:
+        if name == JOB_STORAGE:
+            paths[name] = get_kolibri_path_option("Tasks", "JOB_STORAGE_FILEPATH")
+        else:
+            paths[name] = os.path.join(KOLIBRI_HOME, "{}.sqlite3".format(name))
+    return paths
+
+
+def get_options_digest():
+    try:
+        with open(os.path.join(KOLIBRI_HOME, "options.ini"), "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def compute_fingerprint():
+    """
+    The fingerprint of the install, or None if it cannot be computed and
+    Kolibri has to take the full path. Does not read Kolibri's OPTIONS.
+    """
+    import kolibri
+    from kolibri.plugins import config
+    from kolibri.utils.main import get_version
+
+    import kolibri_app
+
+    if get_kolibri_option("Database", "DATABASE_ENGINE") != "sqlite":
+        return None
+    # Provisioning from a file needs to check the device in Django
+    provision_file = get_kolibri_path_option("Paths", "AUTOMATIC_PROVISION_FILE")
+    if provision_file and os.path.exists(provision_file):
+        return None
+
+    databases = {}
+    for name, path in get_database_paths().items():
+        try:
+            databases[name] = get_database_schema(path)
+        except (OSError, sqlite3.Error) as e:
+            logging.debug(
+                "Could not read the schema of database {}: {}".format(name, e)
+            )
+            return None
+
+    return {
+        "kolibri_version": kolibri.__version__,
+        "app_version": kolibri_app.__version__,
+        "data_version": get_version(),
+        "installed_plugins": sorted(config["INSTALLED_PLUGINS"]),
+        "disabled_plugins": sorted(config["DISABLED_PLUGINS"]),
+        "updated_plugins": sorted(config["UPDATED_PLUGINS"]),
+        "options": get_options_digest(),
+        "databases": databases,
+    }
+
+
+def read_fingerprint():
+    try:
+        with open(FINGERPRINT_FILE, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_fingerprint(fingerprint):
+    try:
+        with open(FINGERPRINT_FILE, "w") as f:
+            json.dump(fingerprint, f, indent=2, sort_keys=True)
+    except OSError as e:
+        logging.warning("Could not store the initialize fingerprint: {}".format(e))
+
+
+def remove_fingerprint():
+    try:
+        os.remove(FINGERPRINT_FILE)
+    except OSError:
+        pass
+
+
+def initialize_kolibri():
+    """
+    Call initialize(), skipping its update checks when the install has not
+    changed since the last full initialize(). Returns whether it did.
+    Must be called after the app plugin has been enabled.
+    """
+    from kolibri.main import initialize
+
+    if not get_app_option("INITIALIZE_FAST_PATH"):
+        initialize()
+        return False
+
+    fingerprint = compute_fingerprint()
+    if fingerprint is not None and fingerprint == read_fingerprint():
+        logging.info("Install unchanged since the last start, skipping update checks")
+        progress.report(INITIALIZE, PROGRESS, detail="fast path")
+        initialize(skip_update=True)
+        return True
+
+    logging.info("Install changed since the last start, running update checks")
+    progress.report(INITIALIZE, PROGRESS, detail="update checks")
+    # Leave no fingerprint behind should the full path fail half way
+    remove_fingerprint()
+    initialize()
+    # Migrations and plugin updates change what the fingerprint covers
+    fingerprint = compute_fingerprint()
+    if fingerprint is not None:
+        write_fingerprint(fingerprint)
+    return False
@@ -0,0 +1,244 @@
+"""
+Multi-process HTTP serving on Linux.
+
+A single Kolibri process serves every request on one core, which is what limits
+a laptop serving a whole classroom over the LAN. With the KolibriApp
+MULTIPROCESS_SERVING option on, the main Kolibri HTTP server binds its socket
+with SO_REUSEPORT, and once it is SERVING a supervisor starts HTTP_WORKERS - 1
+worker processes that bind the same port. The kernel then spreads incoming
+connections across all of them.
+
+The workers are plain WSGI servers for Kolibri's application: they have no
+process bus of their own, so the UI still sees a single SERVING event and URL,
+and services like the task workers and the zip content server keep running only
+in the main process. The supervisor restarts workers that exit, backing off
+when they keep failing, and stops them when the main server stops.
+"""
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from threading import Event
+from threading import Thread
+
+from magicbus.plugins import SimplePlugin
+
+from kolibri_app.logger import logging
+from kolibri_app.options import get_app_option
+
+WORKER_FLAG = "--run-as-http-worker"
+
+# How often the supervisor checks on its workers
+MONITOR_INTERVAL = 1
+MIN_RESTART_DELAY = 1
+MAX_RESTART_DELAY = 60
+# A worker that ran for this long is considered healthy again
+HEALTHY_UPTIME = 60
+
+PR_SET_PDEATHSIG = 1
+
+
+def multiprocess_serving_supported():
+    # SO_REUSEPORT only balances connections across sockets on Linux, on macOS
+    # the last socket bound gets them all.
+    return sys.platform.startswith("linux") and hasattr(socket, "SO_REUSEPORT")
+
+
+def multiprocess_serving_enabled():
+    if not get_app_option("MULTIPROCESS_SERVING"):
+        return False
+    if not multiprocess_serving_supported():
+        logging.warning("Multi-process HTTP serving is only supported on Linux")
+        return False
+    return get_worker_count() > 1
+
+
+def get_worker_count():
+    """
+    Total number of processes serving HTTP, including the main server process.
+    """
+    return get_app_option("HTTP_WORKERS") or os.cpu_count() or 1
+
+
+def _http_servers(bus):
+    """
+    The cheroot servers of the server plugins subscribed to the bus.
+    """
+    servers = []
+    for callbacks in bus.listeners.values():
+        for callback in callbacks:
+            httpserver = getattr(
+                getattr(callback, "__self__", None), "httpserver", None
+            )
+            if httpserver is not None and httpserver not in servers:
+                servers.append(httpserver)
+    return servers
+
+
+def enable_reuse_port(bus):
+    """
+    Make the HTTP servers of the bus bind with SO_REUSEPORT, which has to
+    happen before they bind for the workers to be able to share the port.
+    Returns False if the installed cheroot does not support it.
+    """
+    servers = _http_servers(bus)
+    if not servers or not all(hasattr(server, "reuse_port") for server in servers):
+        logging.warning(
+            "The HTTP server does not support SO_REUSEPORT, serving from a single process"
+        )
+        return False
+    for server in servers:
+        server.reuse_port = True
+    return True
+
+
+def _worker_command(port, index):
+    args = [WORKER_FLAG, str(port), str(index)]
+    if getattr(sys, "frozen", False):
+        cmd = [sys.executable] + args
+    else:
+        cmd = [sys.executable, "-m", "kolibri_app"] + args
+    env = os.environ.copy()
+    env["DJANGO_SETTINGS_MODULE"] = "kolibri_app.django_app_settings"
+    return cmd, env
+
+
+class Worker(object):
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.started = None
+        self.failures = 0
+        self.restart_at = None
+
+
+class HttpWorkerSupervisor(SimplePlugin):
+    """
+    Starts the worker processes once the main server is SERVING and keeps them
+    running until the bus stops.
+    """
+
+    def __init__(self, bus, worker_count):
+        super().__init__(bus)
+        self.port = None
+        self.workers = [Worker(index) for index in range(1, worker_count)]
+        self.stop_event = Event()
+        self.monitor_thread = None
+        self.bus.subscribe("SERVING", self.on_server_start)
+
+    def on_server_start(self, port):
+        if self.port is not None:
+            return
+        self.port = port
+        self.stop_event.clear()
+        logging.info(
+            "Starting {} HTTP worker processes on port {}".format(
+                len(self.workers), port
+            )
+        )
+        for worker in self.workers:
+            self._spawn(worker)
+        self.monitor_thread = Thread(target=self._monitor, daemon=True)
+        self.monitor_thread.start()
+
+    def STOP(self):
+        self.stop_event.set()
+        if self.monitor_thread:
+            self.monitor_thread.join(timeout=5)
+        for worker in self.workers:
+            if worker.process and worker.process.poll() is None:
+                worker.process.terminate()
+        for worker in self.workers:
+            if worker.process:
+                try:
+                    worker.process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    logging.warning(
+                        "HTTP worker {} did not stop, killing it".format(worker.index)
+                    )
+                    worker.process.kill()
+        self.port = None
+
+    def _spawn(self, worker):
+        cmd, env = _worker_command(self.port, worker.index)
+        try:
+            worker.process = subprocess.Popen(cmd, env=env, stdin=subprocess.DEVNULL)
+        except (OSError, subprocess.SubprocessError) as e:
+            logging.error("Failed to start HTTP worker {}: {}".format(worker.index, e))
+            self._schedule_restart(worker)
+            return
+        worker.started = time.monotonic()
+        worker.restart_at = None
+        logging.info(
+            "Started HTTP worker {} (PID: {})".format(worker.index, worker.process.pid)
+        )
+
+    def _schedule_restart(self, worker):
+        worker.process = None
+        worker.failures += 1
+        delay = min(MIN_RESTART_DELAY * 2 ** (worker.failures - 1), MAX_RESTART_DELAY)
+        worker.restart_at = time.monotonic() + delay
+        logging.info("Restarting HTTP worker {} in {} s".format(worker.index, delay))
+
+    def _monitor(self):
+        while not self.stop_event.wait(MONITOR_INTERVAL):
+            now = time.monotonic()
+            for worker in self.workers:
+                if worker.process is not None:
+                    returncode = worker.process.poll()
+                    if returncode is None:
+                        continue
+                    logging.warning(
+                        "HTTP worker {} exited with code {}".format(
+                            worker.index, returncode
+                        )
+                    )
+                    if now - worker.started > HEALTHY_UPTIME:
+                        worker.failures = 0
+                    self._schedule_restart(worker)
+                elif worker.restart_at is not None and now >= worker.restart_at:
+                    self._spawn(worker)
+
+
+def run_worker(port, index):
+    """
+    Entry point of worker process number index: serve Kolibri's WSGI
+    application on the port the main server is already listening on.
+    """
+    from cheroot import wsgi
+    from kolibri.main import initialize
+    from kolibri.utils.conf import OPTIONS
+
+    from kolibri_app.log_forwarding import install_worker_log
+
+    install_worker_log(index)
+
+    if sys.platform.startswith("linux"):
+        # Do not outlive the server process if it dies without stopping us.
+        import ctypes
+
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.prctl(PR_SET_PDEATHSIG, signal.SIGTERM)
+
+    # The main process already ran the migrations and plugin updates.
+    initialize(skip_update=True)
+
+    from kolibri.deployment.default.wsgi import application
+
+    address = OPTIONS["Deployment"].get("LISTEN_ADDRESS") or "0.0.0.0"
+    server = wsgi.Server(
+        (address, port),
+        application,
+        numthreads=OPTIONS["Server"]["CHERRYPY_THREAD_POOL"],
+        reuse_port=True,
+    )
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, stop)
+    logging.info("HTTP worker {} serving on port {}".format(os.getpid(), port))
+    # safe_start stops the server cleanly on KeyboardInterrupt.
+    server.safe_start()
@@ -1,10 +1,25 @@
-import gettext
 import locale
 import logging
 import subprocess
-from importlib.resources import files
 
 from kolibri_app.constants import MAC
+from kolibri_app.resource_cache import ResourceCache
+from kolibri_app.tracer import tracer
+
+
+def to_language(locale_name):
+    """
+    Turn a locale name (en_US) into a language name (en-us).
+    Mirrors django.utils.translation.to_language, so that the UI process does not
+    have to import Django just to find the right loading page.
+    """
+    p = locale_name.find("_")
+    if p >= 0:
+        return locale_name[:p].lower() + "-" + locale_name[p + 1 :].lower()
+    return locale_name.lower()
+
+
+_i18n_span = tracer.start_span("i18n resolution")
 
 try:
     languages = [
@@ -24,26 +39,10 @@ if not languages and MAC:
 if not languages:
     languages = ["en"]
 
-nelangs = []
-for lang in languages:
-    for nelang in gettext._expand_lang(lang):
-        if nelang not in nelangs:
-            nelangs.append(nelang)
+# Resolves the catalog, loading page and icons for these languages, see resource_cache.
+resources = ResourceCache(languages)
 
-mo_file = None
-
-locale_dir = files("kolibri_app") / "locales"
-
-for lang in nelangs:
-    mo_file = locale_dir / lang / "LC_MESSAGES" / "wxapp.mo"
-    if mo_file.is_file():
-        break
-
-if mo_file is not None and mo_file.is_file():
-    with mo_file.open("rb") as f:
-        t = gettext.GNUTranslations(f)
-else:
-    t = gettext.NullTranslations()
+t = resources.translations()
 
 locale_info = t.info()
 # We have not been able to reproduce, but we have seen this happen in user tracebacks, so
@@ -53,4 +52,6 @@ if "language" not in locale_info:
     locale_info["language"] = "en"
 _ = t.gettext
 
+_i18n_span.finish(language=locale_info["language"])
+
 logging.debug("Locale info = {}".format(locale_info))
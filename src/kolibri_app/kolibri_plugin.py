@@ -6,7 +6,10 @@ from kolibri.plugins.hooks import register_hook
 
 
 class KolibriApp(KolibriPluginBase):
+    kolibri_options = "options"
     kolibri_option_defaults = "options_defaults"
+    # The metrics endpoint and dashboard, see metrics
+    root_view_urls = "root_urls"
 
 
 @register_hook
@@ -0,0 +1,54 @@
+"""
+The server's startup progress on the loading screen.
+
+The loading screen is generated by Kolibri and has no place for the progress
+events of startup_progress, so KolibriView.show_progress injects the script of
+progress_script into it, which shows the progress text at its bottom.
+
+This module does not import wx, so that the texts can be tested without it.
+"""
+import json
+
+from kolibri_app.i18n import _
+from kolibri_app.startup_progress import INITIALIZE
+from kolibri_app.startup_progress import MIGRATIONS
+from kolibri_app.startup_progress import SERVER
+from kolibri_app.startup_progress import WARM_UP
+
+# Shows a startup progress text at the bottom of the loading screen
+PROGRESS_SCRIPT = """(function (text) {
+    var element = document.getElementById("kolibri-app-progress");
+    if (!element) {
+        element = document.createElement("div");
+        element.id = "kolibri-app-progress";
+        element.setAttribute("role", "status");
+        element.style.cssText = "position: fixed; left: 0; right: 0; bottom: 48px;"
+            + "text-align: center; font-family: sans-serif; font-size: 14px; color: #666;";
+        document.body.appendChild(element);
+    }
+    element.textContent = text;
+})(%s);"""
+
+
+def get_progress_text(event):
+    """What the loading screen says about a startup progress event."""
+    phase = event["phase"]
+    if phase == MIGRATIONS and event.get("total"):
+        return _("Updating the database ({done} of {total})").format(
+            done=event["done"], total=event["total"]
+        )
+    texts = {
+        INITIALIZE: _("Starting Kolibri"),
+        MIGRATIONS: _("Updating the database"),
+        SERVER: _("Starting the server"),
+        WARM_UP: _("Almost ready"),
+    }
+    return texts.get(phase)
+
+
+def progress_script(event):
+    """The script showing a startup progress event, None if it shows nothing."""
+    text = get_progress_text(event)
+    if not text:
+        return None
+    return PROGRESS_SCRIPT % json.dumps(text)
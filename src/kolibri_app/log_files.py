@@ -0,0 +1,197 @@
+"""
+Compressed, size-capped log retention.
+
+Kolibri's handler moves rotated logs to LOG_ROOT/archive as <name>-<date>.txt.
+There they are gzipped by a background thread, the app's as well as Kolibri's,
+so neither the rollover nor the logging call that triggered it ever waits for
+compression. The same thread enforces retention: at most LOG_RETENTION_COUNT
+rotated files per log, and at most LOG_RETENTION_BYTES for all rotated files
+together, removing the oldest first. The handler keeps its own cap of
+backupCount files per log as well.
+
+The maintenance runs after every rollover, and once per start when Kolibri is
+initialized, to catch up on the logs rotated while no app process was running.
+"""
+import gzip
+import logging as log
+import os
+import queue
+import re
+import shutil
+import threading
+
+from kolibri.utils.conf import LOG_ROOT
+from kolibri.utils.logger import KolibriTimedRotatingFileHandler
+
+from kolibri_app.options import get_app_option
+
+COMPRESSED_SUFFIX = ".gz"
+
+ARCHIVE_DIR = "archive"
+
+# <name>-<date>.txt[.gz], as KolibriTimedRotatingFileHandler names rotated logs
+ROTATED_LOG_RE = re.compile(
+    r"^(?P<name>.+)-(?P<date>\d{4}-\d{2}-\d{2}(?:_\d{2}(?:-\d{2}){0,2})?)\.txt(?P<gz>\.gz)?$"
+)
+
+# The cap of rotated files per log of the handler itself, as before retention
+# was configurable
+DEFAULT_BACKUP_COUNT = 30
+
+logger = log.getLogger("kolibri_app")
+
+
+def _rotated_logs(log_root):
+    """
+    (path, base name, date, compressed) for every rotated log in the archive of
+    log_root, where the base name is the name of the live log, e.g. kolibri.txt.
+    """
+    archive_dir = os.path.join(log_root, ARCHIVE_DIR)
+    try:
+        names = os.listdir(archive_dir)
+    except OSError:
+        return []
+    rotated = []
+    for name in names:
+        match = ROTATED_LOG_RE.match(name)
+        if match:
+            rotated.append(
+                (
+                    os.path.join(archive_dir, name),
+                    match.group("name") + ".txt",
+                    match.group("date"),
+                    bool(match.group("gz")),
+                )
+            )
+    return rotated
+
+
+def compress_log(path):
+    """
+    Gzip a rotated log next to itself and remove the original. Safe to run from
+    several processes at once: the compressed file only appears once complete.
+    """
+    tmp_path = "{}{}.{}.tmp".format(path, COMPRESSED_SUFFIX, os.getpid())
+    try:
+        with open(path, "rb") as source, gzip.open(tmp_path, "wb") as target:
+            shutil.copyfileobj(source, target)
+        os.replace(tmp_path, path + COMPRESSED_SUFFIX)
+        os.remove(path)
+    except OSError as e:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        if os.path.exists(path):
+            logger.warning("Could not compress log file {}: {}".format(path, e))
+
+
+def compress_rotated_logs(log_root):
+    for path, _, _, compressed in _rotated_logs(log_root):
+        if not compressed:
+            compress_log(path)
+
+
+def enforce_retention(log_root, max_count, max_bytes):
+    """
+    Keep the newest max_count rotated files of each log, then remove the oldest
+    rotated files of any log until together they fit in max_bytes.
+    """
+    by_base = {}
+    for path, base, date, _ in _rotated_logs(log_root):
+        by_base.setdefault(base, []).append((date, path))
+
+    kept = []
+    for files in by_base.values():
+        files.sort(reverse=True)
+        for index, (date, path) in enumerate(files):
+            if max_count and index >= max_count:
+                _remove(path)
+            else:
+                kept.append((date, path))
+
+    if max_bytes:
+        _enforce_total_size(kept, max_bytes)
+
+
+def _enforce_total_size(rotated, max_bytes):
+    """
+    Remove the oldest of the (date, path) rotated files, across all logs, until
+    the rest fit in max_bytes.
+    """
+    sizes = []
+    for date, path in rotated:
+        try:
+            sizes.append((date, path, os.path.getsize(path)))
+        except OSError:
+            pass
+    total = sum(size for _, _, size in sizes)
+    for date, path, size in sorted(sizes):
+        if total <= max_bytes:
+            break
+        _remove(path)
+        total -= size
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError as e:
+        logger.warning("Could not remove old log file {}: {}".format(path, e))
+
+
+class LogMaintenance(object):
+    """
+    Runs compression and retention on a daemon thread. Requests made while a
+    run is pending are merged into it.
+    """
+
+    def __init__(self, log_root):
+        self.log_root = log_root
+        self._requests = queue.Queue(1)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def request(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="log maintenance", daemon=True
+                )
+                self._thread.start()
+        try:
+            self._requests.put_nowait(True)
+        except queue.Full:
+            pass
+
+    def _run(self):
+        while True:
+            self._requests.get()
+            try:
+                compress_rotated_logs(self.log_root)
+                enforce_retention(
+                    self.log_root,
+                    get_app_option("LOG_RETENTION_COUNT"),
+                    get_app_option("LOG_RETENTION_BYTES"),
+                )
+            except Exception:
+                logger.exception("Log maintenance failed")
+
+
+log_maintenance = LogMaintenance(LOG_ROOT)
+
+
+class CompressingTimedRotatingFileHandler(KolibriTimedRotatingFileHandler):
+    """
+    Rotates like Kolibri's handler, which only renames files on the logging
+    thread, and leaves compression and retention to the maintenance thread.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("backupCount", DEFAULT_BACKUP_COUNT)
+        super().__init__(*args, **kwargs)
+
+    def doRollover(self):
+        # Once Kolibri's handler has moved the file to the archive
+        super().doRollover()
+        log_maintenance.request()
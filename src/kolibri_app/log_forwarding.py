@@ -0,0 +1,172 @@
+"""
+Single-writer logging across the UI and server processes.
+
+The UI process owns kolibri-app.txt. A server subprocess (or the Windows
+service) does not open it: its records are kept in a bounded buffer and the UI
+pulls them in batches over the IPC channel it already uses for the readiness
+handshake, then writes them through its own logging pipeline.
+
+When no UI is connected for a while, for instance because the UI exited and
+left the server running, the server writes its records to kolibri-app-server.txt
+instead, so that each log file only ever has one writer. For the same reason,
+each HTTP worker process (see http_workers) writes a log file of its own.
+"""
+import collections
+import logging as log
+import os
+import time
+
+from kolibri.utils.conf import LOG_ROOT
+
+from kolibri_app.log_files import CompressingTimedRotatingFileHandler
+from kolibri_app.logger import log_listener
+from kolibri_app.logger import logging
+
+SERVER_LOG_BASENAME = "kolibri-app-server.txt"
+WORKER_LOG_BASENAME = "kolibri-app-worker-{}.txt"
+# Anything the server process writes to its stderr below the Python level,
+# e.g. a crash before the logger was set up, or output of C extensions.
+SERVER_STDERR_BASENAME = "kolibri-app-server-stderr.txt"
+
+# Records held for the UI before the oldest are written to the server log file
+MAX_BUFFERED_RECORDS = 5000
+# Records sent to the UI per poll
+MAX_RECORDS_PER_BATCH = 500
+# How long records are held for a UI to connect before falling back to the file
+DETACHED_GRACE_PERIOD = 30
+
+_forwarding_handler = None
+
+
+def record_to_dict(record):
+    """
+    The parts of a log record the UI needs to write it, with the message and
+    traceback already formatted.
+    """
+    if record.exc_info and not record.exc_text:
+        record.exc_text = log.Formatter().formatException(record.exc_info)
+    return {
+        "name": record.name,
+        "levelno": record.levelno,
+        "levelname": record.levelname,
+        "msg": record.getMessage(),
+        "created": record.created,
+        "msecs": record.msecs,
+        "exc_text": record.exc_text,
+        "process": record.process,
+        "processName": record.processName,
+        "threadName": record.threadName,
+    }
+
+
+class ForwardingLogHandler(log.Handler):
+    """
+    Buffers records for the UI process to pull, and writes them to the
+    fallback handler while no UI is connected.
+    """
+
+    def __init__(self, fallback):
+        super().__init__()
+        self.fallback = fallback
+        self.buffer = collections.deque()
+        self.connected = False
+        self.detached_since = time.monotonic()
+
+    def emit(self, record):
+        try:
+            entry = record_to_dict(record)
+        except Exception:
+            self.handleError(record)
+            return
+        with self.lock:
+            if self.connected or self._in_grace_period():
+                self.buffer.append(entry)
+                overflow = len(self.buffer) - MAX_BUFFERED_RECORDS
+                spilled = [self.buffer.popleft() for _ in range(max(0, overflow))]
+            else:
+                spilled = list(self.buffer) + [entry]
+                self.buffer.clear()
+        self._write_to_fallback(spilled)
+
+    def _in_grace_period(self):
+        return time.monotonic() - self.detached_since < DETACHED_GRACE_PERIOD
+
+    def _write_to_fallback(self, entries):
+        for entry in entries:
+            self.fallback.handle(log.makeLogRecord(entry))
+
+    def client_connected(self):
+        with self.lock:
+            self.connected = True
+
+    def client_disconnected(self):
+        with self.lock:
+            self.connected = False
+            self.detached_since = time.monotonic()
+
+    def drain(self, limit=MAX_RECORDS_PER_BATCH):
+        """Take up to limit buffered records, oldest first."""
+        with self.lock:
+            count = min(limit, len(self.buffer))
+            return [self.buffer.popleft() for _ in range(count)]
+
+    def close(self):
+        # Nobody is going to pull what is left at exit.
+        with self.lock:
+            remaining = list(self.buffer)
+            self.buffer.clear()
+        self._write_to_fallback(remaining)
+        self.fallback.close()
+        super().close()
+
+
+def _log_file_handler(basename):
+    return CompressingTimedRotatingFileHandler(
+        filename=os.path.join(LOG_ROOT, basename),
+        encoding="utf-8",
+        when="midnight",
+        delay=True,
+    )
+
+
+def install_log_forwarding():
+    """
+    Make this process a server process that hands its log records to the UI.
+    Must be called before anything is logged, so that kolibri-app.txt is never
+    opened here.
+    """
+    global _forwarding_handler
+    if _forwarding_handler is None:
+        _forwarding_handler = ForwardingLogHandler(
+            _log_file_handler(SERVER_LOG_BASENAME)
+        )
+        log_listener.handlers = (_forwarding_handler,)
+    return _forwarding_handler
+
+
+def install_worker_log(index):
+    """
+    Make this process HTTP worker number index, writing its log records to a
+    file of its own. Must be called before anything is logged.
+    """
+    log_listener.handlers = (_log_file_handler(WORKER_LOG_BASENAME.format(index)),)
+
+
+def get_log_forwarder():
+    """The forwarding handler, or None if this process writes its own log."""
+    return _forwarding_handler
+
+
+def replay_records(entries):
+    """Write records pulled from a server process through this process' logging."""
+    for entry in entries:
+        record = log.makeLogRecord(entry)
+        logging.handle(record)
+
+
+def open_server_stderr_log():
+    """
+    File for the stderr of a server subprocess, replaced on every launch. The
+    caller closes it once the subprocess has been started.
+    """
+    return open(os.path.join(LOG_ROOT, SERVER_STDERR_BASENAME), "wb")
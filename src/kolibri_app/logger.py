@@ -1,26 +1,114 @@
+import atexit
 import io
 import logging as log
 import os
+import queue
 import sys
+import threading
+from logging.handlers import QueueHandler
+from logging.handlers import QueueListener
+
+from kolibri_app.tracer import tracer
+
+_logger_setup_span = tracer.start_span("logger setup")
+
+from kolibri.utils.conf import LOG_ROOT  # noqa: E402
+
+from kolibri_app.log_files import CompressingTimedRotatingFileHandler  # noqa: E402
+
+# Records waiting to be written before the overflow policy kicks in
+LOG_QUEUE_SIZE = 10000
+# How long a warning or error may wait for room in a full queue
+LOG_QUEUE_BLOCK_TIMEOUT = 0.5
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread through a bounded queue, so that log
+    calls on the UI and server threads never wait for the disk.
+
+    When the queue is full, records below WARNING are dropped and counted, while
+    warnings and errors wait a little for room before being dropped too. The
+    number of dropped records is logged as soon as there is room again.
+    """
+
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def enqueue(self, record):
+        try:
+            if record.levelno >= log.WARNING:
+                self.queue.put(record, timeout=LOG_QUEUE_BLOCK_TIMEOUT)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+            return
+        if self.dropped:
+            self._report_dropped(record)
+
+    def _report_dropped(self, record):
+        with self._dropped_lock:
+            dropped, self.dropped = self.dropped, 0
+        summary = log.LogRecord(
+            record.name,
+            log.WARNING,
+            __file__,
+            0,
+            "Dropped {} log records because the log queue was full".format(dropped),
+            None,
+            None,
+        )
+        try:
+            self.queue.put_nowait(summary)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += dropped
+
+
+class BlockingSentinelQueueListener(QueueListener):
+    def enqueue_sentinel(self):
+        # The queue may be full at exit, wait for room rather than failing to stop.
+        self.queue.put(self._sentinel)
 
-from kolibri.utils.conf import LOG_ROOT
-from kolibri.utils.logger import KolibriTimedRotatingFileHandler
 
 log.basicConfig(format="%(levelname)s: %(message)s", level=log.INFO)
 logging = log.getLogger("kolibri_app")
 
 log_basename = "kolibri-app.txt"
 log_filename = os.path.join(LOG_ROOT, log_basename)
-file_handler = KolibriTimedRotatingFileHandler(
-    filename=log_filename, encoding="utf-8", when="midnight", backupCount=30
+# Opened on the first record, so that a server process that forwards its logs
+# to the UI never opens the file, see log_forwarding.
+file_handler = CompressingTimedRotatingFileHandler(
+    filename=log_filename,
+    encoding="utf-8",
+    when="midnight",
+    delay=True,
 )
-logging.addHandler(file_handler)
+
+log_queue = queue.Queue(LOG_QUEUE_SIZE)
+queue_handler = BoundedQueueHandler(log_queue)
+logging.addHandler(queue_handler)
+log_listener = BlockingSentinelQueueListener(
+    log_queue, file_handler, respect_handler_level=True
+)
+log_listener.start()
+# Write out whatever is still queued when the process exits.
+atexit.register(log_listener.stop)
 
 
 class LoggerWriter(io.IOBase):
-    def __init__(self, writer):
-        self._writer = writer
-        self._msg = ""
+    """
+    File-like object that logs every line written to it at the given level.
+    """
+
+    def __init__(self, logger, level):
+        self._logger = logger
+        self._level = level
+        self._parts = []
 
     def readable(self):
         return False
@@ -29,18 +117,28 @@ class LoggerWriter(io.IOBase):
         return True
 
     def write(self, message):
-        self._msg = self._msg + message
-        while "\n" in self._msg:
-            pos = self._msg.find("\n")
-            self._writer(self._msg[:pos])
-            self._msg = self._msg[pos + 1 :]
+        if not self._logger.isEnabledFor(self._level):
+            self._parts = []
+            return len(message)
+        if "\n" not in message:
+            self._parts.append(message)
+            return len(message)
+        lines = message.split("\n")
+        self._parts.append(lines[0])
+        self._logger.log(self._level, "".join(self._parts))
+        for line in lines[1:-1]:
+            self._logger.log(self._level, line)
+        self._parts = [lines[-1]] if lines[-1] else []
+        return len(message)
 
     def flush(self):
-        if self._msg != "":
-            self._writer(self._msg)
-            self._msg = ""
+        if self._parts:
+            self._logger.log(self._level, "".join(self._parts))
+            self._parts = []
 
 
 # Make sure we send all app output to logs as we have no console to view them on.
-sys.stdout = LoggerWriter(logging.debug)
-sys.stderr = LoggerWriter(logging.warning)
+sys.stdout = LoggerWriter(logging, log.DEBUG)
+sys.stderr = LoggerWriter(logging, log.WARNING)
+
+_logger_setup_span.finish()
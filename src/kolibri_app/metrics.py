@@ -0,0 +1,560 @@
+"""
+Metrics endpoint of the kolibri_app plugin.
+
+MetricsMiddleware counts the requests this process serves and how long they
+take. /kolibri_app/metrics reports them together with the process' memory, CPU
+time, threads, open files and garbage collector, the size of the SQLite
+databases and the state of the process bus, in the Prometheus text format, so
+devices can be compared under load without attaching a debugger.
+/kolibri_app/dashboard shows the same figures as a small self-refreshing page.
+Both only answer requests made from the device itself.
+
+The middleware also keeps a latency histogram per URL pattern, in constant
+memory: a fixed set of buckets for each of at most MAX_ROUTES patterns, from
+which the p50, p95 and p99 of each pattern are estimated. A request slower than SLOW_REQUEST_THRESHOLD is logged as one JSON object with
+where its time went: before the view (Kolibri's middleware and URL resolution),
+in the view and the response middleware, and in database queries.
+
+Every process keeps its own figures. With several HTTP workers, see
+http_workers, a request is answered by whichever process accepted it, so every
+scrape reports the pid of the process it describes.
+"""
+import bisect
+import collections
+import contextlib
+import gc
+import html
+import json
+import logging as log
+import math
+import os
+import threading
+import time
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import Http404
+from django.http import HttpResponse
+
+from kolibri_app.options import get_app_option
+from kolibri_app.process_stats import get_open_fd_count
+from kolibri_app.process_stats import get_process_rss
+
+# Upper bounds in seconds of the request latency buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Quantiles estimated from each URL pattern's histogram
+ROUTE_QUANTILES = (0.5, 0.95, 0.99)
+# URL patterns with their own latency histogram, the rest are counted as "other"
+MAX_ROUTES = 200
+OTHER_ROUTE = "other"
+# Requests that did not resolve to a view, e.g. 404s and static files
+UNMATCHED_ROUTE = "unmatched"
+
+METHODS = ("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS")
+
+LOCAL_ADDRESSES = ("127.0.0.1", "::1")
+
+# Seconds between two reloads of the dashboard
+DASHBOARD_REFRESH = 5
+
+START_TIME = time.time()
+
+Metric = collections.namedtuple("Metric", "name type help samples")
+
+_bus = None
+
+slow_request_logger = log.getLogger("kolibri_app.slow_requests")
+
+
+def _histogram_samples(buckets, counts, total, labels):
+    """Cumulative bucket, sum and count samples of a histogram."""
+    samples = []
+    cumulative = 0
+    for bound, count in zip(buckets + ("+Inf",), counts):
+        cumulative += count
+        samples.append(("_bucket", dict(labels, le=str(bound)), cumulative))
+    samples.append(("_sum", labels, total))
+    samples.append(("_count", labels, cumulative))
+    return samples
+
+
+class RequestStats(object):
+    """Request counts by method and status class, and a latency histogram."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.counts = collections.Counter()
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.duration_sum = 0.0
+        self.in_flight = 0
+
+    def started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finished(self, method, status, duration):
+        method = method if method in METHODS else "other"
+        status_class = "{}xx".format(status // 100)
+        index = bisect.bisect_left(self.buckets, duration)
+        with self._lock:
+            self.in_flight -= 1
+            self.counts[(method, status_class)] += 1
+            self.bucket_counts[index] += 1
+            self.duration_sum += duration
+
+    def metrics(self):
+        with self._lock:
+            counts = dict(self.counts)
+            bucket_counts = list(self.bucket_counts)
+            duration_sum = self.duration_sum
+            in_flight = self.in_flight
+        return [
+            Metric(
+                "kolibri_app_http_requests_total",
+                "counter",
+                "HTTP requests served by this process.",
+                [
+                    ("", {"method": method, "status": status}, count)
+                    for (method, status), count in sorted(counts.items())
+                ],
+            ),
+            Metric(
+                "kolibri_app_http_request_duration_seconds",
+                "histogram",
+                "Time from receiving a request to returning its response.",
+                _histogram_samples(self.buckets, bucket_counts, duration_sum, {}),
+            ),
+            Metric(
+                "kolibri_app_http_requests_in_flight",
+                "gauge",
+                "Requests being handled right now.",
+                [("", {}, in_flight)],
+            ),
+        ]
+
+
+class RouteStats(object):
+    """A latency histogram per URL pattern, for at most MAX_ROUTES patterns."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS, max_routes=MAX_ROUTES):
+        self.buckets = buckets
+        self.max_routes = max_routes
+        self._lock = threading.Lock()
+        # route: [count per bucket..., sum of durations]
+        self.histograms = {}
+
+    def observe(self, route, duration):
+        index = bisect.bisect_left(self.buckets, duration)
+        with self._lock:
+            histogram = self.histograms.get(route)
+            if histogram is None:
+                if len(self.histograms) >= self.max_routes:
+                    route = OTHER_ROUTE
+                histogram = self.histograms.setdefault(
+                    route, [0] * (len(self.buckets) + 2)
+                )
+            histogram[index] += 1
+            histogram[-1] += duration
+
+    def percentile(self, route, fraction):
+        """
+        Upper bound of the bucket that holds the given fraction of the requests
+        to route, infinity if that is the open bucket, None without requests.
+        """
+        with self._lock:
+            histogram = self.histograms.get(route)
+            counts = list(histogram[:-1]) if histogram else []
+        return self._percentile(counts, fraction)
+
+    def _percentile(self, counts, fraction):
+        rank = max(1, math.ceil(fraction * sum(counts)))
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return None
+
+    def metrics(self):
+        with self._lock:
+            histograms = {
+                route: list(counts) for route, counts in self.histograms.items()
+            }
+        samples = []
+        quantiles = []
+        for route, histogram in sorted(histograms.items()):
+            samples.extend(
+                _histogram_samples(
+                    self.buckets, histogram[:-1], histogram[-1], {"route": route}
+                )
+            )
+            for fraction in ROUTE_QUANTILES:
+                quantiles.append(
+                    (
+                        "",
+                        {"route": route, "quantile": str(fraction)},
+                        self._percentile(histogram[:-1], fraction),
+                    )
+                )
+        return [
+            Metric(
+                "kolibri_app_http_route_duration_seconds",
+                "histogram",
+                "Request latency per URL pattern.",
+                samples,
+            ),
+            Metric(
+                "kolibri_app_http_route_duration_quantile_seconds",
+                "gauge",
+                "Upper bound of the latency bucket holding each quantile per URL pattern.",
+                quantiles,
+            ),
+        ]
+
+
+request_stats = RequestStats()
+route_stats = RouteStats()
+
+
+class QueryTimer(object):
+    """Database time and query count of one request, see execute_wrapper."""
+
+    __slots__ = ("count", "duration")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+def get_route(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return UNMATCHED_ROUTE
+    return getattr(match, "route", None) or match.view_name or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware(object):
+    """
+    Records every request in request_stats and route_stats, and logs the ones
+    slower than SLOW_REQUEST_THRESHOLD.
+    """
+
+    def __init__(self, get_response):
+        if not get_app_option("METRICS_ENABLED"):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.slow_request_threshold = get_app_option("SLOW_REQUEST_THRESHOLD")
+        self.sql_profile = None
+        if get_app_option("SQL_PROFILING"):
+            from kolibri_app.sql_profiling import get_profile
+
+            self.sql_profile = get_profile()
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        request._kolibri_app_view_start = None
+        if self.sql_profile is not None:
+            from kolibri_app.sql_profiling import QueryRecorder
+
+            query_timer = QueryRecorder()
+        else:
+            query_timer = QueryTimer()
+        request_stats.started()
+        status = 500
+        try:
+            with contextlib.ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(query_timer))
+                response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            end = time.perf_counter()
+            duration = end - start
+            request_stats.finished(request.method, status, duration)
+            route = get_route(request)
+            route_stats.observe(route, duration)
+            if self.sql_profile is not None:
+                self.sql_profile.record(route, query_timer)
+            if self.slow_request_threshold and duration >= self.slow_request_threshold:
+                self.log_slow_request(request, route, status, start, end, query_timer)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._kolibri_app_view_start = time.perf_counter()
+
+    def log_slow_request(self, request, route, status, start, end, query_timer):
+        view_start = request._kolibri_app_view_start or end
+        entry = {
+            "method": request.method,
+            "path": request.path,
+            "route": route,
+            "status": status,
+            "total_ms": round((end - start) * 1000, 1),
+            "before_view_ms": round((view_start - start) * 1000, 1),
+            "view_ms": round((end - view_start) * 1000, 1),
+            "db_ms": round(query_timer.duration * 1000, 1),
+            "db_queries": query_timer.count,
+            "thread": threading.current_thread().name,
+            "pid": os.getpid(),
+        }
+        slow_request_logger.warning("Slow request: {}".format(json.dumps(entry)))
+
+
+def watch_bus(bus):
+    """Report the state of the process bus of this process."""
+    global _bus
+    _bus = bus
+
+
+def _database_sizes():
+    """(alias, bytes) of every SQLite database, including its WAL files."""
+    from django.conf import settings
+
+    for alias, database in sorted(settings.DATABASES.items()):
+        name = database.get("NAME")
+        if "sqlite" not in database.get("ENGINE", "") or not name:
+            continue
+        size = 0
+        for path in (name, name + "-wal", name + "-shm"):
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+        yield alias, size
+
+
+def _process_metrics():
+    times = os.times()
+    metrics = [
+        Metric(
+            "kolibri_app_process_info",
+            "gauge",
+            "The process these figures describe.",
+            [("", {"pid": str(os.getpid())}, 1)],
+        ),
+        Metric(
+            "kolibri_app_uptime_seconds",
+            "gauge",
+            "Seconds since this process set up Django.",
+            [("", {}, time.time() - START_TIME)],
+        ),
+        Metric(
+            "kolibri_app_process_cpu_seconds_total",
+            "counter",
+            "User and system CPU time of this process.",
+            [("", {}, times.user + times.system)],
+        ),
+        Metric(
+            "kolibri_app_process_threads",
+            "gauge",
+            "Python threads of this process.",
+            [("", {}, threading.active_count())],
+        ),
+    ]
+    rss = get_process_rss()
+    if rss is not None:
+        metrics.append(
+            Metric(
+                "kolibri_app_process_resident_memory_bytes",
+                "gauge",
+                "Resident memory of this process.",
+                [("", {}, rss)],
+            )
+        )
+    open_fds = get_open_fd_count()
+    if open_fds is not None:
+        metrics.append(
+            Metric(
+                "kolibri_app_process_open_fds",
+                "gauge",
+                "Open file descriptors, or handles on Windows, of this process.",
+                [("", {}, open_fds)],
+            )
+        )
+    return metrics
+
+
+def _gc_metrics():
+    stats = gc.get_stats()
+    return [
+        Metric(
+            "kolibri_app_gc_collections_total",
+            "counter",
+            "Garbage collector runs per generation.",
+            [
+                ("", {"generation": str(generation)}, stat["collections"])
+                for generation, stat in enumerate(stats)
+            ],
+        ),
+        Metric(
+            "kolibri_app_gc_objects_collected_total",
+            "counter",
+            "Objects freed by the garbage collector per generation.",
+            [
+                ("", {"generation": str(generation)}, stat["collected"])
+                for generation, stat in enumerate(stats)
+            ],
+        ),
+        Metric(
+            "kolibri_app_gc_objects_uncollectable_total",
+            "counter",
+            "Objects the garbage collector found but could not free.",
+            [
+                ("", {"generation": str(generation)}, stat["uncollectable"])
+                for generation, stat in enumerate(stats)
+            ],
+        ),
+        Metric(
+            "kolibri_app_gc_objects_pending",
+            "gauge",
+            "Allocations counted towards the next collection per generation.",
+            [
+                ("", {"generation": str(generation)}, count)
+                for generation, count in enumerate(gc.get_count())
+            ],
+        ),
+    ]
+
+
+def collect():
+    """Every metric of this process."""
+    metrics = (
+        _process_metrics()
+        + _gc_metrics()
+        + request_stats.metrics()
+        + route_stats.metrics()
+    )
+    metrics.append(
+        Metric(
+            "kolibri_app_sqlite_database_bytes",
+            "gauge",
+            "Size of the SQLite databases, including their WAL files.",
+            [("", {"database": alias}, size) for alias, size in _database_sizes()],
+        )
+    )
+    if _bus is not None:
+        metrics.append(
+            Metric(
+                "kolibri_app_bus_state",
+                "gauge",
+                "State of the Kolibri process bus.",
+                [("", {"state": str(_bus.state)}, 1)],
+            )
+        )
+    return metrics
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{{{}}}".format(
+        ",".join(
+            '{}="{}"'.format(
+                key,
+                value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+            )
+            for key, value in labels.items()
+        )
+    )
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def render_prometheus(metrics):
+    """The Prometheus text exposition format of metrics."""
+    lines = []
+    for metric in metrics:
+        lines.append("# HELP {} {}".format(metric.name, metric.help))
+        lines.append("# TYPE {} {}".format(metric.name, metric.type))
+        for suffix, labels, value in metric.samples:
+            lines.append(
+                "{}{}{} {}".format(
+                    metric.name, suffix, _format_labels(labels), _format_value(value)
+                )
+            )
+    return "\n".join(lines) + "\n"
+
+
+def render_dashboard(metrics):
+    rows = []
+    for metric in metrics:
+        # The buckets are for graphs, the sum and count are enough to read.
+        samples = [sample for sample in metric.samples if sample[0] != "_bucket"]
+        for index, (suffix, labels, value) in enumerate(samples):
+            if isinstance(value, float):
+                value = "{:.3f}".format(value)
+            rows.append(
+                "<tr><td>{}</td><td>{}</td><td>{}</td><td class='value'>{}</td></tr>".format(
+                    html.escape(metric.help) if index == 0 else "",
+                    html.escape(metric.name + suffix),
+                    html.escape(
+                        ", ".join("{}={}".format(*item) for item in labels.items())
+                    ),
+                    html.escape(str(value)),
+                )
+            )
+    return """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<meta http-equiv="refresh" content="{refresh}">
+<title>Kolibri app metrics</title>
+<style>
+body {{ font-family: sans-serif; margin: 1em; }}
+table {{ border-collapse: collapse; }}
+td, th {{ border-bottom: 1px solid #ddd; padding: 2px 8px; text-align: left; }}
+td.value {{ text-align: right; font-family: monospace; }}
+</style>
+</head>
+<body>
+<h1>Kolibri app metrics, process {pid}</h1>
+<p>Reloads every {refresh} seconds. Also available for scraping at <a href="metrics">metrics</a>.</p>
+<table>
+<tr><th>Description</th><th>Metric</th><th>Labels</th><th>Value</th></tr>
+{rows}
+</table>
+</body>
+</html>
+""".format(
+        refresh=DASHBOARD_REFRESH, pid=os.getpid(), rows="\n".join(rows)
+    )
+
+
+def _check_access(request):
+    # Kolibri listens on all interfaces, keep the figures to the device itself.
+    if (
+        not get_app_option("METRICS_ENABLED")
+        or request.META.get("REMOTE_ADDR") not in LOCAL_ADDRESSES
+    ):
+        raise Http404()
+
+
+def metrics_view(request):
+    _check_access(request)
+    return HttpResponse(
+        render_prometheus(collect()),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+def dashboard_view(request):
+    _check_access(request)
+    return HttpResponse(
+        render_dashboard(collect()), content_type="text/html; charset=utf-8"
+    )
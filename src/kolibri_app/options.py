@@ -0,0 +1,303 @@
+import configparser
+import os
+import sys
+
+SECTION = "KolibriApp"
+
+# The spellings of booleans Kolibri accepts in options.ini
+TRUE_VALUES = ("1", "true", "yes", "on")
+FALSE_VALUES = ("0", "false", "no", "off")
+
+option_spec = {
+    SECTION: {
+        "WARMUP_ENABLED": {
+            "type": "boolean",
+            "default": True,
+            "envvars": ("KOLIBRI_APP_WARMUP_ENABLED",),
+            "description": "Warm up Django and the databases with loopback requests before the UI loads Kolibri.",
+        },
+        "WARMUP_PATHS": {
+            "type": "list",
+            "default": [
+                "/api/public/info/",
+                "/api/auth/session/current/",
+                "/api/content/channel/?available=true",
+            ],
+            "envvars": ("KOLIBRI_APP_WARMUP_PATHS",),
+            "description": "API endpoints requested during warm up, in addition to the app initialize URL.",
+        },
+        "WARMUP_DEADLINE": {
+            "type": "float",
+            "default": 3.0,
+            "envvars": ("KOLIBRI_APP_WARMUP_DEADLINE",),
+            "description": "Seconds after which the UI is told the server is ready, even if warm up has not finished.",
+        },
+        "INITIALIZE_FAST_PATH": {
+            "type": "boolean",
+            "default": True,
+            "envvars": ("KOLIBRI_APP_INITIALIZE_FAST_PATH",),
+            "description": "Skip Kolibri's upgrade and migration checks at startup while the install is unchanged since the last full start.",
+        },
+        "SERVER_MODE": {
+            "type": "option",
+            "options": ("thread", "subprocess"),
+            "default": "thread",
+            "envvars": ("KOLIBRI_APP_SERVER_MODE",),
+            "description": "On Linux and macOS, run the Kolibri server in a thread of the UI process or in a separate process that survives the UI.",
+        },
+        "SERVER_KEEP_ALIVE": {
+            "type": "boolean",
+            "default": True,
+            "envvars": ("KOLIBRI_APP_SERVER_KEEP_ALIVE",),
+            "description": "In subprocess mode, leave the server running when the UI closes so the next launch can reattach to it.",
+        },
+        "SERVER_IDLE_TIMEOUT": {
+            "type": "integer",
+            "default": 1800,
+            "envvars": ("KOLIBRI_APP_SERVER_IDLE_TIMEOUT",),
+            "description": "Seconds a subprocess server keeps running without a UI connected, 0 to keep it running until it is stopped.",
+        },
+        "MULTIPROCESS_SERVING": {
+            "type": "boolean",
+            "default": False,
+            "envvars": ("KOLIBRI_APP_MULTIPROCESS_SERVING",),
+            "description": "On Linux, serve HTTP from several processes sharing the port with SO_REUSEPORT.",
+        },
+        "HTTP_WORKERS": {
+            "type": "integer",
+            "default": 0,
+            "envvars": ("KOLIBRI_APP_HTTP_WORKERS",),
+            "description": "Number of processes serving HTTP in multi-process mode, including the main server, 0 for one per CPU.",
+        },
+        "SQLITE_TUNING_ENABLED": {
+            "type": "boolean",
+            "default": True,
+            "envvars": ("KOLIBRI_APP_SQLITE_TUNING_ENABLED",),
+            "description": "Apply the SQLITE_* pragmas below to every SQLite connection Kolibri opens.",
+        },
+        "SQLITE_SYNCHRONOUS": {
+            "type": "option",
+            "options": ("OFF", "NORMAL", "FULL"),
+            "default": "NORMAL",
+            "envvars": ("KOLIBRI_APP_SQLITE_SYNCHRONOUS",),
+            "description": "SQLite synchronous mode of the Kolibri databases. NORMAL may lose the last commits on power loss but never corrupts them.",
+        },
+        "SQLITE_CACHE_SIZE": {
+            "type": "integer",
+            "default": 16 * 1024,
+            "envvars": ("KOLIBRI_APP_SQLITE_CACHE_SIZE",),
+            "description": "Page cache in KiB of each connection to the Kolibri databases, 0 for SQLite's default.",
+        },
+        "SQLITE_MMAP_SIZE": {
+            "type": "integer",
+            "default": 128 * 1024 * 1024,
+            "envvars": ("KOLIBRI_APP_SQLITE_MMAP_SIZE",),
+            "description": "Bytes of each Kolibri database read through a memory map, 0 to read them without one.",
+        },
+        "SQLITE_CONTENT_CACHE_SIZE": {
+            "type": "integer",
+            "default": 8 * 1024,
+            "envvars": ("KOLIBRI_APP_SQLITE_CONTENT_CACHE_SIZE",),
+            "description": "Page cache in KiB of each connection to a channel database, 0 for SQLite's default.",
+        },
+        "SQLITE_CONTENT_MMAP_SIZE": {
+            "type": "integer",
+            "default": 256 * 1024 * 1024,
+            "envvars": ("KOLIBRI_APP_SQLITE_CONTENT_MMAP_SIZE",),
+            "description": "Bytes of each channel database read through a memory map, 0 to read them without one.",
+        },
+        "SQLITE_TEMP_STORE": {
+            "type": "option",
+            "options": ("DEFAULT", "FILE", "MEMORY"),
+            "default": "MEMORY",
+            "envvars": ("KOLIBRI_APP_SQLITE_TEMP_STORE",),
+            "description": "Where SQLite keeps temporary tables and indices, e.g. for sorting query results.",
+        },
+        "SQLITE_BUSY_TIMEOUT": {
+            "type": "integer",
+            "default": 30000,
+            "envvars": ("KOLIBRI_APP_SQLITE_BUSY_TIMEOUT",),
+            "description": "Minimum milliseconds a connection waits for a locked database. Connections Kolibri opens with a longer timeout keep it.",
+        },
+        "SQLITE_CONN_MAX_AGE": {
+            "type": "integer",
+            "default": 600,
+            "envvars": ("KOLIBRI_APP_SQLITE_CONN_MAX_AGE",),
+            "description": "Seconds a server thread keeps its database connections open across requests, 0 to close them after every request.",
+        },
+        "DESKTOP_CACHING": {
+            "type": "boolean",
+            "default": True,
+            "envvars": ("KOLIBRI_APP_DESKTOP_CACHING",),
+            "description": "Read sessions from the cache rather than the database, unless several processes serve HTTP, and cache compiled templates.",
+        },
+        "SESSION_STALE_DAYS": {
+            "type": "integer",
+            "default": 90,
+            "envvars": ("KOLIBRI_APP_SESSION_STALE_DAYS",),
+            "description": "Days after which a session nobody used is deleted, 0 to keep sessions until they expire.",
+        },
+        "LOG_RETENTION_COUNT": {
+            "type": "integer",
+            "default": 30,
+            "envvars": ("KOLIBRI_APP_LOG_RETENTION_COUNT",),
+            "description": "Number of rotated files kept for each log in the logs folder, 0 for no limit.",
+        },
+        "LOG_RETENTION_BYTES": {
+            "type": "integer",
+            "default": 50 * 1024 * 1024,
+            "envvars": ("KOLIBRI_APP_LOG_RETENTION_BYTES",),
+            "description": "Total size in bytes of the rotated, compressed logs kept in the logs folder, 0 for no limit.",
+        },
+        "WEBVIEW_IDLE_TIMEOUT": {
+            "type": "integer",
+            "default": 600,
+            "envvars": ("KOLIBRI_APP_WEBVIEW_IDLE_TIMEOUT",),
+            "description": "Seconds a window closed to the tray on Windows keeps its WebView before it is discarded to free memory, 0 to keep it.",
+        },
+        "PRELOAD_KOLIBRI": {
+            "type": "boolean",
+            "default": True,
+            "envvars": ("KOLIBRI_APP_PRELOAD_KOLIBRI",),
+            "description": "Load Kolibri out of sight and keep the loading screen up until it has rendered, instead of showing a blank page.",
+        },
+        "WEBVIEW_CACHE_SIZE": {
+            "type": "integer",
+            "default": 256,
+            "envvars": ("KOLIBRI_APP_WEBVIEW_CACHE_SIZE",),
+            "description": "MB the WebView caches in KOLIBRI_HOME/webview may use on Windows before they are cleared, 0 for WebView2's own limits.",
+        },
+        "METRICS_ENABLED": {
+            "type": "boolean",
+            "default": True,
+            "envvars": ("KOLIBRI_APP_METRICS_ENABLED",),
+            "description": "Count requests and serve /kolibri_app/metrics and /kolibri_app/dashboard to the device itself.",
+        },
+        "SLOW_REQUEST_THRESHOLD": {
+            "type": "float",
+            "default": 2.0,
+            "envvars": ("KOLIBRI_APP_SLOW_REQUEST_THRESHOLD",),
+            "description": "Seconds after which a request is logged with a breakdown of where its time went, 0 to log none.",
+        },
+        "SQL_PROFILING": {
+            "type": "boolean",
+            "default": False,
+            "envvars": ("KOLIBRI_APP_SQL_PROFILING",),
+            "description": "Report the costliest queries and likely N+1 patterns of every URL in KOLIBRI_HOME/sql_profiles. Needs METRICS_ENABLED.",
+        },
+        "WATCHDOG_ENABLED": {
+            "type": "boolean",
+            "default": True,
+            "envvars": ("KOLIBRI_APP_WATCHDOG_ENABLED",),
+            "description": "Check that the server keeps answering requests once Kolibri is loaded.",
+        },
+        "WATCHDOG_INTERVAL": {
+            "type": "float",
+            "default": 15.0,
+            "envvars": ("KOLIBRI_APP_WATCHDOG_INTERVAL",),
+            "description": "Seconds between two server health probes.",
+        },
+        "WATCHDOG_TIMEOUT": {
+            "type": "float",
+            "default": 10.0,
+            "envvars": ("KOLIBRI_APP_WATCHDOG_TIMEOUT",),
+            "description": "Seconds a health probe may take before it counts as failed.",
+        },
+        "WATCHDOG_FAILURES": {
+            "type": "integer",
+            "default": 3,
+            "envvars": ("KOLIBRI_APP_WATCHDOG_FAILURES",),
+            "description": "Health probes in a row that must fail for the server to be considered hung.",
+        },
+        "WATCHDOG_POLICY": {
+            "type": "option",
+            "options": ("notify", "restart", "none"),
+            "default": "notify",
+            "envvars": ("KOLIBRI_APP_WATCHDOG_POLICY",),
+            "description": "What to do with a hung server: tell the user, restart it where the app started it, or only log it.",
+        },
+    }
+}
+
+
+def get_app_option(name):
+    """
+    Read one of the options above.
+
+    Kolibri's OPTIONS must not be read before initialize(): reading them loads
+    the plugin registry, after which initialize() refuses to update the plugins
+    of a first run or an upgrade. So until the registry is loaded, the option is
+    read from its environment variables and the [KolibriApp] section of
+    options.ini directly, falling back to its default. Afterwards, the section
+    is only part of OPTIONS if the plugin was enabled when Kolibri read its
+    configuration, so the same fallback applies when it is missing.
+    """
+    spec = option_spec[SECTION][name]
+    if registry_initialized():
+        from kolibri.utils.conf import OPTIONS
+
+        section = OPTIONS.get(SECTION)
+        if section is not None and name in section:
+            return section[name]
+        ini_value = None
+    else:
+        ini_value = read_options_ini(SECTION).get(name)
+
+    for envvar in spec.get("envvars", ()):
+        if envvar in os.environ:
+            try:
+                return _coerce(spec, os.environ[envvar])
+            except ValueError:
+                break
+    if ini_value is not None:
+        try:
+            return _coerce(spec, ini_value)
+        except ValueError:
+            pass
+    return spec["default"]
+
+
+def registry_initialized():
+    """Whether Kolibri has loaded its plugin registry, so OPTIONS can be read."""
+    # The registry cannot have been loaded if its module was never imported
+    registry = sys.modules.get("kolibri.plugins.registry")
+    return registry is not None and registry.is_initialized()
+
+
+def read_options_ini(section):
+    """
+    The values of a section of KOLIBRI_HOME/options.ini as strings, read
+    without Kolibri's option machinery, empty if it cannot be read.
+    """
+    from kolibri.utils.conf import KOLIBRI_HOME
+
+    parser = configparser.ConfigParser(interpolation=None)
+    # Option names are case sensitive, as for Kolibri
+    parser.optionxform = str
+    try:
+        parser.read(os.path.join(KOLIBRI_HOME, "options.ini"), encoding="utf-8")
+    except (configparser.Error, UnicodeDecodeError):
+        return {}
+    if not parser.has_section(section):
+        return {}
+    return {key: value.strip().strip("\"'") for key, value in parser.items(section)}
+
+
+def _coerce(spec, value):
+    option_type = spec["type"]
+    if option_type == "boolean":
+        value = value.strip().lower()
+        if value in TRUE_VALUES:
+            return True
+        if value in FALSE_VALUES:
+            return False
+        raise ValueError(value)
+    if option_type == "integer":
+        return int(value)
+    if option_type == "float":
+        return float(value)
+    if option_type == "list":
+        return [item.strip() for item in value.split(",") if item.strip()]
+    if option_type == "option" and value not in spec["options"]:
+        raise ValueError(value)
+    return value
@@ -1,5 +1,12 @@
+# Port 0 lets the app pick the port: the one from the last launch when it is still
+# free, otherwise an ephemeral one, see kolibri_app.server.get_http_port.
 option_defaults = {
     "Deployment": {
         "HTTP_PORT": 0,
-    }
+    },
+    # Room for the sessions as well, see sessions. Kolibri's in-memory cache
+    # evicts the least recently used entries beyond this.
+    "Cache": {
+        "CACHE_MAX_ENTRIES": 5000,
+    },
 }
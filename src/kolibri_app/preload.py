@@ -0,0 +1,95 @@
+"""
+Loading Kolibri behind the loading screen.
+
+When the server is ready, a window on the loading screen loads Kolibri in a
+second WebView out of sight, see KolibriView.preload. Kolibri's page shows a
+loading animation of its own until its app has been mounted, so swapping the
+WebViews as soon as the page has loaded would still show a blank page for a
+while. PRELOAD_READY_SCRIPT, injected into the preloaded page, signals once
+Kolibri has rendered, and PreloadSwap decides when the preloaded WebView takes
+the loading screen's place: once its page has loaded and signalled, as soon as
+its page has loaded where the WebView cannot pass script messages, or after
+PRELOAD_TIMEOUT_MS whatever happened.
+
+This module does not import wx, so that the decision can be tested without it.
+"""
+# The loading screen stays up until the preloaded page signals that Kolibri has
+# rendered, but not for longer than this after Kolibri was started loading
+PRELOAD_TIMEOUT_MS = 20000
+
+# Script message handler through which a preloaded page signals it is ready
+PRELOAD_HANDLER = "kolibriApp"
+PRELOAD_READY = "ready"
+
+# Kolibri's page shows a loading animation in <rootvue> until its app is mounted
+# in its place. Signals once that happened and the app has been painted, or
+# right away for pages without Kolibri's app, e.g. an error page.
+PRELOAD_READY_SCRIPT = """(function () {
+    var posted = false;
+    function post() {
+        if (!posted) {
+            posted = true;
+            window.%(handler)s.postMessage("%(ready)s");
+        }
+    }
+    function start() {
+        var observer = new MutationObserver(check);
+        function check() {
+            if (!document.querySelector("rootvue")) {
+                observer.disconnect();
+                requestAnimationFrame(function () {
+                    requestAnimationFrame(post);
+                });
+                // Pages out of sight may not get animation frames
+                setTimeout(post, 500);
+            }
+        }
+        observer.observe(document.documentElement, {childList: true, subtree: true});
+        check();
+    }
+    if (document.readyState === "loading") {
+        document.addEventListener("DOMContentLoaded", start);
+    } else {
+        start();
+    }
+})();""" % {
+    "handler": PRELOAD_HANDLER,
+    "ready": PRELOAD_READY,
+}
+
+
+class PreloadSwap(object):
+    """
+    When to swap a preloaded WebView in for the loading screen. Each method
+    reports an event of the preloaded WebView and returns True if now is the
+    time, which it only ever does once.
+    """
+
+    def __init__(self, can_signal):
+        # Without script messages, the page having loaded is all there is to wait for.
+        self.loaded = False
+        self.ready = not can_signal
+        self.swapped = False
+
+    def reloading(self):
+        """Another URL is being loaded, e.g. after a server restart."""
+        self.loaded = False
+
+    def page_loaded(self):
+        self.loaded = True
+        return self._swap_if(self.ready)
+
+    def message_received(self, message):
+        if message != PRELOAD_READY:
+            return False
+        self.ready = True
+        return self._swap_if(self.loaded)
+
+    def timed_out(self):
+        return self._swap_if(True)
+
+    def _swap_if(self, condition):
+        if not condition or self.swapped:
+            return False
+        self.swapped = True
+        return True
@@ -0,0 +1,181 @@
+"""
+Memory use and open files of the app's processes, without psutil.
+
+The WebView runs in child processes (msedgewebview2.exe and its renderers on
+Windows, WebKit's web processes elsewhere), so the memory a window costs only
+shows up when the resident memory of the children is counted as well, see
+get_process_tree_rss.
+"""
+import os
+import subprocess
+
+from kolibri_app.constants import WINDOWS
+from kolibri_app.logger import logging
+
+MB = 1024 * 1024
+
+PROCESS_VM_READ = 0x0010
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+
+
+def _windows_processes():
+    """(pid, parent pid) of every process, from a Toolhelp snapshot."""
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESSENTRY32(ctypes.Structure):
+        _fields_ = [
+            ("dwSize", wintypes.DWORD),
+            ("cntUsage", wintypes.DWORD),
+            ("th32ProcessID", wintypes.DWORD),
+            ("th32DefaultHeapID", ctypes.c_size_t),
+            ("th32ModuleID", wintypes.DWORD),
+            ("cntThreads", wintypes.DWORD),
+            ("th32ParentProcessID", wintypes.DWORD),
+            ("pcPriClassBase", wintypes.LONG),
+            ("dwFlags", wintypes.DWORD),
+            ("szExeFile", ctypes.c_char * wintypes.MAX_PATH),
+        ]
+
+    TH32CS_SNAPPROCESS = 0x2
+    kernel32 = ctypes.windll.kernel32
+    kernel32.CreateToolhelp32Snapshot.restype = wintypes.HANDLE
+    snapshot = kernel32.CreateToolhelp32Snapshot(TH32CS_SNAPPROCESS, 0)
+    if snapshot == wintypes.HANDLE(-1).value:
+        raise ctypes.WinError()
+    try:
+        entry = PROCESSENTRY32()
+        entry.dwSize = ctypes.sizeof(PROCESSENTRY32)
+        processes = []
+        more = kernel32.Process32First(snapshot, ctypes.byref(entry))
+        while more:
+            processes.append((entry.th32ProcessID, entry.th32ParentProcessID))
+            more = kernel32.Process32Next(snapshot, ctypes.byref(entry))
+        return processes
+    finally:
+        kernel32.CloseHandle(snapshot)
+
+
+def _windows_rss(pid):
+    import pywintypes
+    import win32api
+    import win32process
+
+    try:
+        handle = win32api.OpenProcess(
+            PROCESS_QUERY_LIMITED_INFORMATION | PROCESS_VM_READ, False, pid
+        )
+    except pywintypes.error:
+        # Exited in the meantime, or not ours to inspect
+        return 0
+    try:
+        return win32process.GetProcessMemoryInfo(handle)["WorkingSetSize"]
+    except pywintypes.error:
+        return 0
+    finally:
+        win32api.CloseHandle(handle)
+
+
+def _tree_rss(root_pid, processes, get_rss):
+    """Sum get_rss over root_pid and its descendants in (pid, parent) pairs."""
+    children = {}
+    for pid, parent in processes:
+        children.setdefault(parent, []).append(pid)
+    total = 0
+    stack = [root_pid]
+    # Windows reuses pids, so a parent pid can point at an unrelated process and
+    # the parent links need not form a tree.
+    seen = set()
+    while stack:
+        pid = stack.pop()
+        if pid in seen:
+            continue
+        seen.add(pid)
+        total += get_rss(pid)
+        stack.extend(children.get(pid, ()))
+    return total
+
+
+def _windows_tree_rss(root_pid):
+    return _tree_rss(root_pid, _windows_processes(), _windows_rss)
+
+
+def _posix_tree_rss(root_pid):
+    output = subprocess.check_output(
+        ["ps", "-A", "-o", "pid=,ppid=,rss="], stderr=subprocess.DEVNULL
+    )
+    processes = []
+    rss = {}
+    for line in output.decode("ascii", "replace").splitlines():
+        fields = line.split()
+        if len(fields) != 3:
+            continue
+        pid, parent, kilobytes = (int(field) for field in fields)
+        processes.append((pid, parent))
+        rss[pid] = kilobytes * 1024
+    return _tree_rss(root_pid, processes, lambda pid: rss.get(pid, 0))
+
+
+def get_process_tree_rss(pid=None):
+    """
+    Resident memory in bytes of a process (this one by default) and all of its
+    descendants, or None if it cannot be measured on this system.
+    """
+    pid = os.getpid() if pid is None else pid
+    try:
+        if WINDOWS:
+            return _windows_tree_rss(pid)
+        return _posix_tree_rss(pid)
+    except (ImportError, OSError, ValueError, subprocess.SubprocessError) as e:
+        logging.debug("Could not measure memory use: {}".format(e))
+        return None
+
+
+def get_process_rss(pid=None):
+    """
+    Resident memory in bytes of a single process, this one by default, or None
+    if it cannot be measured on this system.
+    """
+    pid = os.getpid() if pid is None else pid
+    try:
+        if WINDOWS:
+            return _windows_rss(pid)
+        if os.path.exists("/proc/{}/statm".format(pid)):
+            with open("/proc/{}/statm".format(pid), "r") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        output = subprocess.check_output(
+            ["ps", "-o", "rss=", "-p", str(pid)], stderr=subprocess.DEVNULL
+        )
+        return int(output.strip()) * 1024
+    except (ImportError, OSError, ValueError, subprocess.SubprocessError) as e:
+        logging.debug("Could not measure memory use: {}".format(e))
+        return None
+
+
+def get_open_fd_count():
+    """
+    Open file descriptors of this process, handles on Windows, or None if they
+    cannot be counted on this system.
+    """
+    try:
+        if WINDOWS:
+            import ctypes
+            from ctypes import wintypes
+
+            count = wintypes.DWORD()
+            kernel32 = ctypes.windll.kernel32
+            if not kernel32.GetProcessHandleCount(
+                kernel32.GetCurrentProcess(), ctypes.byref(count)
+            ):
+                return None
+            return count.value
+        for fd_dir in ("/proc/self/fd", "/dev/fd"):
+            if os.path.isdir(fd_dir):
+                return len(os.listdir(fd_dir))
+    except OSError:
+        pass
+    return None
+
+
+def format_mb(size):
+    return "{:.0f} MB".format(size / MB)
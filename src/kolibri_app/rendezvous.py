@@ -0,0 +1,87 @@
+"""
+Startup rendezvous between the UI and the Kolibri server.
+
+The server bootstrap (initialize(), Django setup, bus construction) is started
+before the window, WebView and menus are built, so the two critical paths run in
+parallel. Whichever side finishes last triggers the callback, which always runs
+on the wx main thread. The rendezvous also measures both paths and logs how much
+of them actually overlapped.
+"""
+from threading import Lock
+
+from kolibri_app.logger import logging
+from kolibri_app.tracer import tracer
+
+
+class StartupRendezvous(object):
+    def __init__(self, on_ready):
+        self.on_ready = on_ready
+        self._lock = Lock()
+        self.ui_start = None
+        self.ui_end = None
+        self.server_start = None
+        self.server_end = None
+        self._server_args = None
+        self._server_kwargs = None
+        self._met = False
+
+    def ui_started(self):
+        self.ui_start = tracer.now()
+
+    def server_started(self):
+        self.server_start = tracer.now()
+
+    def ui_ready(self):
+        with self._lock:
+            self.ui_end = tracer.now()
+            met = self._meet()
+        if met:
+            self._fire()
+
+    def server_ready(self, *args, **kwargs):
+        """
+        Called with the arguments for on_ready, from any thread. Once the UI side
+        has arrived, later calls (e.g. after a server restart) go straight through.
+        """
+        with self._lock:
+            self._server_args = args
+            self._server_kwargs = kwargs
+            if self._met:
+                met = True
+            else:
+                self.server_end = tracer.now()
+                met = self._meet()
+        if met:
+            self._fire()
+
+    def _meet(self):
+        if self._met or self.ui_end is None or self._server_args is None:
+            return self._met
+        self._met = True
+        self._report()
+        return True
+
+    def _fire(self):
+        import wx
+
+        wx.CallAfter(self.on_ready, *self._server_args, **self._server_kwargs)
+
+    def _report(self):
+        if None in (self.ui_start, self.server_start):
+            return
+        ui_time = self.ui_end - self.ui_start
+        server_time = self.server_end - self.server_start
+        overlap_start = max(self.ui_start, self.server_start)
+        overlap_end = min(self.ui_end, self.server_end)
+        overlap = max(0, overlap_end - overlap_start)
+        shorter = min(ui_time, server_time) or 1
+
+        tracer.complete("UI construction", self.ui_start, self.ui_end)
+        tracer.complete("server bootstrap", self.server_start, self.server_end)
+        if overlap:
+            tracer.complete("startup overlap", overlap_start, overlap_end)
+        logging.info(
+            "Startup paths: UI {:.0f} ms, server {:.0f} ms, overlapped {:.0f} ms ({:.0%} of the shorter path)".format(
+                ui_time / 1000, server_time / 1000, overlap / 1000, overlap / shorter
+            )
+        )
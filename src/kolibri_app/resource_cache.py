@@ -0,0 +1,147 @@
+"""
+Startup resource cache.
+
+Resolves the locale -> translation catalog -> loading page -> icon chain once and
+persists the result under KOLIBRI_HOME, so later launches open the right files
+directly instead of probing the locales and assets directories. The persisted
+resolution is keyed on the app version and the system locale, and is thrown away
+when either changes or a cached file turns out to be missing.
+
+Within a process the loading page and icons are read from disk only once, so
+opening further windows does not touch the filesystem for them.
+"""
+import gettext
+import json
+import logging
+import os
+from importlib.resources import files
+
+from kolibri.utils.conf import KOLIBRI_HOME
+
+import kolibri_app
+
+CACHE_FILE = "app_resource_cache.json"
+
+LOADER_PAGE = "loading.html"
+
+CATALOG = "catalog"
+LOADER = "loader_page"
+
+
+class ResourceCache(object):
+    def __init__(self, languages):
+        self.root = files("kolibri_app")
+        self.path = os.path.join(KOLIBRI_HOME, CACHE_FILE)
+        self.key = {"version": kolibri_app.__version__, "languages": languages}
+        self.languages = languages
+        self._entries = None
+        self._loader_html = None
+        self._icons = {}
+
+    def _load(self):
+        if self._entries is not None:
+            return self._entries
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("key") == self.key:
+                self._entries = cached["entries"]
+                return self._entries
+            logging.debug("App version or system locale changed, resolving resources")
+        except (IOError, ValueError, KeyError, AttributeError):
+            pass
+        self._entries = {}
+        return self._entries
+
+    def _save(self):
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"key": self.key, "entries": self._entries}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.debug("Could not persist resource cache: {}".format(e))
+
+    def _get(self, name, resolver):
+        entries = self._load()
+        if name not in entries:
+            entries[name] = resolver()
+            self._save()
+        return entries[name]
+
+    def _invalidate(self, name):
+        """A cached path no longer exists, resolve it again from scratch."""
+        self._load().pop(name, None)
+        self._save()
+
+    def _expanded_languages(self):
+        nelangs = []
+        for lang in self.languages:
+            for nelang in gettext._expand_lang(lang):
+                if nelang not in nelangs:
+                    nelangs.append(nelang)
+        return nelangs
+
+    def _resolve_catalog(self):
+        for lang in self._expanded_languages():
+            relative_path = "/".join(["locales", lang, "LC_MESSAGES", "wxapp.mo"])
+            if (self.root / relative_path).is_file():
+                return relative_path
+        return None
+
+    def _open(self, name, resolver, mode="r", encoding=None):
+        """
+        Open the cached file for name, resolving it again once if the cached
+        path has gone missing since it was persisted.
+        """
+        relative_path = self._get(name, resolver)
+        try:
+            return (self.root / relative_path).open(mode, encoding=encoding)
+        except OSError:
+            self._invalidate(name)
+            relative_path = self._get(name, resolver)
+            if relative_path is None:
+                raise FileNotFoundError(name)
+            return (self.root / relative_path).open(mode, encoding=encoding)
+
+    def translations(self):
+        if self._get(CATALOG, self._resolve_catalog) is None:
+            return gettext.NullTranslations()
+        try:
+            with self._open(CATALOG, self._resolve_catalog, "rb") as f:
+                return gettext.GNUTranslations(f)
+        except OSError:
+            return gettext.NullTranslations()
+
+    def _resolve_loader_page(self, lang_id):
+        for candidate in (lang_id, lang_id.split("-")[0]):
+            relative_path = "/".join(["assets", candidate, LOADER_PAGE])
+            if (self.root / relative_path).is_file():
+                return relative_path
+        # if we can't find anything in the given language, default to the English loading page.
+        return "/".join(["assets", "en", LOADER_PAGE])
+
+    def loader_html(self, lang_id):
+        """
+        Content of the loading.html for a language name (en-us), read once per process.
+        """
+        if self._loader_html is None:
+            with self._open(
+                LOADER,
+                lambda: self._resolve_loader_page(lang_id),
+                encoding="utf-8",
+            ) as f:
+                self._loader_html = f.read()
+        return self._loader_html
+
+    def icon(self, path):
+        """
+        A wx.Icon for the given .ico file in the package, decoded once per process.
+        """
+        if path not in self._icons:
+            import wx
+
+            # We need the absolute path for wx.Icon, so resolve() is necessary
+            icon_path = str((self.root / path).resolve())
+            self._icons[path] = wx.Icon(icon_path, wx.BITMAP_TYPE_ICO)
+        return self._icons[path]
@@ -0,0 +1,9 @@
+from django.urls import path
+
+from kolibri_app.metrics import dashboard_view
+from kolibri_app.metrics import metrics_view
+
+urlpatterns = [
+    path("kolibri_app/metrics", metrics_view, name="kolibri_app_metrics"),
+    path("kolibri_app/dashboard", dashboard_view, name="kolibri_app_dashboard"),
+]
@@ -0,0 +1,117 @@
+"""
+Creation of the Kolibri process bus, shared by every way the app runs the server.
+
+Also keeps the HTTP port sticky across launches: the origin the WebView sees is
+http://localhost:<port>, so a new ephemeral port on every launch throws away the
+WebView's HTTP cache and localStorage, and makes the saved URL unusable. The
+last bound port is remembered and tried first, falling back to an ephemeral port
+when something else is using it.
+"""
+import json
+import os
+import socket
+import sys
+
+from kolibri.utils.conf import KOLIBRI_HOME
+from kolibri.utils.conf import OPTIONS
+
+from kolibri_app.logger import logging
+from kolibri_app.options import get_app_option
+from kolibri_app.tracer import tracer
+
+PORT_FILE = "app_port.json"
+
+
+def _port_file():
+    return os.path.join(KOLIBRI_HOME, PORT_FILE)
+
+
+def get_last_port():
+    try:
+        with open(_port_file(), "r", encoding="utf-8") as f:
+            return int(json.load(f)["port"])
+    except (IOError, ValueError, KeyError, TypeError):
+        return None
+
+
+def remember_port(port):
+    try:
+        with open(_port_file(), "w", encoding="utf-8") as f:
+            json.dump({"port": port}, f)
+    except OSError as e:
+        logging.warning("Could not remember HTTP port {}: {}".format(port, e))
+
+
+def is_port_available(address, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        if not sys.platform.startswith("win32"):
+            # Match the HTTP server, so a port in TIME_WAIT still counts as free.
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((address, port))
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+def get_http_port():
+    """
+    The configured HTTP port, or when it is left at 0 (the app default) the
+    port bound on the last launch if it is still free.
+    """
+    configured_port = OPTIONS["Deployment"]["HTTP_PORT"]
+    if configured_port:
+        return configured_port
+    last_port = get_last_port()
+    if last_port is None:
+        return 0
+    address = OPTIONS["Deployment"].get("LISTEN_ADDRESS") or "0.0.0.0"
+    if is_port_available(address, last_port):
+        logging.info("Reusing HTTP port {} from the last launch".format(last_port))
+        return last_port
+    logging.info(
+        "HTTP port {} from the last launch is in use, using a new one".format(last_port)
+    )
+    return 0
+
+
+def create_kolibri_server():
+    from kolibri.utils.server import KolibriProcessBus
+    from magicbus.plugins.tasks import Monitor
+
+    from kolibri_app.http_workers import enable_reuse_port
+    from kolibri_app.http_workers import get_worker_count
+    from kolibri_app.http_workers import HttpWorkerSupervisor
+    from kolibri_app.http_workers import multiprocess_serving_enabled
+    from kolibri_app.metrics import watch_bus
+    from kolibri_app.sessions import clear_stale_sessions
+    from kolibri_app.sessions import CLEANUP_INTERVAL
+    from kolibri_app.startup_progress import report_bus
+
+    kolibri_server = KolibriProcessBus(
+        port=get_http_port(),
+        zip_port=OPTIONS["Deployment"]["ZIP_CONTENT_PORT"],
+    )
+    tracer.trace_bus(kolibri_server)
+    report_bus(kolibri_server)
+    watch_bus(kolibri_server)
+
+    def on_serving(port):
+        if port != get_last_port():
+            remember_port(port)
+
+    kolibri_server.subscribe("SERVING", on_serving)
+
+    if get_app_option("SESSION_STALE_DAYS"):
+        Monitor(
+            kolibri_server,
+            clear_stale_sessions,
+            frequency=CLEANUP_INTERVAL,
+            name="stale session cleanup",
+        ).subscribe()
+
+    if multiprocess_serving_enabled() and enable_reuse_port(kolibri_server):
+        HttpWorkerSupervisor(kolibri_server, get_worker_count()).subscribe()
+    return kolibri_server
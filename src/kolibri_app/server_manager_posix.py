@@ -1,11 +1,37 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+from threading import Event
 from threading import Thread
 
-from kolibri.main import initialize
-from kolibri.utils.conf import OPTIONS
-from kolibri.utils.server import KolibriProcessBus
+import wx
+from kolibri.utils.conf import KOLIBRI_HOME
 from magicbus.plugins import SimplePlugin
 
+from kolibri_app.log_forwarding import open_server_stderr_log
+from kolibri_app.log_forwarding import replay_records
 from kolibri_app.logger import logging
+from kolibri_app.options import get_app_option
+from kolibri_app.server_process_posix import get_server_socket_path
+from kolibri_app.server_process_posix import MessageReader
+from kolibri_app.server_process_posix import send_message
+from kolibri_app.server_process_posix import versions_match
+from kolibri_app.startup_progress import INITIALIZE
+from kolibri_app.startup_progress import progress
+from kolibri_app.tracer import tracer
+from kolibri_app.warmup import warm_up_then
+
+MAX_SOCKET_RETRIES = 5
+SOCKET_RETRY_DELAY = 1
+
+# How long a server of another version gets to exit before it is replaced
+OUTDATED_SERVER_EXIT_TIMEOUT = 30
+
+# How often the server is polled for log records, and for readiness while it starts
+LOG_POLL_INTERVAL = 1
+STARTUP_POLL_INTERVAL = 0.25
 
 
 class AppPlugin(SimplePlugin):
@@ -15,7 +41,7 @@ class AppPlugin(SimplePlugin):
         self.bus.subscribe("SERVING", self.SERVING)
 
     def SERVING(self, port):
-        self.callback(port, root_url=None)
+        warm_up_then(port, lambda: self.callback(port, root_url=None))
 
 
 class PosixServerManager:
@@ -24,6 +50,9 @@ class PosixServerManager:
     by running it in a separate thread within the same process.
     """
 
+    # Read by the watchdog, a hung server shows in the stacks of this process.
+    server_in_process = True
+
     def __init__(self, app):
         self.app = app
         self.kolibri_server = None
@@ -39,15 +68,346 @@ class PosixServerManager:
         self.server_thread.start()
 
     def _run_kolibri_server(self):
-        initialize()
+        # Kolibri, Django and the plugin machinery are imported on the server
+        # thread so that none of it delays the first window being shown.
+        from kolibri.main import enable_plugin
+
+        from kolibri_app.fingerprint import initialize_kolibri
+        from kolibri_app.server import create_kolibri_server
 
-        self.kolibri_server = KolibriProcessBus(
-            port=OPTIONS["Deployment"]["HTTP_PORT"],
-            zip_port=OPTIONS["Deployment"]["ZIP_CONTENT_PORT"],
+        progress.listener = lambda event: wx.CallAfter(
+            self.app.on_startup_progress, [event]
         )
-        AppPlugin(self.kolibri_server, self.app.load_kolibri)
+        enable_plugin("kolibri_app")
+        with tracer.span("initialize"), progress.phase(INITIALIZE):
+            initialize_kolibri()
+
+        self.kolibri_server = create_kolibri_server()
+        AppPlugin(self.kolibri_server, self.app.server_ready)
         self.kolibri_server.run()
 
     def shutdown(self):
         if self.kolibri_server is not None:
             self.kolibri_server.transition("EXITED")
+
+
+class PosixSubprocessServerManager:
+    """
+    Manages a Kolibri server subprocess on macOS and Linux, mirroring the
+    Windows design. The server runs in its own session so that it survives the
+    UI, and a relaunched UI reattaches to it over a Unix domain socket instead
+    of starting a new one.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.server_process = None
+        self.keep_alive = get_app_option("SERVER_KEEP_ALIVE")
+
+        # Socket IPC client state
+        self.socket = None
+        self.socket_path = get_server_socket_path()
+        self.reader_thread = None
+        self.shutdown_event = Event()
+
+        # Can be 'attached' (reattached to a running server) or 'local'
+        self._server_mode = None
+        # Set when the attached server turned out to be of another version
+        self._outdated_server = False
+        self._connect_retry_count = 0
+        # When the server last replied on the socket, for the watchdog
+        self.last_heartbeat = None
+
+    def start(self):
+        if self._server_mode:
+            return
+
+        if self._server_is_listening():
+            logging.info("Found a running Kolibri server, reattaching to it.")
+            self._server_mode = "attached"
+        else:
+            logging.info("No running Kolibri server found. Starting a new one.")
+            self._server_mode = "local"
+            self._launch_server_process()
+
+        self.start_socket_client()
+
+    def _server_is_listening(self):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+            return True
+        except OSError:
+            return False
+        finally:
+            probe.close()
+
+    def _build_server_command_and_environment(self):
+        """
+        Build command line and environment for the server subprocess.
+        Detects PyInstaller bundle vs development mode.
+        """
+        if getattr(sys, "frozen", False):
+            cmd = [sys.executable, "--run-as-server"]
+        else:
+            cmd = [sys.executable, "-m", "kolibri_app", "--run-as-server"]
+
+        env = os.environ.copy()
+        env["KOLIBRI_HOME"] = os.environ.get("KOLIBRI_HOME", KOLIBRI_HOME)
+        env["DJANGO_SETTINGS_MODULE"] = "kolibri_app.django_app_settings"
+
+        return cmd, env
+
+    def _launch_server_process(self):
+        """
+        Launch the Kolibri server subprocess in a new session, so that it is not
+        taken down with the UI by terminal hangups or signals to its process group.
+        """
+        try:
+            cmd, env = self._build_server_command_and_environment()
+            logging.info(f"Launching server subprocess: {' '.join(cmd)}")
+            # The server's log records come over the socket, and it may outlive
+            # this process, so its output is not piped back to us. Only output
+            # below Python's level ends up in the stderr file.
+            with open_server_stderr_log() as stderr_log:
+                self.server_process = subprocess.Popen(
+                    cmd,
+                    env=env,
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL,
+                    stderr=stderr_log,
+                    start_new_session=True,
+                )
+            wx.CallLater(3000, self._check_server_process_health)
+        except (OSError, subprocess.SubprocessError) as e:
+            logging.error(f"Failed to launch server process: {e}", exc_info=True)
+            wx.CallAfter(self.app.notify_server_failed)
+
+    def _check_server_process_health(self):
+        """Check if the server process is still running after initial startup."""
+        if self.server_process and self.server_process.poll() is not None:
+            logging.error("Server process terminated unexpectedly during startup")
+            wx.CallAfter(self.app.notify_server_failed)
+
+    def start_socket_client(self):
+        """
+        Start the socket client thread for IPC communication.
+        Handles connection, server info requests, and reconnection.
+        """
+        if self.reader_thread and self.reader_thread.is_alive():
+            return
+        self.shutdown_event.clear()
+        self.reader_thread = Thread(target=self._reader_thread_func, daemon=True)
+        self.reader_thread.start()
+
+    def _reader_thread_func(self):
+        """
+        Socket client thread main loop.
+        Implements pull-based server readiness handshake to avoid race conditions.
+        """
+        while not self.shutdown_event.is_set():
+            try:
+                if self._connect_to_socket():
+                    self._connect_retry_count = 0
+                    self._process_socket_messages()
+                    self._close_socket()
+                    if self.shutdown_event.is_set():
+                        break
+                    if self._outdated_server:
+                        self._replace_outdated_server()
+                        continue
+                    self._handle_disconnection()
+            except OSError:
+                self._close_socket()
+                if self._handle_connect_failure():
+                    break
+            except ValueError as e:
+                logging.error(f"Error in socket reader thread: {e}", exc_info=True)
+                self._close_socket()
+            if self.shutdown_event.wait(timeout=SOCKET_RETRY_DELAY):
+                break
+
+    def _connect_to_socket(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self.socket = sock
+        logging.info("Connected to server socket.")
+        # Immediately request server connection information (pull-based handshake)
+        self._send_socket_message({"type": "request_server_info"})
+        return True
+
+    def _process_socket_messages(self):
+        """
+        Read the reply to the server info request, then poll the server for
+        log records and startup progress until the socket closes. Every request
+        gets exactly one reply.
+        """
+        reader = MessageReader(self.socket)
+        server_info_received = self._receive_socket_reply(reader)
+        if self._outdated_server:
+            return
+        while not self.shutdown_event.is_set():
+            interval = (
+                LOG_POLL_INTERVAL if server_info_received else STARTUP_POLL_INTERVAL
+            )
+            if self.shutdown_event.wait(timeout=interval):
+                break
+            self._send_socket_message({"type": "poll"})
+            reply = reader.read()
+            if reply is None:
+                break
+            self.last_heartbeat = time.monotonic()
+            replay_records(reply.get("logs", []))
+            if reply.get("progress"):
+                wx.CallAfter(self.app.on_startup_progress, reply["progress"])
+            if reply.get("server_ready") and not server_info_received:
+                self._send_socket_message({"type": "request_server_info"})
+                server_info_received = self._receive_socket_reply(reader)
+
+    def _receive_socket_reply(self, reader):
+        """
+        Read the reply to a server info request. Returns True if the server is ready.
+        """
+        message = reader.read()
+        if message is None:
+            return False
+        self.last_heartbeat = time.monotonic()
+        logging.debug(f"Socket client received message: {message}")
+        if not versions_match(message) and self._server_mode == "attached":
+            logging.info(
+                "The running Kolibri server is Kolibri {} with app {}, replacing it.".format(
+                    message.get("kolibri_version"), message.get("app_version")
+                )
+            )
+            self._send_socket_message({"type": "shutdown"})
+            self._outdated_server = True
+            return False
+        if message.get("type") != "server_ready":
+            return False
+        wx.CallAfter(self._handle_socket_message, message)
+        return True
+
+    def _handle_connect_failure(self):
+        """
+        The socket is not accepting connections yet, or any more. Returns True
+        if the reader thread should exit.
+        """
+        if self.shutdown_event.is_set():
+            return True
+        if self._server_mode == "local" and self.server_process:
+            if self.server_process.poll() is not None:
+                logging.error(
+                    "Local server process terminated unexpectedly. Attempting to restart."
+                )
+                wx.CallAfter(self._launch_server_process)
+            return False
+        self._connect_retry_count += 1
+        if self._connect_retry_count >= MAX_SOCKET_RETRIES:
+            logging.error("Lost the running Kolibri server. Starting a local server.")
+            self._connect_retry_count = 0
+            self._server_mode = "local"
+            wx.CallAfter(self._launch_server_process)
+        return False
+
+    def _replace_outdated_server(self):
+        """
+        Wait for a server of another version to exit after it was asked to,
+        then start one of this version. A server still initializing finishes
+        that first.
+        """
+        deadline = time.monotonic() + OUTDATED_SERVER_EXIT_TIMEOUT
+        while self._server_is_listening():
+            if time.monotonic() > deadline:
+                logging.warning(
+                    "The outdated Kolibri server did not exit, starting anyway."
+                )
+                break
+            if self.shutdown_event.wait(timeout=SOCKET_RETRY_DELAY):
+                return
+        self._outdated_server = False
+        self._connect_retry_count = 0
+        self._server_mode = "local"
+        wx.CallAfter(self._launch_server_process)
+
+    def _handle_disconnection(self):
+        logging.warning("Connection to Kolibri server lost, will reconnect.")
+
+    def _handle_socket_message(self, message):
+        """
+        Handle messages received from the server subprocess.
+        Runs on main UI thread and processes server responses.
+        """
+        msg_type = message.get("type")
+        if msg_type == "server_ready":
+            port = message["port"]
+            root_url = message["root_url"]
+            logging.info(f"Server is ready on port {port}. Loading URL.")
+            self.app.server_ready(port, root_url)
+
+    def get_heartbeat_age(self):
+        """Seconds since the server last replied on the socket, or None."""
+        if self.last_heartbeat is None:
+            return None
+        return time.monotonic() - self.last_heartbeat
+
+    def restart_server(self):
+        """
+        Kill a server this app started, e.g. because it hung. The reader thread
+        then finds the socket gone and launches a new one. Returns False for a
+        server that was already running when the app started.
+        """
+        if self._server_mode != "local" or self.server_process is None:
+            return False
+        if self.server_process.poll() is None:
+            self.server_process.terminate()
+            try:
+                self.server_process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                logging.warning("Server process ignored SIGTERM, killing it.")
+                self.server_process.kill()
+                self.server_process.wait()
+        return True
+
+    def _send_socket_message(self, message):
+        sock = self.socket
+        if sock is None:
+            logging.warning("Cannot send message, socket not connected.")
+            return
+        try:
+            send_message(sock, message)
+        except OSError as e:
+            logging.error(f"Failed to send message via socket: {e}")
+
+    def _close_socket(self):
+        sock, self.socket = self.socket, None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+    def shutdown(self):
+        """
+        Disconnect from the server, and stop it unless it is kept alive for the
+        next launch of the UI.
+        """
+        self.shutdown_event.set()
+        if not self.keep_alive:
+            logging.info("Shutting down server process...")
+            self._send_socket_message({"type": "shutdown"})
+        else:
+            logging.info("Leaving the Kolibri server running for the next launch.")
+        self._close_socket()
+        if self.reader_thread and self.reader_thread.is_alive():
+            self.reader_thread.join(timeout=5)
+        if not self.keep_alive and self.server_process:
+            try:
+                self.server_process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                logging.warning("Server process still running, terminating it.")
+                self.server_process.terminate()
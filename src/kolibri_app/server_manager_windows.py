@@ -6,13 +6,15 @@ It handles:
 - Server subprocess lifecycle management with Job Objects for cleanup
 - Named pipe IPC client communication with server subprocess
 - Pull-based server readiness handshake to avoid race conditions
-- Subprocess output logging and error handling
+- Pulling the server's log records, so that only the UI writes kolibri-app.txt
+- Error handling for the subprocess
 
 Architecture Overview:
 - Spawns server subprocess with --run-as-server flag
 - Uses Windows Job Objects to ensure subprocess cleanup on UI process exit
 - Named pipe client connects to server and requests connection info
 - Server responds with port and URL when Kolibri is fully initialized
+- Client keeps polling the server for its buffered log records
 - Handles subprocess crashes and pipe disconnections gracefully
 """
 import ctypes.wintypes
@@ -34,10 +36,12 @@ import win32service
 import winerror
 import wx
 from kolibri.utils.conf import KOLIBRI_HOME
-from kolibri.utils.server import stop as kolibri_stop
 
 from kolibri_app.constants import SERVICE_NAME
+from kolibri_app.log_forwarding import open_server_stderr_log
+from kolibri_app.log_forwarding import replay_records
 from kolibri_app.logger import logging
+from kolibri_app.windows_pipe import read_pipe_message
 
 
 # Named pipe for IPC between UI process and server subprocess
@@ -46,6 +50,10 @@ PIPE_NAME = r"\\.\pipe\KolibriAppServerIPC"
 MAX_PIPE_RETRIES = 5
 PIPE_RETRY_DELAY = 2
 
+# How often the server is polled for log records, and for readiness while it starts
+LOG_POLL_INTERVAL = 1
+STARTUP_POLL_INTERVAL = 0.25
+
 
 def is_service_running(service_name):
     """
@@ -97,6 +105,8 @@ class WindowsServerManager:
         # For state management and retry logic
         self._server_mode = None  # Can be 'service' or 'local'
         self._pipe_retry_count = 0
+        # When the server last replied on the pipe, for the watchdog
+        self.last_heartbeat = None
 
     def start(self):
         if self._server_mode:
@@ -149,6 +159,8 @@ class WindowsServerManager:
         """
         if self.server_process and self.server_process.poll() is None:
             logging.info("Shutting down server process...")
+            from kolibri.utils.server import stop as kolibri_stop
+
             try:
                 kolibri_stop()
             except OSError as e:
@@ -262,24 +274,6 @@ class WindowsServerManager:
         startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
         return startupinfo
 
-    def _setup_subprocess_logging(self):
-        """
-        Start background threads to forward subprocess output to application logging.
-        """
-        if self.server_process is None:
-            return
-
-        Thread(
-            target=self._log_subprocess_output,
-            args=(self.server_process.stdout, "stdout"),
-            daemon=True,
-        ).start()
-        Thread(
-            target=self._log_subprocess_output,
-            args=(self.server_process.stderr, "stderr"),
-            daemon=True,
-        ).start()
-
     def _assign_process_to_job_object(self):
         """
         Assign the server subprocess to the Job Object for automatic cleanup.
@@ -313,16 +307,17 @@ class WindowsServerManager:
 
             logging.info(f"Launching server subprocess: {' '.join(cmd)}")
 
-            # Launch subprocess with stdout/stderr pipes for logging
-            self.server_process = subprocess.Popen(
-                cmd,
-                env=env,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                startupinfo=startupinfo,
-            )
+            # The server's log records come over the pipe, its stdout goes into
+            # its log too, so only output below Python's level is kept here.
+            with open_server_stderr_log() as stderr_log:
+                self.server_process = subprocess.Popen(
+                    cmd,
+                    env=env,
+                    stdout=subprocess.DEVNULL,
+                    stderr=stderr_log,
+                    startupinfo=startupinfo,
+                )
 
-            self._setup_subprocess_logging()
             self._assign_process_to_job_object()
 
             # Monitor the process for early failure
@@ -344,20 +339,6 @@ class WindowsServerManager:
             logging.error("Server process terminated unexpectedly during startup")
             wx.CallAfter(self.app.notify_server_failed)
 
-    def _log_subprocess_output(self, pipe, pipe_name):
-        """
-        Forward subprocess stdout/stderr to application logging system.
-        """
-        try:
-            for line in iter(pipe.readline, b""):
-                if line:
-                    # Forward subprocess output to main application logging
-                    logging.info(
-                        f"Server {pipe_name}: {line.decode('utf-8', errors='replace').strip()}"
-                    )
-        finally:
-            pipe.close()
-
     def start_pipe_client(self):
         """
         Start the named pipe client thread for IPC communication.
@@ -431,24 +412,44 @@ class WindowsServerManager:
         return True
 
     def _process_pipe_messages(self):
-        """Process messages from the connected pipe."""
-        # Message processing loop for connected pipe
+        """
+        Read the reply to the server info request, then poll the server for
+        log records and startup progress until the pipe closes. Every request
+        gets exactly one reply.
+        """
+        server_info_received = self._receive_pipe_reply()
         while not self.pipe_shutdown_event.is_set():
-            hr, data = win32file.ReadFile(self.pipe_handle, 4096)
-            if hr == winerror.ERROR_SUCCESS or hr == winerror.ERROR_MORE_DATA:
-
-                if isinstance(data, bytes):
-                    text_data = data.decode("utf-8")
-                else:
-                    text_data = data
-
-                # Parse JSON message from client
-                message = json.loads(text_data)
-                logging.debug(f"Pipe client received message: {message}")
-                wx.CallAfter(self._handle_pipe_message, message)
-            else:
-                # Pipe closed by server - break inner loop to reconnect
+            interval = (
+                LOG_POLL_INTERVAL if server_info_received else STARTUP_POLL_INTERVAL
+            )
+            if self.pipe_shutdown_event.wait(timeout=interval):
+                break
+            self._send_pipe_message({"type": "poll"})
+            reply = read_pipe_message(self.pipe_handle)
+            if reply is None:
+                # Pipe closed by server - break to reconnect
                 break
+            self.last_heartbeat = time.monotonic()
+            replay_records(reply.get("logs", []))
+            if reply.get("progress"):
+                wx.CallAfter(self.app.on_startup_progress, reply["progress"])
+            if reply.get("server_ready") and not server_info_received:
+                self._send_pipe_message({"type": "request_server_info"})
+                server_info_received = self._receive_pipe_reply()
+
+    def _receive_pipe_reply(self):
+        """
+        Read the reply to a server info request. Returns True if the server is ready.
+        """
+        message = read_pipe_message(self.pipe_handle)
+        if message is None:
+            return False
+        self.last_heartbeat = time.monotonic()
+        logging.debug(f"Pipe client received message: {message}")
+        if message.get("type") != "server_ready":
+            return False
+        wx.CallAfter(self._handle_pipe_message, message)
+        return True
 
     def _should_exit_on_pipe_error(self, e):
         """Check if pipe error should cause thread to exit immediately."""
@@ -521,7 +522,29 @@ class WindowsServerManager:
             port = message["port"]
             root_url = message["root_url"]
             logging.info(f"Server is ready on port {port}. Loading URL.")
-            self.app.load_kolibri(port, root_url)
+            self.app.server_ready(port, root_url)
+
+    def get_heartbeat_age(self):
+        """Seconds since the server last replied on the pipe, or None."""
+        if self.last_heartbeat is None:
+            return None
+        return time.monotonic() - self.last_heartbeat
+
+    def restart_server(self):
+        """
+        Kill the server subprocess, e.g. because it hung. The pipe reader then
+        finds it gone and launches a new one. The service cannot be restarted
+        without administrator rights, so returns False in service mode.
+        """
+        if self._server_mode != "local" or self.server_process is None:
+            return False
+        if self.server_process.poll() is None:
+            self.server_process.kill()
+            try:
+                self.server_process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                logging.warning("Server process did not exit after being killed")
+        return True
 
     def _send_pipe_message(self, message):
         """
@@ -0,0 +1,440 @@
+"""POSIX Server Subprocess Implementation
+
+This module implements the Kolibri server that runs as a separate subprocess on
+Linux and macOS when the KolibriApp SERVER_MODE option is set to "subprocess".
+It mirrors the Windows design in server_process_windows, with a Unix domain
+socket in place of the named pipe.
+
+Architecture Overview:
+- The UI process spawns this module as a subprocess with the --run-as-server flag,
+  in its own session so that it outlives the UI.
+- `ServerProcess` binds the socket of the `UnixSocketIpcPlugin`, which accepts UI
+  connections in a background thread, one at a time, then initializes Kolibri and
+  the `KolibriProcessBus` and subscribes the plugin to the bus. Listening before
+  initialize() lets the UI show the progress of slow first-run migrations.
+- When the Kolibri server is ready, it fires a 'SERVING' event. The plugin
+  catches this and stores the server's port and initialization URL.
+- The UI process connects and sends a `request_server_info` message (pull-based
+  handshake) and receives the stored connection details, or `server_starting`.
+- The UI then keeps sending `poll` messages, each answered with an `updates` message
+  carrying the buffered log records (see log_forwarding), startup progress events
+  (see startup_progress) and whether the server is ready, as on Windows.
+- A relaunched UI finds the socket still accepting connections and reattaches to
+  the warm server instead of starting a new one. Both replies to
+  `request_server_info` carry the Kolibri and app versions of the server, so that
+  a UI of another version, e.g. after an upgrade, replaces the server instead.
+- The server exits when a UI sends `shutdown`, or when no UI has been connected
+  for SERVER_IDLE_TIMEOUT seconds.
+
+Messages are JSON objects, one per line.
+"""
+import hashlib
+import json
+import os
+import socket
+import stat
+import sys
+import tempfile
+import time
+from threading import Event
+from threading import Lock
+from threading import Thread
+
+import kolibri
+from kolibri.utils.conf import KOLIBRI_HOME
+from magicbus.plugins import SimplePlugin
+
+import kolibri_app
+from kolibri_app.log_forwarding import get_log_forwarder
+from kolibri_app.logger import logging
+from kolibri_app.options import get_app_option
+from kolibri_app.startup_progress import INITIALIZE
+from kolibri_app.startup_progress import progress
+from kolibri_app.tracer import tracer
+
+SOCKET_NAME = "kolibri-app-server.sock"
+
+# sun_path is limited to 104 bytes on macOS and 108 on Linux
+MAX_SOCKET_PATH = 100
+
+# How often the accept loop wakes up to check for shutdown and idleness
+ACCEPT_TIMEOUT = 1
+
+# How long to wait for a server already listening on the socket to accept
+PROBE_TIMEOUT = 2
+
+
+def get_server_socket_path():
+    """
+    The socket lives in KOLIBRI_HOME, unless that path is too long for a Unix
+    socket, in which case it is named after KOLIBRI_HOME in a directory of the
+    user's own in the temporary directory.
+    """
+    path = os.path.join(KOLIBRI_HOME, SOCKET_NAME)
+    if len(path.encode("utf-8")) <= MAX_SOCKET_PATH:
+        return path
+    digest = hashlib.sha1(KOLIBRI_HOME.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(
+        tempfile.gettempdir(),
+        "kolibri-app-{}".format(os.getuid()),
+        "{}.sock".format(digest),
+    )
+
+
+def make_private_dir(path):
+    """
+    Create a directory only the current user can access, or check that an
+    existing one is, as a directory in /tmp may have been created by anyone.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    if (
+        not stat.S_ISDIR(st.st_mode)
+        or st.st_uid != os.getuid()
+        or stat.S_IMODE(st.st_mode) & 0o077
+    ):
+        raise RuntimeError("{} is not a private directory".format(path))
+
+
+def get_versions():
+    """The versions a server and a UI must share for the UI to use the server."""
+    return {
+        "kolibri_version": kolibri.__version__,
+        "app_version": kolibri_app.__version__,
+    }
+
+
+def versions_match(message):
+    """Whether a server info reply comes from a server of this version."""
+    return all(message.get(key) == value for key, value in get_versions().items())
+
+
+def send_message(sock, message):
+    sock.sendall(json.dumps(message).encode("utf-8") + b"\n")
+
+
+class MessageReader(object):
+    """Splits the byte stream of a socket into JSON messages."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self._buffer = b""
+
+    def read(self):
+        """
+        Return the next message, or None once the other side closed the socket.
+        """
+        while b"\n" not in self._buffer:
+            data = self.sock.recv(65536)
+            if not data:
+                return None
+            self._buffer += data
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        return json.loads(line.decode("utf-8"))
+
+
+class UnixSocketIpcPlugin(SimplePlugin):
+    """
+    A magicbus plugin to manage Unix socket IPC for the POSIX server subprocess.
+    Handles socket creation, client communication, and server readiness signaling.
+    """
+
+    def __init__(self, bus=None):
+        super().__init__(bus)
+        self.socket_path = get_server_socket_path()
+        self.server_socket = None
+        self.client = None
+        self.client_lock = Lock()
+        self.accept_thread = None
+        self.shutdown_event = Event()
+        # Read in attach(), the server never stops for idleness while Kolibri
+        # is initializing.
+        self.idle_timeout = None
+        self.last_client_seen = time.monotonic()
+
+        self.server_ready_event = Event()
+        self.ready_port = None
+        self.ready_root_url = None
+        # A shutdown asked for before the bus existed, see ServerProcess.run
+        self.shutdown_requested = False
+
+    def attach(self, bus):
+        """Subscribe to the bus, once Kolibri is initialized."""
+        self.bus = bus
+        self.idle_timeout = get_app_option("SERVER_IDLE_TIMEOUT")
+        self.last_client_seen = time.monotonic()
+        self.bus.subscribe("SERVING", self.on_server_start)
+        self.subscribe()
+
+    def START(self):
+        """Plugin start method: starts listening, unless it already does."""
+        if self.accept_thread is None:
+            self.listen()
+
+    def listen(self):
+        """Bind the socket and start the IPC thread."""
+        self.server_socket = self._create_server_socket()
+        self.accept_thread = Thread(target=self._accept_loop, daemon=True)
+        self.accept_thread.start()
+        logging.info(
+            "UnixSocketIpcPlugin started, listening on {}".format(self.socket_path)
+        )
+
+    def STOP(self):
+        """Plugin stop method: cleans up the IPC thread and socket."""
+        self.shutdown_event.set()
+        with self.client_lock:
+            if self.client:
+                try:
+                    self.client.close()
+                except OSError:
+                    pass
+        if self.accept_thread:
+            self.accept_thread.join(timeout=5)
+        if self.server_socket:
+            self.server_socket.close()
+            self.server_socket = None
+            # Only remove the socket this plugin bound
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+        logging.info("UnixSocketIpcPlugin stopped.")
+
+    def _create_server_socket(self):
+        socket_dir = os.path.dirname(self.socket_path)
+        if socket_dir != KOLIBRI_HOME:
+            make_private_dir(socket_dir)
+        self._remove_stale_socket()
+        server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server_socket.bind(self.socket_path)
+        # Only the user running Kolibri may talk to the server.
+        os.chmod(self.socket_path, 0o600)
+        server_socket.listen(1)
+        server_socket.settimeout(ACCEPT_TIMEOUT)
+        return server_socket
+
+    def _remove_stale_socket(self):
+        """
+        Remove a socket left behind by a server that did not exit cleanly. One
+        that still accepts connections belongs to a running server, e.g. when
+        two UIs started a server at the same time, and is left alone.
+        """
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        probe.settimeout(PROBE_TIMEOUT)
+        try:
+            probe.connect(self.socket_path)
+        except FileNotFoundError:
+            return
+        except ConnectionRefusedError:
+            logging.info("Removing stale server socket {}".format(self.socket_path))
+            os.unlink(self.socket_path)
+            return
+        except OSError:
+            # A server too busy to accept is still running
+            pass
+        finally:
+            probe.close()
+        raise RuntimeError(
+            "Another Kolibri server is listening on {}".format(self.socket_path)
+        )
+
+    def _construct_server_urls(self, port):
+        """
+        Construct the server URLs based on the port.
+        """
+        from kolibri.core.device.utils import app_initialize_url
+
+        kolibri_origin = f"http://localhost:{port}"
+        root_url = kolibri_origin + app_initialize_url()
+        return kolibri_origin, root_url
+
+    def on_server_start(self, port):
+        """
+        Callback invoked when the Kolibri server's 'SERVING' event fires.
+        """
+        from kolibri_app.warmup import warm_up_then
+
+        logging.info(f"Server is running on port {port}. Ready for client requests.")
+
+        _, root_url = self._construct_server_urls(port)
+
+        self.ready_port = port
+        self.ready_root_url = root_url
+        # Only hand the URL to the UI once warm up is done or its deadline passed.
+        warm_up_then(port, self._mark_server_ready)
+
+    def _mark_server_ready(self):
+        self.server_ready_event.set()
+        tracer.write()
+
+    def _handle_server_info_request(self):
+        """
+        Handles a server info request from the UI process via the socket.
+        Answers right away, the UI asks again once a poll says the server is ready.
+        """
+        if self.server_ready_event.is_set():
+            logging.info("Client requested server info, sending ready response.")
+            self._send_message(
+                dict(
+                    get_versions(),
+                    type="server_ready",
+                    port=self.ready_port,
+                    root_url=self.ready_root_url,
+                )
+            )
+        else:
+            self._send_message(dict(get_versions(), type="server_starting"))
+
+    def _handle_poll_request(self):
+        """
+        Handles a poll from the UI process, answering with the buffered log records.
+        """
+        forwarder = get_log_forwarder()
+        self._send_message(
+            {
+                "type": "updates",
+                "server_ready": self.server_ready_event.is_set(),
+                "logs": forwarder.drain() if forwarder else [],
+                "progress": progress.drain(),
+            }
+        )
+
+    def _handle_shutdown_request(self):
+        logging.info("Client requested server shutdown.")
+        if self.bus is None:
+            # Kolibri is still initializing, stopping it midway could leave
+            # its databases half migrated.
+            self.shutdown_requested = True
+            return
+        # Transition from another thread, STOP joins the accept thread.
+        Thread(target=self.bus.transition, args=("EXITED",), daemon=True).start()
+
+    def _send_message(self, message):
+        with self.client_lock:
+            if not self.client:
+                logging.warning("Cannot send message, no client connected.")
+                return
+            try:
+                send_message(self.client, message)
+            except OSError:
+                logging.info("Client disconnected, cannot send message.")
+
+    def _process_client_messages(self, reader):
+        while not self.shutdown_event.is_set():
+            message = reader.read()
+            if message is None:
+                break
+            msg_type = message.get("type")
+            if msg_type == "poll":
+                self._handle_poll_request()
+            elif msg_type == "request_server_info":
+                logging.debug(f"Socket server received message: {message}")
+                self._handle_server_info_request()
+            elif msg_type == "shutdown":
+                self._handle_shutdown_request()
+                break
+
+    def _check_idle(self):
+        if not self.idle_timeout:
+            return
+        idle_for = time.monotonic() - self.last_client_seen
+        if idle_for > self.idle_timeout:
+            logging.info(
+                "No UI connected for {:.0f} s, shutting down the server.".format(
+                    idle_for
+                )
+            )
+            self._handle_shutdown_request()
+            self.shutdown_event.set()
+
+    def _accept_loop(self):
+        """
+        Main socket server loop, serves one UI client at a time.
+        """
+        logging.info("Socket server thread started.")
+        while not self.shutdown_event.is_set():
+            try:
+                client, _ = self.server_socket.accept()
+            except socket.timeout:
+                self._check_idle()
+                continue
+            except OSError as e:
+                if not self.shutdown_event.is_set():
+                    logging.error(f"Socket server error: {e}", exc_info=True)
+                break
+
+            logging.info("Client connected to server socket.")
+            client.settimeout(None)
+            with self.client_lock:
+                self.client = client
+            forwarder = get_log_forwarder()
+            if forwarder:
+                forwarder.client_connected()
+            try:
+                self._process_client_messages(MessageReader(client))
+            except (OSError, ValueError) as e:
+                if not self.shutdown_event.is_set():
+                    logging.error(f"Error in socket server thread: {e}", exc_info=True)
+            finally:
+                if forwarder:
+                    forwarder.client_disconnected()
+                with self.client_lock:
+                    self.client = None
+                client.close()
+                self.last_client_seen = time.monotonic()
+                logging.info("Client disconnected.")
+
+        logging.info("Socket server thread finished.")
+
+
+class ServerProcess:
+    """
+    Main server process coordinator for the POSIX subprocess implementation.
+    Manages the Kolibri server initialization and runs it with the IPC plugin.
+    """
+
+    def __init__(self):
+        self.kolibri_server = None
+
+    def _initialize_kolibri(self):
+        """
+        Initialize Kolibri with required plugins and configuration.
+        """
+        from kolibri.main import enable_plugin
+
+        from kolibri_app.fingerprint import initialize_kolibri
+
+        logging.info("Server process: Initializing Kolibri...")
+        enable_plugin("kolibri_app")
+        with tracer.span("initialize"), progress.phase(INITIALIZE):
+            initialize_kolibri()
+
+    def run(self):
+        """
+        Main server process entry point, initializes and runs Kolibri server.
+        The server runs until a UI asks it to shut down or it has been idle too long.
+        """
+        from kolibri_app.server import create_kolibri_server
+
+        ipc_plugin = UnixSocketIpcPlugin()
+        try:
+            ipc_plugin.listen()
+            self._initialize_kolibri()
+            if ipc_plugin.shutdown_requested:
+                logging.info("Server process: Shutdown requested while initializing.")
+                return
+            self.kolibri_server = create_kolibri_server()
+            ipc_plugin.attach(self.kolibri_server)
+
+            logging.info("Server process: Starting Kolibri server...")
+            # Start serving, this blocks until shutdown
+            self.kolibri_server.run()
+        except (ImportError, OSError, RuntimeError, ValueError) as e:
+            logging.error(f"Server process error: {e}", exc_info=True)
+            sys.exit(1)
+        finally:
+            # The bus stops the plugin when it exits, without a bus, e.g. after
+            # an error, the socket file would be left behind.
+            if ipc_plugin.server_socket is not None:
+                ipc_plugin.STOP()
@@ -6,13 +6,20 @@ to manage Inter-Process Communication (IPC) with the main UI process via a named
 
 Architecture Overview:
 - The main UI process spawns this module as a subprocess with the --run-as-server flag.
-- `ServerProcess` initializes Kolibri and the `KolibriProcessBus`.
-- The `WindowsIpcPlugin` is subscribed to the bus. On its `START` event, it creates
-  a named pipe and listens for a connection from the UI process in a background thread.
+- `ServerProcess` starts the `WindowsIpcPlugin`, which creates a named pipe and
+  listens for a connection from the UI process in a background thread, then
+  initializes Kolibri and the `KolibriProcessBus` and subscribes the plugin to the
+  bus. Listening before initialize() lets the UI show the progress of slow
+  first-run migrations.
 - When the Kolibri server is ready, it fires a 'SERVING' event. The plugin
   catches this and stores the server's port and initialization URL.
 - The UI process connects and sends a `request_server_info` message (pull-based handshake).
-- The plugin responds with the stored connection details, allowing the UI to load Kolibri.
+- The plugin responds with the stored connection details, allowing the UI to load Kolibri,
+  or with `server_starting` if the server is not ready yet.
+- The UI then keeps sending `poll` messages, each answered with an `updates` message
+  carrying the log records buffered since the last one (see log_forwarding), the
+  startup progress events (see startup_progress) and whether the server is ready,
+  so the UI can request the server info again.
 - On the `STOP` event, the plugin cleans up its thread and handles.
 """
 import json
@@ -36,11 +43,18 @@ if getattr(sys, "frozen", False) and hasattr(sys, "_MEIPASS"):
     sys.path.insert(0, os.path.join(sys._MEIPASS, "kolibrisrc"))
     sys.path.insert(0, os.path.join(sys._MEIPASS, "kolibrisrc", "kolibri", "dist"))
 
-from kolibri.main import initialize
+from kolibri.main import enable_plugin
 from kolibri.core.device.utils import app_initialize_url
-from kolibri.utils.conf import OPTIONS
-from kolibri.utils.server import KolibriProcessBus
+from kolibri_app.fingerprint import initialize_kolibri
+from kolibri_app.log_forwarding import get_log_forwarder
 from kolibri_app.logger import logging
+from kolibri_app.server import create_kolibri_server
+from kolibri_app.startup_progress import INITIALIZE
+from kolibri_app.startup_progress import progress
+from kolibri_app.tracer import tracer
+from kolibri_app.warmup import warm_up_then
+from kolibri_app.windows_pipe import PIPE_BUFFER_SIZE
+from kolibri_app.windows_pipe import read_pipe_message
 
 # Named pipe for IPC between UI process and server subprocess
 # Uses Windows named pipe format: \\.<hostname>\pipe\<pipename>
@@ -53,7 +67,7 @@ class WindowsIpcPlugin(SimplePlugin):
     Handles pipe creation, client communication, and server readiness signaling.
     """
 
-    def __init__(self, bus):
+    def __init__(self, bus=None):
         super().__init__(bus)
         self.pipe_thread = None
         self.pipe = None
@@ -64,10 +78,19 @@ class WindowsIpcPlugin(SimplePlugin):
         self.ready_port = None
         self.ready_root_url = None
 
+    def attach(self, bus):
+        """Subscribe to the bus, once Kolibri is initialized."""
+        self.bus = bus
         self.bus.subscribe("SERVING", self.on_server_start)
+        self.subscribe()
 
     def START(self):
-        """Plugin start method: starts the IPC thread."""
+        """Plugin start method: starts the IPC thread, unless it already runs."""
+        if self.pipe_thread is None:
+            self.listen()
+
+    def listen(self):
+        """Start the IPC thread."""
         self.pipe_thread = Thread(target=self._pipe_server_loop, daemon=True)
         self.pipe_thread.start()
         logging.info("WindowsIpcPlugin started and is waiting for clients.")
@@ -98,7 +121,12 @@ class WindowsIpcPlugin(SimplePlugin):
 
         self.ready_port = port
         self.ready_root_url = root_url
+        # Only hand the URL to the UI once warm up is done or its deadline passed.
+        warm_up_then(port, self._mark_server_ready)
+
+    def _mark_server_ready(self):
         self.server_ready_event.set()
+        tracer.write()
 
     def _create_server_ready_payload(self):
         """
@@ -113,16 +141,28 @@ class WindowsIpcPlugin(SimplePlugin):
     def _handle_server_info_request(self):
         """
         Handles a server info request from the UI process via the pipe.
+        Answers right away, the UI asks again once a poll says the server is ready.
         """
-        # Wait for the on_server_start callback to fire
-        if self.server_ready_event.wait(timeout=60):
+        if self.server_ready_event.is_set():
             payload = self._create_server_ready_payload()
             logging.info("Client requested server info, sending ready response.")
             self._send_pipe_message(payload)
         else:
-            logging.error(
-                "Server info was requested, but server failed to become ready in time."
-            )
+            self._send_pipe_message({"type": "server_starting"})
+
+    def _handle_poll_request(self):
+        """
+        Handles a poll from the UI process, answering with the buffered log records.
+        """
+        forwarder = get_log_forwarder()
+        self._send_pipe_message(
+            {
+                "type": "updates",
+                "server_ready": self.server_ready_event.is_set(),
+                "logs": forwarder.drain() if forwarder else [],
+                "progress": progress.drain(),
+            }
+        )
 
     def _send_pipe_message(self, message):
         """
@@ -166,8 +206,8 @@ class WindowsIpcPlugin(SimplePlugin):
             | win32pipe.PIPE_READMODE_MESSAGE
             | win32pipe.PIPE_WAIT,
             win32pipe.PIPE_UNLIMITED_INSTANCES,
-            65536,
-            65536,
+            PIPE_BUFFER_SIZE,
+            PIPE_BUFFER_SIZE,
             0,
             security_attributes,
         )
@@ -190,22 +230,16 @@ class WindowsIpcPlugin(SimplePlugin):
         """
         while not self.shutdown_event.is_set():
             assert self.pipe is not None, "Pipe must be connected before reading"
-            hr, data = win32file.ReadFile(self.pipe, 4096)
-            if hr != winerror.ERROR_SUCCESS and hr != winerror.ERROR_MORE_DATA:
+            message = read_pipe_message(self.pipe)
+            if message is None:
                 break
 
-            if isinstance(data, bytes):
-                text_data = data.decode("utf-8")
-            else:
-                text_data = data
-
-            # Parse JSON message from client
-            message = json.loads(text_data)
-            logging.debug(f"Pipe server received message: {message}")
-
-            # Handle server info requests (part of startup handshake)
-            if message.get("type") == "request_server_info":
-                # The plugin handles this request directly
+            msg_type = message.get("type")
+            if msg_type == "poll":
+                self._handle_poll_request()
+            elif msg_type == "request_server_info":
+                # Part of the startup handshake
+                logging.debug(f"Pipe server received message: {message}")
                 self._handle_server_info_request()
 
     def _handle_pipe_error(self, error):
@@ -255,8 +289,13 @@ class WindowsIpcPlugin(SimplePlugin):
                     break
                 self.pipe = pipe_handle
 
+            forwarder = get_log_forwarder()
+            connected = False
             try:
                 self._wait_for_client_connection()
+                connected = True
+                if forwarder:
+                    forwarder.client_connected()
                 self._process_client_messages()
 
             except pywintypes.error as e:
@@ -266,6 +305,8 @@ class WindowsIpcPlugin(SimplePlugin):
                 if not self.shutdown_event.is_set():
                     logging.error(f"Error in pipe server thread: {e}", exc_info=True)
             finally:
+                if forwarder and connected:
+                    forwarder.client_disconnected()
                 self._cleanup_pipe()
 
         logging.info("Pipe server thread finished.")
@@ -285,34 +326,27 @@ class ServerProcess:
         Initialize Kolibri with required plugins and configuration.
         """
         logging.info("Server process: Initializing Kolibri...")
-        initialize()
+        enable_plugin("kolibri_app")
+        with tracer.span("initialize"), progress.phase(INITIALIZE):
+            initialize_kolibri()
 
     def _create_kolibri_server(self):
         """
         Create and configure the Kolibri server instance.
         """
-        return KolibriProcessBus(
-            port=OPTIONS["Deployment"]["HTTP_PORT"],
-            zip_port=OPTIONS["Deployment"]["ZIP_CONTENT_PORT"],
-        )
-
-    def _setup_ipc_plugin(self):
-        """
-        Create and subscribe the IPC plugin to the server.
-        """
-        ipc_plugin = WindowsIpcPlugin(self.kolibri_server)
-        ipc_plugin.subscribe()
-        return ipc_plugin
+        return create_kolibri_server()
 
     def run(self):
         """
         Main server process entry point, initializes and runs Kolibri server.
         The server runs until terminated by the Job Object or explicit shutdown.
         """
+        ipc_plugin = WindowsIpcPlugin()
         try:
+            ipc_plugin.listen()
             self._initialize_kolibri()
             self.kolibri_server = self._create_kolibri_server()
-            self._setup_ipc_plugin()
+            ipc_plugin.attach(self.kolibri_server)
 
             logging.info("Server process: Starting Kolibri server...")
             # Start serving, this blocks until shutdown
@@ -0,0 +1,77 @@
+"""
+Session engine of the desktop caching profile, see django_app_settings.
+
+Kolibri keeps sessions in its sessions database, so every request reads its
+session from SQLite, and the app's session cookie lives for years, so sessions
+are never old enough for Kolibri's clearsessions to remove them. This engine is
+Kolibri's session store on top of Django's cached_db one: sessions are read
+from the default cache and only fall back to the database on a miss, while
+every change is still written to the database first, so nothing is lost when
+the cache evicts a session or the server restarts.
+
+Sessions deleted from the database, by Kolibri or by clear_stale_sessions, are
+evicted from the cache as well. clear_stale_sessions deletes the sessions that
+were last saved more than SESSION_STALE_DAYS ago; Kolibri saves a session at
+least on every session heartbeat of an open Kolibri page, so those are sessions
+nobody has used for that long.
+"""
+import datetime
+import logging as log
+
+from django.contrib.sessions.backends.cached_db import KEY_PREFIX
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from kolibri.core.auth.backends import SessionStore as KolibriSessionStore
+
+from kolibri_app.options import get_app_option
+
+# Seconds between two runs of clear_stale_sessions in the server process
+CLEANUP_INTERVAL = 15 * 60
+
+logger = log.getLogger(__name__)
+
+
+class SessionStore(KolibriSessionStore, CachedDBStore):
+    pass
+
+
+def evict_cached_session(sender, instance, **kwargs):
+    """post_delete receiver of Kolibri's Session model."""
+    from django.conf import settings
+    from django.core.cache import caches
+
+    caches[settings.SESSION_CACHE_ALIAS].delete(KEY_PREFIX + instance.session_key)
+
+
+def install():
+    from django.db.models.signals import post_delete
+
+    post_delete.connect(evict_cached_session, sender=SessionStore.get_model_class())
+
+
+def clear_stale_sessions():
+    """Delete the expired sessions and those not saved for SESSION_STALE_DAYS."""
+    from django.conf import settings
+    from django.db import connections
+    from django.utils import timezone
+
+    now = timezone.now()
+    # A session expires SESSION_COOKIE_AGE seconds after it was last saved.
+    cutoff = (
+        now
+        + datetime.timedelta(seconds=settings.SESSION_COOKIE_AGE)
+        - datetime.timedelta(days=get_app_option("SESSION_STALE_DAYS"))
+    )
+    try:
+        deleted, _ = (
+            SessionStore.get_model_class()
+            .objects.filter(expire_date__lt=max(cutoff, now))
+            .delete()
+        )
+        if deleted:
+            logger.info("Deleted {} stale sessions".format(deleted))
+    except Exception as e:
+        # The next run tries again, raising would stop the cleanup for good.
+        logger.warning("Could not delete stale sessions: {}".format(e))
+    finally:
+        # Runs every CLEANUP_INTERVAL, no need to hold connections in between.
+        connections.close_all()
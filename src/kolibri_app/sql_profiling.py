@@ -0,0 +1,235 @@
+"""
+SQL query profiling, turned on with SQL_PROFILING.
+
+For every request, the metrics middleware records each query Django runs
+against any database, grouped by its shape: the SQL with literals and IN lists
+replaced by placeholders, so the same query for different rows counts as one.
+A shape that runs N_PLUS_ONE_MIN times or more in a single request is flagged
+as a likely N+1 pattern, and logged the first time it shows up for a URL
+pattern.
+
+Per URL pattern the profile keeps the number of requests, queries and their
+time, and the shapes with the most time spent in them. It is written every
+REPORT_INTERVAL seconds, and at exit, to KOLIBRI_HOME/sql_profiles as one JSON
+file per process, so the report comes from the device's own SQLite and disk.
+"""
+import atexit
+import json
+import logging as log
+import os
+import re
+import threading
+import time
+
+from kolibri.utils.conf import KOLIBRI_HOME
+
+REPORT_DIR = "sql_profiles"
+# Reports of earlier runs kept in REPORT_DIR
+MAX_REPORT_FILES = 30
+# Seconds between two writes of the report
+REPORT_INTERVAL = 60
+# Runs of one shape in one request from which it is reported as an N+1 pattern
+N_PLUS_ONE_MIN = 5
+# Shapes kept per URL pattern, the rest are counted as "other"
+MAX_SHAPES_PER_ROUTE = 100
+# Shapes per URL pattern in the report
+TOP_SHAPES = 10
+OTHER_SHAPE = "other"
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+IN_LIST_RE = re.compile(r"\bIN\s*\((?:\s*(?:\?|%s)\s*,?)+\)", re.IGNORECASE)
+SPACE_RE = re.compile(r"\s+")
+
+logger = log.getLogger("kolibri_app.sql_profiling")
+
+
+def query_shape(sql):
+    """The SQL with its literals and IN lists replaced by placeholders."""
+    shape = STRING_RE.sub("?", sql)
+    shape = NUMBER_RE.sub("?", shape)
+    shape = IN_LIST_RE.sub("IN (...)", shape)
+    return SPACE_RE.sub(" ", shape).strip()
+
+
+class QueryRecorder(object):
+    """
+    The queries of one request, see execute_wrapper. Has the count and duration
+    of metrics.QueryTimer, so it can take its place.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        # shape: [count, duration]
+        self.shapes = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            shape = self.shapes.setdefault(query_shape(sql), [0, 0.0])
+            shape[0] += 1
+            shape[1] += duration
+
+
+class SqlProfile(object):
+    """Query statistics per URL pattern, across requests."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.routes = {}
+        self.changed = False
+        self.started = time.time()
+
+    def record(self, route, recorder):
+        flagged = []
+        with self._lock:
+            stats = self.routes.get(route)
+            if stats is None:
+                stats = self.routes[route] = {
+                    "requests": 0,
+                    "queries": 0,
+                    "duration": 0.0,
+                    "max_queries": 0,
+                    "n_plus_one_requests": 0,
+                    "shapes": {},
+                }
+            stats["requests"] += 1
+            stats["queries"] += recorder.count
+            stats["duration"] += recorder.duration
+            stats["max_queries"] = max(stats["max_queries"], recorder.count)
+            n_plus_one = False
+            for shape, (count, duration) in recorder.shapes.items():
+                shape_stats = stats["shapes"].get(shape)
+                if shape_stats is None:
+                    if len(stats["shapes"]) >= MAX_SHAPES_PER_ROUTE:
+                        shape = OTHER_SHAPE
+                    shape_stats = stats["shapes"].setdefault(
+                        shape,
+                        {
+                            "count": 0,
+                            "duration": 0.0,
+                            "max_per_request": 0,
+                            "n_plus_one": False,
+                        },
+                    )
+                shape_stats["count"] += count
+                shape_stats["duration"] += duration
+                shape_stats["max_per_request"] = max(
+                    shape_stats["max_per_request"], count
+                )
+                if count >= N_PLUS_ONE_MIN and shape != OTHER_SHAPE:
+                    n_plus_one = True
+                    if not shape_stats["n_plus_one"]:
+                        shape_stats["n_plus_one"] = True
+                        flagged.append((shape, count))
+            if n_plus_one:
+                stats["n_plus_one_requests"] += 1
+            self.changed = True
+        for shape, count in flagged:
+            logger.warning(
+                "Possible N+1 queries in {}: {} runs in one request of: {}".format(
+                    route, count, shape
+                )
+            )
+
+    def report(self):
+        with self._lock:
+            routes = json.loads(json.dumps(self.routes))
+        report_routes = []
+        for route, stats in routes.items():
+            shapes = sorted(
+                (
+                    dict(shape_stats, sql=shape)
+                    for shape, shape_stats in stats.pop("shapes").items()
+                ),
+                key=lambda shape_stats: shape_stats["duration"],
+                reverse=True,
+            )
+            stats["route"] = route
+            stats["queries_per_request"] = round(
+                stats["queries"] / stats["requests"], 1
+            )
+            stats["duration_ms"] = round(stats.pop("duration") * 1000, 1)
+            for shape_stats in shapes:
+                shape_stats["duration_ms"] = round(
+                    shape_stats.pop("duration") * 1000, 1
+                )
+            stats["n_plus_one"] = [shape for shape in shapes if shape["n_plus_one"]]
+            stats["top_shapes"] = shapes[:TOP_SHAPES]
+            report_routes.append(stats)
+        report_routes.sort(key=lambda stats: stats["duration_ms"], reverse=True)
+        return {
+            "pid": os.getpid(),
+            "started": self.started,
+            "written": time.time(),
+            "routes": report_routes,
+        }
+
+    def write(self):
+        with self._lock:
+            if not self.changed:
+                return
+            self.changed = False
+        tmp_path = self.path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.report(), f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning("Could not write the SQL profile: {}".format(e))
+
+    def _write_periodically(self):
+        while True:
+            time.sleep(REPORT_INTERVAL)
+            self.write()
+
+    def start(self):
+        threading.Thread(
+            target=self._write_periodically, name="SQL profile writer", daemon=True
+        ).start()
+        atexit.register(self.write)
+
+
+def _prune_reports(report_dir):
+    try:
+        names = sorted(
+            name for name in os.listdir(report_dir) if name.endswith(".json")
+        )
+    except OSError:
+        return
+    for name in names[: max(0, len(names) - MAX_REPORT_FILES)]:
+        try:
+            os.remove(os.path.join(report_dir, name))
+        except OSError:
+            pass
+
+
+_profile = None
+_profile_lock = threading.Lock()
+
+
+def get_profile():
+    """The profile of this process, started on first use."""
+    global _profile
+    with _profile_lock:
+        if _profile is None:
+            report_dir = os.path.join(KOLIBRI_HOME, REPORT_DIR)
+            _prune_reports(report_dir)
+            path = os.path.join(
+                report_dir,
+                "sql_profile_{}_{}.json".format(
+                    time.strftime("%Y%m%d_%H%M%S"), os.getpid()
+                ),
+            )
+            logger.info("Profiling SQL queries to {}".format(path))
+            _profile = SqlProfile(path)
+            _profile.start()
+        return _profile
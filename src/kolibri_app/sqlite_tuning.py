@@ -0,0 +1,137 @@
+"""
+SQLite pragmas for desktop deployments.
+
+Kolibri opens its SQLite databases with SQLite's defaults, which favour
+durability on every commit over speed. The app runs on anything from SSDs to
+spinning disks and SD cards, so every new connection gets a tuned set of
+pragmas, in one of two profiles:
+
+- "default", for the databases Django opens (the main database and Kolibri's
+  smaller ones for sync, sessions, jobs...), which are written to all the time:
+  WAL with synchronous=NORMAL, which in WAL mode can lose the last commits on
+  power loss but never corrupts the database, a larger page cache, memory
+  mapped reads and temporary tables in memory.
+- "content", for the channel databases Kolibri reads with SQLAlchemy, which
+  are only read once imported and may sit on a read-only drive, so their
+  journal mode is left alone: a page cache and a larger memory map. Channel
+  imports, which write to the main database through SQLAlchemy, get the
+  default profile.
+
+busy_timeout is only ever raised, never lowered below the timeout Kolibri opens
+a connection with. The values are app options, see options.py.
+"""
+import logging as log
+import os
+import re
+import sqlite3
+
+from kolibri_app.options import get_app_option
+
+PROFILE_DEFAULT = "default"
+PROFILE_CONTENT = "content"
+
+# File names of the channel databases, e.g. under content/databases
+CHANNEL_DATABASE_RE = re.compile(r"^[0-9a-f]{32}\.sqlite3$")
+
+logger = log.getLogger(__name__)
+
+_logged_profiles = set()
+
+
+def get_pragmas(profile):
+    """(name, value) pairs of the pragmas of a profile, in the order to apply them."""
+    if profile == PROFILE_CONTENT:
+        cache_size = get_app_option("SQLITE_CONTENT_CACHE_SIZE")
+        mmap_size = get_app_option("SQLITE_CONTENT_MMAP_SIZE")
+        pragmas = []
+    else:
+        cache_size = get_app_option("SQLITE_CACHE_SIZE")
+        mmap_size = get_app_option("SQLITE_MMAP_SIZE")
+        pragmas = [
+            ("journal_mode", "WAL"),
+            ("synchronous", get_app_option("SQLITE_SYNCHRONOUS")),
+        ]
+    if cache_size:
+        # Negative sizes are in KiB rather than pages
+        pragmas.append(("cache_size", -cache_size))
+    pragmas.append(("mmap_size", mmap_size))
+    pragmas.append(("temp_store", get_app_option("SQLITE_TEMP_STORE")))
+    return pragmas
+
+
+def apply_pragmas(dbapi_connection, pragmas):
+    """Run pragmas on a sqlite3 connection, without going through Django."""
+    for name, value in pragmas:
+        dbapi_connection.execute("PRAGMA {}={}".format(name, value)).fetchall()
+    busy_timeout = get_app_option("SQLITE_BUSY_TIMEOUT")
+    current = dbapi_connection.execute("PRAGMA busy_timeout").fetchone()[0]
+    if busy_timeout > current:
+        dbapi_connection.execute("PRAGMA busy_timeout={}".format(busy_timeout))
+
+
+def tune(dbapi_connection, profile):
+    try:
+        apply_pragmas(dbapi_connection, get_pragmas(profile))
+    except Exception as e:
+        # A database that cannot be tuned works as well untuned.
+        logger.warning("Could not tune SQLite connection: {}".format(e))
+        return
+    if profile not in _logged_profiles:
+        _logged_profiles.add(profile)
+        logger.info(
+            "Tuned SQLite {} connections: {}".format(
+                profile,
+                ", ".join(
+                    "{}={}".format(name, value) for name, value in get_pragmas(profile)
+                ),
+            )
+        )
+
+
+def on_connection_created(sender, connection, **kwargs):
+    """Django's connection_created receiver."""
+    if connection.vendor == "sqlite":
+        tune(connection.connection, PROFILE_DEFAULT)
+
+
+def _database_path(dbapi_connection):
+    for _, name, path in dbapi_connection.execute("PRAGMA database_list"):
+        if name == "main":
+            return path
+    return ""
+
+
+def _django_database_paths():
+    from django.conf import settings
+
+    return {
+        os.path.abspath(database["NAME"])
+        for database in settings.DATABASES.values()
+        if database["ENGINE"].endswith("sqlite3")
+    }
+
+
+def on_sqlalchemy_connect(dbapi_connection, connection_record):
+    """
+    SQLAlchemy's pool connect listener. Kolibri reads the channel databases
+    with SQLAlchemy, and imports channels into the main database with it.
+    """
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    path = _database_path(dbapi_connection)
+    if CHANNEL_DATABASE_RE.match(os.path.basename(path)):
+        tune(dbapi_connection, PROFILE_CONTENT)
+    elif path and os.path.abspath(path) in _django_database_paths():
+        tune(dbapi_connection, PROFILE_DEFAULT)
+
+
+def install():
+    """Tune every SQLite connection Django or SQLAlchemy opens from now on."""
+    if not get_app_option("SQLITE_TUNING_ENABLED"):
+        return
+    from django.db.backends.signals import connection_created
+    from sqlalchemy import event
+    from sqlalchemy.pool import Pool
+
+    connection_created.connect(on_connection_created)
+    event.listen(Pool, "connect", on_sqlalchemy_connect)
@@ -0,0 +1,137 @@
+"""
+Startup progress of the Kolibri server, for the loading screen.
+
+The server reports the phases it goes through before Kolibri can be loaded:
+initialize(), which loads Django and the plugins and runs the migrations of a
+first run or an upgrade, the bus transitions up to SERVING and the warm up.
+Migrations are reported one by one, as they are what makes a first run slow.
+
+Every event carries the wall clock time it was recorded at, and a finished
+phase its duration, so the UI can both show where startup is and log how long
+each phase took on the device. In a server thread the events go straight to
+the listener the UI set; a server subprocess buffers them until the UI pulls
+them with its next poll, like the log records in log_forwarding.
+"""
+import collections
+import time
+from contextlib import contextmanager
+from threading import Lock
+
+INITIALIZE = "initialize"
+MIGRATIONS = "migrations"
+SERVER = "server"
+WARM_UP = "warm up"
+
+STARTED = "started"
+PROGRESS = "progress"
+FINISHED = "finished"
+
+# Events held for a UI that has not connected yet, the oldest are dropped
+MAX_BUFFERED_EVENTS = 500
+
+
+class StartupProgress(object):
+    def __init__(self):
+        self._lock = Lock()
+        self._events = collections.deque(maxlen=MAX_BUFFERED_EVENTS)
+        self._starts = {}
+        # Called with every event from the thread reporting it, when set
+        self.listener = None
+
+    def report(self, phase, status, detail=None, done=None, total=None):
+        now = time.time()
+        event = {"phase": phase, "status": status, "time": now}
+        with self._lock:
+            if status == STARTED:
+                self._starts[phase] = now
+            elif status == FINISHED and phase in self._starts:
+                event["duration"] = now - self._starts.pop(phase)
+        if detail is not None:
+            event["detail"] = detail
+        if total is not None:
+            event["done"] = done or 0
+            event["total"] = total
+
+        listener = self.listener
+        if listener is not None:
+            listener(event)
+        else:
+            with self._lock:
+                self._events.append(event)
+
+    @contextmanager
+    def phase(self, phase, detail=None):
+        self.report(phase, STARTED, detail=detail)
+        try:
+            yield
+        finally:
+            self.report(phase, FINISHED, detail=detail)
+
+    def drain(self):
+        """The events buffered since the last call."""
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+        return events
+
+
+progress = StartupProgress()
+
+
+def report_bus(bus, channels=("ENTER", "IDLE", "START", "RUN")):
+    """Report the transitions of a Kolibri process bus up to SERVING."""
+
+    def make_listener(channel):
+        def listener(*args):
+            progress.report(SERVER, PROGRESS, detail=channel)
+
+        return listener
+
+    progress.report(SERVER, STARTED)
+    for channel in channels:
+        bus.subscribe(channel, make_listener(channel))
+    bus.subscribe("SERVING", lambda port: progress.report(SERVER, FINISHED))
+
+
+def install():
+    """Report the migrations Django applies, called once the apps are ready."""
+    from django.db.migrations.executor import MigrationExecutor
+
+    if getattr(MigrationExecutor, "_reports_progress", False):
+        return
+    migrate = MigrationExecutor.migrate
+    apply_migration = MigrationExecutor.apply_migration
+
+    def migrate_with_progress(self, targets, plan=None, *args, **kwargs):
+        if plan is None:
+            plan = self.migration_plan(targets)
+        total = sum(1 for _, backwards in plan if not backwards)
+        if not total:
+            return migrate(self, targets, plan, *args, **kwargs)
+        database = self.connection.alias
+        self._app_progress = {"done": 0, "total": total}
+        progress.report(MIGRATIONS, STARTED, detail=database, total=total)
+        try:
+            return migrate(self, targets, plan, *args, **kwargs)
+        finally:
+            self._app_progress = None
+            progress.report(MIGRATIONS, FINISHED, detail=database)
+
+    def apply_migration_with_progress(self, state, migration, *args, **kwargs):
+        state = apply_migration(self, state, migration, *args, **kwargs)
+        counter = getattr(self, "_app_progress", None)
+        if counter is not None:
+            counter["done"] += 1
+            progress.report(
+                MIGRATIONS,
+                PROGRESS,
+                detail="{}.{}".format(migration.app_label, migration.name),
+                done=counter["done"],
+                total=counter["total"],
+            )
+        return state
+
+    MigrationExecutor.migrate = migrate_with_progress
+    MigrationExecutor.apply_migration = apply_migration_with_progress
+    MigrationExecutor._reports_progress = True
+    progress.report(INITIALIZE, PROGRESS, detail="apps ready")
@@ -0,0 +1,152 @@
+"""
+Application state store.
+
+Keeps the app state (currently the open windows with their URL, geometry and
+zoom) in memory, so reading it never touches the disk. Changes are written by
+a timer thread shortly after they happen, coalesced so that there is at most
+one write every MIN_WRITE_INTERVAL seconds however often the state changes, so
+saving on every navigation, move or resize does not block the UI thread.
+
+Writes go to a temporary file that is flushed to disk and then renamed over
+the state file, so a crash or power loss leaves either the old or the new state
+on disk, never a truncated mix of both. A write that fails, e.g. on a full
+disk, is retried later, waiting longer after every failure.
+"""
+import copy
+import json
+import os
+import threading
+import time
+
+from kolibri_app.constants import WINDOWS
+from kolibri_app.logger import logging
+
+SCHEMA_VERSION = 2
+
+VERSION = "version"
+WINDOWS_KEY = "windows"
+
+# Keys of each entry in the windows list
+URL = "url"
+GEOMETRY = "geometry"
+ZOOM = "zoom"
+FOCUSED = "focused"
+
+# Key of the version 1 state, which only held the URL of the last window
+LEGACY_URL = "URL"
+
+# Seconds between a change and the write that saves it
+WRITE_DELAY = 1.0
+# Minimum seconds between two writes
+MIN_WRITE_INTERVAL = 5.0
+# Longest wait before retrying a failed write, the wait doubles from
+# MIN_WRITE_INTERVAL with every failure in a row
+MAX_RETRY_DELAY = 300.0
+
+
+def migrate(state):
+    """Bring a state read from disk up to the current schema."""
+    if state.get(VERSION) == SCHEMA_VERSION:
+        return state
+    windows = []
+    if isinstance(state.get(LEGACY_URL), str):
+        windows.append({URL: state[LEGACY_URL], FOCUSED: True})
+    return {VERSION: SCHEMA_VERSION, WINDOWS_KEY: windows}
+
+
+class StateStore(object):
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        # Serializes writes from the timer and from flush()
+        self._write_lock = threading.Lock()
+        self._state = self._load()
+        self._dirty = False
+        self._timer = None
+        self._last_write = 0
+        self._retry_delay = 0
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if isinstance(state, dict):
+                return migrate(state)
+        except FileNotFoundError:
+            pass
+        except (IOError, PermissionError, ValueError) as e:
+            logging.warning("Could not read app state, starting afresh: {}".format(e))
+        return {VERSION: SCHEMA_VERSION, WINDOWS_KEY: []}
+
+    def get_windows(self):
+        """The saved windows, the focused one first."""
+        with self._lock:
+            windows = copy.deepcopy(self._state[WINDOWS_KEY])
+        return sorted(windows, key=lambda window: not window.get(FOCUSED))
+
+    def set_windows(self, windows):
+        with self._lock:
+            if windows == self._state[WINDOWS_KEY]:
+                return
+            self._state[WINDOWS_KEY] = copy.deepcopy(windows)
+            self._dirty = True
+            self._schedule()
+
+    def _schedule(self, delay=None):
+        # Called with self._lock held. A pending write picks up later changes
+        # too, so that a steady stream of changes cannot postpone it forever.
+        if self._timer is not None:
+            return
+        if delay is None:
+            delay = max(
+                WRITE_DELAY, self._last_write + MIN_WRITE_INTERVAL - time.monotonic()
+            )
+        self._timer = threading.Timer(delay, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def flush(self):
+        """Write pending changes now, e.g. when the app shuts down."""
+        with self._write_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                if not self._dirty:
+                    return
+                snapshot = json.dumps(self._state)
+                self._dirty = False
+                self._last_write = time.monotonic()
+            try:
+                self._write(snapshot)
+            except OSError as e:
+                with self._lock:
+                    self._dirty = True
+                    delay = min(
+                        MAX_RETRY_DELAY, max(MIN_WRITE_INTERVAL, self._retry_delay * 2)
+                    )
+                    self._retry_delay = delay
+                    self._schedule(delay)
+                logging.warning(
+                    "Could not save app state, retrying in {:.0f} seconds: {}".format(
+                        delay, e
+                    )
+                )
+            else:
+                with self._lock:
+                    self._retry_delay = 0
+
+    def _write(self, data):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        if not WINDOWS:
+            # Make the rename itself durable.
+            dir_fd = os.open(os.path.dirname(self.path), os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
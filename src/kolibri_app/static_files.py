@@ -0,0 +1,46 @@
+"""
+Serving of the precompressed static assets.
+
+Kolibri serves its static files with WhiteNoise, which answers each request
+with the smallest sibling of the file that the client accepts: x.js.br,
+x.js.gz or x.js, with the matching Content-Encoding. Kolibri's wheel ships gzip
+siblings, and scripts/precompress_static.py adds brotli ones when the app is
+built, but Kolibri only looks for .gz siblings of the static files it finds on
+request, so install() makes it look for .br siblings as well.
+
+Kolibri only marks files immutable, i.e. cached by the browser for good without
+revalidation, when their URL has a version number or a 32 character hash in
+it. Webpack names some assets with shorter content hashes, e.g. fonts and
+images; install() marks those immutable as well.
+"""
+import re
+
+BROTLI_EXTENSION = "br"
+
+# Content hashes in webpack file names, e.g. picture_password-59ce8c6f0d177604e933.svg
+CONTENT_HASH_RE = re.compile(r"[-.][0-9a-f]{16,}\.\w+$")
+
+IMMUTABLE_CACHE_CONTROL = "max-age={}, public, immutable"
+
+
+def install():
+    """Patch Kolibri's WhiteNoise before the WSGI application is created."""
+    from kolibri.utils import kolibri_whitenoise
+
+    if BROTLI_EXTENSION in kolibri_whitenoise.compressed_file_extensions:
+        return
+    kolibri_whitenoise.compressed_file_extensions += (BROTLI_EXTENSION,)
+
+    whitenoise_class = kolibri_whitenoise.DynamicWhiteNoise
+    add_cache_headers = whitenoise_class.add_cache_headers
+
+    def add_content_hash_cache_headers(self, headers, path, url):
+        add_cache_headers(self, headers, path, url)
+        if (
+            self.static_prefix is not None
+            and url.startswith(self.static_prefix)
+            and CONTENT_HASH_RE.search(url)
+        ):
+            headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL.format(self.FOREVER)
+
+    whitenoise_class.add_cache_headers = add_content_hash_cache_headers
@@ -11,7 +11,6 @@ import ctypes
 import os
 import sys
 import webbrowser
-from importlib.resources import files
 
 import pywintypes
 import win32service
@@ -23,6 +22,7 @@ from kolibri_app.constants import APP_NAME
 from kolibri_app.constants import SERVICE_NAME
 from kolibri_app.constants import TRAY_ICON_ICO
 from kolibri_app.i18n import _
+from kolibri_app.i18n import resources
 from kolibri_app.logger import logging
 from kolibri_app.windows_registry import is_ui_startup_enabled
 from kolibri_app.windows_registry import is_webview2_installed
@@ -91,14 +91,9 @@ class KolibriTaskBarIcon(TaskBarIcon):
 
         # 'path' is expected to be 'icons/kolibri.ico'
         try:
-            # We need the absolute path for wx.Icon, so resolve() is necessary
-            icon_resource_path = files("kolibri_app") / path
-            final_path = str(icon_resource_path.resolve())
-
-            icon = wx.Icon(final_path, wx.BITMAP_TYPE_ICO)
-            self.SetIcon(icon, tooltip)
+            self.SetIcon(resources.icon(path), tooltip)
         except (FileNotFoundError, wx.wxAssertionError, OSError) as e:
-            logging.error(f"Error setting icon from path '{final_path}': {e}")
+            logging.error(f"Error setting icon from path '{path}': {e}")
 
     def show_notification(self, title, message, timeout=DEFAULT_NOTIFICATION_TIMEOUT):
         """
@@ -140,6 +135,18 @@ class KolibriTaskBarIcon(TaskBarIcon):
         message = _("Kolibri failed to start.\nCheck logs at: {}").format(log_path)
         self.show_notification(_("Kolibri Error"), message, timeout=10)
 
+    def notify_server_unresponsive(self):
+        """Show notification that the running server stopped responding."""
+        self.show_notification(
+            _("Kolibri is not responding"),
+            _("Kolibri stopped responding. Restart Kolibri if this does not clear."),
+            timeout=10,
+        )
+
+    def notify_server_recovered(self):
+        """Show notification that the server is responding again."""
+        self.show_notification(_("Kolibri"), _("Kolibri is responding again."))
+
     def on_left_click(self, event):
         """
         Handles left-click on the taskbar icon.
@@ -0,0 +1,306 @@
+"""
+Startup phase tracer.
+
+Records timestamped spans for the phases between launching the app and Kolibri
+being usable, and writes them as a Chrome trace (JSON object format) that can be
+opened in chrome://tracing or https://ui.perfetto.dev.
+
+Recording an event is a list append, so the tracer stays on in production. One
+file is written per process and run under KOLIBRI_HOME/traces; the UI process
+and the Windows server subprocess share a run id so their files sort together.
+
+Each run is labelled as a cold start (first launch since the machine booted,
+when the OS file cache is empty) or a warm start.
+"""
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+TRACE_DIR = "traces"
+LAST_RUN_FILE = "last_run"
+
+# Set KOLIBRI_APP_TRACE=0 to turn the tracer off completely.
+TRACE_ENV = "KOLIBRI_APP_TRACE"
+# Shared with child processes so that all files of one launch can be matched up.
+RUN_ID_ENV = "KOLIBRI_APP_TRACE_RUN_ID"
+START_TYPE_ENV = "KOLIBRI_APP_TRACE_START_TYPE"
+
+# Keep the tracer's footprint bounded however long the process lives.
+MAX_EVENTS = 10000
+MAX_TRACE_FILES = 30
+
+COLD = "cold"
+WARM = "warm"
+
+
+def _process_start_time():
+    """
+    Best effort wall clock time at which this process was created, so that the
+    interpreter startup before any of our code ran shows up in the trace.
+    """
+    try:
+        if sys.platform.startswith("linux"):
+            with open("/proc/self/stat", "r") as f:
+                # The command name can contain spaces, so split after it.
+                fields = f.read().rsplit(")", 1)[1].split()
+            start_ticks = int(fields[19])
+            with open("/proc/stat", "r") as f:
+                boot_time = next(
+                    int(line.split()[1]) for line in f if line.startswith("btime")
+                )
+            return boot_time + start_ticks / os.sysconf("SC_CLK_TCK")
+        if sys.platform.startswith("win32"):
+            import ctypes
+            import ctypes.wintypes
+
+            creation = ctypes.wintypes.FILETIME()
+            unused = ctypes.wintypes.FILETIME()
+            kernel32 = ctypes.windll.kernel32
+            if kernel32.GetProcessTimes(
+                kernel32.GetCurrentProcess(),
+                ctypes.byref(creation),
+                ctypes.byref(unused),
+                ctypes.byref(unused),
+                ctypes.byref(unused),
+            ):
+                ticks = (creation.dwHighDateTime << 32) + creation.dwLowDateTime
+                # FILETIME counts 100ns intervals since 1601-01-01
+                return ticks / 10**7 - 11644473600
+    except (OSError, ValueError, IndexError, StopIteration, AttributeError):
+        pass
+    return None
+
+
+class Span(object):
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = tracer.now()
+
+    def finish(self, **args):
+        self.args.update(args)
+        self.tracer.complete(self.name, self.start, self.tracer.now(), **self.args)
+
+
+class StartupTracer(object):
+    def __init__(self):
+        self.enabled = os.environ.get(TRACE_ENV, "1") != "0"
+        self._origin_perf = time.perf_counter()
+        self._origin_wall = time.time()
+        self.pid = os.getpid()
+        self.process_name = "Kolibri"
+        self.run_id = os.environ.setdefault(
+            RUN_ID_ENV, time.strftime("%Y%m%d-%H%M%S") + "-{}".format(self.pid)
+        )
+        self._events = []
+        self._marks = {}
+        self._lock = threading.Lock()
+        self._written = False
+        self._start_type = os.environ.get(START_TYPE_ENV)
+
+        process_start = _process_start_time()
+        if process_start is not None and process_start < self._origin_wall:
+            self.complete(
+                "interpreter startup",
+                int(process_start * 10**6),
+                self.now(),
+            )
+
+    def now(self):
+        """Current time in microseconds, on the wall clock so processes line up."""
+        elapsed = time.perf_counter() - self._origin_perf
+        return int((self._origin_wall + elapsed) * 10**6)
+
+    def _add(self, event):
+        if not self.enabled or len(self._events) >= MAX_EVENTS:
+            return
+        thread = threading.current_thread()
+        event["pid"] = self.pid
+        event["tid"] = thread.native_id
+        event.setdefault("cat", "startup")
+        self._events.append(event)
+
+    def complete(self, name, start, end, **args):
+        self._add(
+            {"name": name, "ph": "X", "ts": start, "dur": end - start, "args": args}
+        )
+
+    def instant(self, name, **args):
+        self._add({"name": name, "ph": "i", "s": "p", "ts": self.now(), "args": args})
+
+    def mark(self, name, **args):
+        """
+        Record an instant only the first time it is reached and remember when,
+        so that later phases can be measured from it.
+        """
+        with self._lock:
+            if name in self._marks:
+                return False
+            self._marks[name] = self.now()
+        self.instant(name, **args)
+        return True
+
+    def since(self, mark):
+        """Microseconds since the given mark, or None if it was never reached."""
+        if mark not in self._marks:
+            return None
+        return self.now() - self._marks[mark]
+
+    def start_span(self, name, **args):
+        return Span(self, name, args)
+
+    @contextmanager
+    def span(self, name, **args):
+        span = self.start_span(name, **args)
+        try:
+            yield span
+        finally:
+            span.finish()
+
+    def traced(self, name):
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def trace_bus(self, bus, channels=("ENTER", "IDLE", "START", "RUN", "SERVING")):
+        """
+        Record every transition of a Kolibri process bus up to SERVING, with a
+        span covering the time spent getting from one state to the next.
+        """
+        previous = {"name": "created", "ts": self.now()}
+
+        def make_listener(channel):
+            def listener(*args):
+                now = self.now()
+                self.instant("bus " + channel)
+                self.complete(
+                    "bus {} -> {}".format(previous["name"], channel),
+                    previous["ts"],
+                    now,
+                )
+                previous.update(name=channel, ts=now)
+
+            return listener
+
+        for channel in channels:
+            # Run ahead of the app's own listeners so a trace written from a
+            # SERVING listener already contains the SERVING transition.
+            bus.subscribe(channel, make_listener(channel), priority=10)
+
+    def get_start_type(self, kolibri_home):
+        """
+        Work out whether this is a cold or a warm start by comparing the start
+        time of the previous run with the time the machine booted.
+        """
+        if self._start_type:
+            return self._start_type
+        last_run_path = os.path.join(kolibri_home, TRACE_DIR, LAST_RUN_FILE)
+        boot_time = time.time() - time.monotonic()
+        try:
+            with open(last_run_path, "r") as f:
+                last_run = float(f.read().strip())
+            self._start_type = WARM if last_run > boot_time else COLD
+        except (IOError, ValueError):
+            self._start_type = COLD
+        try:
+            os.makedirs(os.path.dirname(last_run_path), exist_ok=True)
+            with open(last_run_path, "w") as f:
+                f.write(str(self._origin_wall))
+        except OSError:
+            pass
+        # Let any server subprocess we spawn label its trace the same way.
+        os.environ[START_TYPE_ENV] = self._start_type
+        return self._start_type
+
+    def _metadata(self):
+        events = [
+            {
+                "name": "process_name",
+                "ph": "M",
+                "pid": self.pid,
+                "args": {"name": "{} ({})".format(self.process_name, self.pid)},
+            }
+        ]
+        names = {
+            thread.native_id: thread.name
+            for thread in threading.enumerate()
+            if thread.native_id is not None
+        }
+        for tid in {event["tid"] for event in self._events}:
+            events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": self.pid,
+                    "tid": tid,
+                    "args": {"name": names.get(tid, str(tid))},
+                }
+            )
+        return events
+
+    def write(self):
+        """
+        Write the trace for this process to KOLIBRI_HOME/traces.
+        Only the first call writes a file, later calls are ignored.
+        """
+        if not self.enabled or self._written:
+            return None
+        self._written = True
+
+        from kolibri.utils.conf import KOLIBRI_HOME
+
+        trace_dir = os.path.join(KOLIBRI_HOME, TRACE_DIR)
+        start_type = self.get_start_type(KOLIBRI_HOME)
+        path = os.path.join(
+            trace_dir,
+            "startup-{}-{}-{}.json".format(
+                self.run_id, self.process_name.lower().replace(" ", "-"), self.pid
+            ),
+        )
+        trace = {
+            "traceEvents": self._metadata() + list(self._events),
+            "displayTimeUnit": "ms",
+            "otherData": {
+                "run_id": self.run_id,
+                "start_type": start_type,
+                "process": self.process_name,
+            },
+        }
+        try:
+            os.makedirs(trace_dir, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(trace, f)
+            self._prune(trace_dir)
+        except OSError:
+            return None
+        return path
+
+    def _prune(self, trace_dir):
+        traces = sorted(
+            (
+                os.path.join(trace_dir, name)
+                for name in os.listdir(trace_dir)
+                if name.startswith("startup-") and name.endswith(".json")
+            ),
+            key=os.path.getmtime,
+            reverse=True,
+        )
+        for path in traces[MAX_TRACE_FILES:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+tracer = StartupTracer()
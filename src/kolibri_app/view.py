@@ -1,10 +1,8 @@
 import os
 import subprocess
 import webbrowser
-from importlib.resources import files
 
 import wx
-from django.utils.translation.trans_real import to_language
 from wx import html2
 
 from kolibri_app.constants import APP_NAME
@@ -14,9 +12,26 @@ from kolibri_app.constants import TRAY_ICON_ICO
 from kolibri_app.constants import WINDOWS
 from kolibri_app.i18n import _
 from kolibri_app.i18n import locale_info
+from kolibri_app.i18n import resources
+from kolibri_app.i18n import to_language
+from kolibri_app.loading_progress import progress_script
 from kolibri_app.logger import logging
-
-LOADER_PAGE = "loading.html"
+from kolibri_app.options import get_app_option
+from kolibri_app.preload import PRELOAD_HANDLER
+from kolibri_app.preload import PRELOAD_READY_SCRIPT
+from kolibri_app.preload import PRELOAD_TIMEOUT_MS
+from kolibri_app.preload import PreloadSwap
+from kolibri_app.process_stats import format_mb
+from kolibri_app.process_stats import get_process_tree_rss
+from kolibri_app.state import FOCUSED
+from kolibri_app.state import GEOMETRY
+from kolibri_app.state import URL
+from kolibri_app.state import ZOOM
+from kolibri_app.tracer import tracer
+from kolibri_app.webview_data import CACHE_STATS_DELAY_MS
+from kolibri_app.webview_data import CACHE_STATS_SCRIPT
+from kolibri_app.webview_data import format_cache_stats
+from kolibri_app.webview_data import parse_cache_stats
 
 ZOOM_LEVELS = [
     html2.WEBVIEW_ZOOM_TINY,
@@ -26,59 +41,99 @@ ZOOM_LEVELS = [
     html2.WEBVIEW_ZOOM_LARGEST,
 ]
 
+# How long to wait after discarding a WebView for its processes to exit, before
+# measuring the memory that was reclaimed
+DISCARD_MEASURE_DELAY_MS = 5000
+
 
 def get_loader_html():
     """
-    Finds the correct localized loading.html file and returns its content.
+    Returns the content of the correct localized loading.html file.
+    """
+    return resources.loader_html(to_language(locale_info["language"]))
+
+
+def get_saved_rect(saved):
+    """
+    The saved position and size of a window, if they still fit on one of the
+    connected displays.
     """
-    lang_id = to_language(locale_info["language"])
-    asset_files = files("kolibri_app") / "assets"
-    loader_page = asset_files / lang_id / LOADER_PAGE
-    if not loader_page.is_file():
-        lang_id = lang_id.split("-")[0]
-        loader_page = asset_files / lang_id / LOADER_PAGE
-    if not loader_page.is_file():
-        # if we can't find anything in the given language, default to the English loading page.
-        loader_page = asset_files / "en" / LOADER_PAGE
-    with loader_page.open("r", encoding="utf-8") as f:
-        return f.read()
+    geometry = (saved or {}).get(GEOMETRY)
+    if not geometry or len(geometry) != 4:
+        return None
+    rect = wx.Rect(*geometry)
+    if wx.Display.GetFromPoint(rect.GetTopLeft()) == wx.NOT_FOUND:
+        return None
+    return rect
 
 
 class KolibriView(object):
-    def __init__(self, app, url=None, size=(1024, 768)):
+    """
+    A Kolibri window. A lazy window is created with a placeholder instead of a
+    WebView, and only creates its WebView and loads its URL once it is first
+    activated, so restoring a session with many windows stays cheap.
+
+    When the server is ready, a window on the loading screen loads Kolibri in
+    a second WebView out of sight and keeps the loading screen up until
+    Kolibri has rendered, instead of showing a blank page while it boots, see
+    preload.
+
+    On Windows, closing a window only hides it. Once it has been hidden for
+    WEBVIEW_IDLE_TIMEOUT seconds its WebView is discarded the same way, keeping
+    its URL and history, and recreated when the window is shown again.
+    """
+
+    def __init__(self, app, url=None, size=(1024, 768), saved=None, lazy=False):
         self.app = app
 
         self.is_showing_loader = False
-
-        self.view = wx.Frame(None, -1, APP_NAME, size=size)
+        # Showing the loading screen until there is a Kolibri URL to load
+        self.waiting_for_kolibri = False
+        self.webview = None
+        self.placeholder = None
+        # What the WebView will load and its zoom, until it is created
+        self.pending_url = url
+        self.pending_zoom = (saved or {}).get(ZOOM)
+        # History kept across WebView recreations, see get_history
+        self.history_back = []
+        self.history_forward = []
+        self.history_base = None
+        self.loading_from_history = False
+        self.discard_timer = None
+        self.discarded = False
+        self.cache_stats_timer = None
+        # Loading Kolibri out of sight, see preload
+        self.preload_webview = None
+        self.preload_swap = None
+        self.preload_timer = None
+
+        rect = get_saved_rect(saved)
+        if rect:
+            self.view = wx.Frame(
+                None, -1, APP_NAME, pos=rect.GetPosition(), size=rect.GetSize()
+            )
+        else:
+            self.view = wx.Frame(None, -1, APP_NAME, size=size)
         self.view.SetMinSize((350, 400))
 
         # Set the window icon
         if WINDOWS:
             try:
-                icon_path = files("kolibri_app") / TRAY_ICON_ICO
-                self.view.SetIcon(wx.Icon(str(icon_path), wx.BITMAP_TYPE_ICO))
+                self.view.SetIcon(resources.icon(TRAY_ICON_ICO))
             except (FileNotFoundError, wx.wxAssertionError, OSError) as e:
                 logging.warning(f"Failed to set window icon: {e}")
 
-        if WINDOWS:
-            backend = html2.WebViewBackendEdge
-        else:
-            backend = html2.WebViewBackendDefault
-
-        self.webview = html2.WebView.New(self.view, backend=backend)
-        self.webview.Bind(html2.EVT_WEBVIEW_NAVIGATING, self.OnBeforeLoad)
-        self.webview.Bind(html2.EVT_WEBVIEW_LOADED, self.OnLoadComplete)
-
-        if url is None:
-            # If no URL is provided, show the loading screen directly.
-            self.webview.SetPage(get_loader_html(), "")
-            self.is_showing_loader = True
+        if lazy:
+            self.placeholder = wx.Panel(self.view)
         else:
-            # Otherwise, load the given URL.
-            self.webview.LoadURL(url)
+            self.ensure_webview()
 
         self.view.Bind(wx.EVT_CLOSE, self.OnClose)
+        # The state store coalesces these, so saving on every event is cheap.
+        self.view.Bind(wx.EVT_MOVE, self.OnGeometryChange)
+        self.view.Bind(wx.EVT_SIZE, self.OnGeometryChange)
+        self.view.Bind(wx.EVT_ACTIVATE, self.OnActivate)
+        self.view.Bind(wx.EVT_SHOW, self.OnShow)
 
         # create menu bar, we do this per-window for cross-platform purposes
         menu_bar = wx.MenuBar()
@@ -185,8 +240,223 @@ class KolibriView(object):
             self.view.Bind(wx.EVT_MENU, handler, item)
         return item
 
+    def ensure_webview(self):
+        """
+        Create the WebView if this window does not have one yet, and load the
+        pending URL into it, or the loading screen until the server is ready.
+        """
+        if self.webview is not None:
+            return
+        self.discarded = False
+
+        self.webview = self.create_webview()
+        self.webview.Bind(html2.EVT_WEBVIEW_LOADED, self.OnLoadComplete)
+        if self.pending_zoom in ZOOM_LEVELS:
+            self.webview.SetZoom(self.pending_zoom)
+
+        if self.placeholder is not None:
+            self.placeholder.Destroy()
+            self.placeholder = None
+            # Let the frame size the WebView that took the placeholder's place.
+            self.view.SendSizeEvent()
+
+        url = self.get_restore_url()
+        if url is None:
+            # If no URL is provided, show the loading screen directly.
+            # A restored URL stays pending until the server is ready.
+            self.webview.SetPage(get_loader_html(), "")
+            self.is_showing_loader = True
+            self.waiting_for_kolibri = True
+        else:
+            # Otherwise, load the given URL.
+            self.webview.LoadURL(url)
+            self.pending_url = None
+
+    def create_webview(self):
+        if WINDOWS:
+            backend = html2.WebViewBackendEdge
+        else:
+            backend = html2.WebViewBackendDefault
+
+        webview = html2.WebView.New(self.view, backend=backend)
+        webview.Bind(html2.EVT_WEBVIEW_NAVIGATING, self.OnBeforeLoad)
+        return webview
+
+    def preload(self, url):
+        """
+        Load url in a second WebView, placed below the visible part of the
+        window so that it still renders, and swap it in for the loading screen
+        once it has loaded and Kolibri has rendered, or after PRELOAD_TIMEOUT_MS.
+        """
+        if self.webview is None:
+            return
+        if self.preload_webview is not None:
+            # e.g. the server was restarted while Kolibri was loading
+            self.preload_swap.reloading()
+            self.preload_webview.LoadURL(url)
+            return
+
+        webview = self.create_webview()
+        webview.Bind(html2.EVT_WEBVIEW_LOADED, self.OnPreloadComplete)
+        webview.Bind(html2.EVT_WEBVIEW_SCRIPT_MESSAGE_RECEIVED, self.OnScriptMessage)
+        self.preload_swap = PreloadSwap(
+            webview.AddScriptMessageHandler(PRELOAD_HANDLER)
+            and webview.AddUserScript(PRELOAD_READY_SCRIPT)
+        )
+        webview.SetZoom(self.webview.GetZoom())
+        self.preload_webview = webview
+        self.layout_preload()
+        self.preload_timer = wx.CallLater(PRELOAD_TIMEOUT_MS, self.on_preload_timeout)
+        webview.LoadURL(url)
+
+    def layout_preload(self):
+        width, height = self.view.GetClientSize()
+        self.webview.SetSize(0, 0, width, height)
+        self.preload_webview.SetSize(0, height, width, height)
+
+    def cancel_preload_timer(self):
+        if self.preload_timer is not None:
+            self.preload_timer.Stop()
+            self.preload_timer = None
+
+    def on_preload_timeout(self):
+        self.preload_timer = None
+        if self.preload_swap.timed_out():
+            logging.info("Kolibri did not signal that it rendered, showing it anyway")
+            self.swap_in_preload()
+
+    def swap_in_preload(self):
+        """Replace the loading screen with the preloaded WebView."""
+        self.cancel_preload_timer()
+        webview = self.preload_webview
+        if webview is None:
+            return
+        self.preload_webview = None
+        webview.RemoveAllUserScripts()
+        webview.RemoveScriptMessageHandler(PRELOAD_HANDLER)
+        webview.Unbind(html2.EVT_WEBVIEW_LOADED, handler=self.OnPreloadComplete)
+        webview.Bind(html2.EVT_WEBVIEW_LOADED, self.OnLoadComplete)
+
+        self.webview.Destroy()
+        self.webview = webview
+        webview.Move(0, 0)
+        # Let the frame size the WebView again, now that it is its only child.
+        self.view.SendSizeEvent()
+        if self.preload_swap.loaded:
+            self.on_page_loaded(webview.GetCurrentURL())
+
+    def show_progress(self, event):
+        """Show a startup progress event, if the loading screen is showing."""
+        if event is None or self.webview is None:
+            return
+        if not self.waiting_for_kolibri and self.preload_webview is None:
+            return
+        script = progress_script(event)
+        if script is None:
+            return
+        try:
+            self.webview.RunScript(script)
+        except Exception as e:
+            # e.g. the loading screen has not loaded yet, see on_page_loaded
+            logging.debug("Could not show startup progress: {}".format(e))
+
+    def get_restore_url(self):
+        """
+        The URL to load into a new WebView. Restored URLs wait on the loading
+        screen until the first window has signed in to Kolibri, and fall back to
+        Kolibri's start page if the server is on a different port now.
+        """
+        url = self.pending_url
+        origin = self.app.kolibri_origin
+        if url is None or url == self.app.kolibri_url:
+            return url
+        if not url.startswith("http://localhost"):
+            return url
+        if origin is None or not self.app.kolibri_loaded:
+            return None
+        return url if url.startswith(origin) else origin
+
+    def load_pending_url(self):
+        """
+        Called once Kolibri has loaded in the first window, for the restored
+        windows that are still on the loading screen.
+        """
+        if self.webview is not None and self.waiting_for_kolibri:
+            url = self.get_restore_url() or self.app.kolibri_origin
+            self.pending_url = None
+            self.load_url(url)
+
+    def schedule_discard(self):
+        """Discard the WebView if the window stays hidden for the idle timeout."""
+        timeout = get_app_option("WEBVIEW_IDLE_TIMEOUT")
+        if not timeout or self.webview is None:
+            return
+        self.cancel_discard()
+        self.discard_timer = wx.CallLater(timeout * 1000, self.discard_webview)
+
+    def cancel_discard(self):
+        if self.discard_timer is not None:
+            self.discard_timer.Stop()
+            self.discard_timer = None
+
+    def discard_webview(self):
+        """
+        Destroy the WebView of a hidden window, with its renderer and whatever
+        the page keeps running, and put the placeholder back in its place.
+        """
+        self.discard_timer = None
+        if (
+            self.webview is None
+            or self.view.IsShown()
+            or self.waiting_for_kolibri
+            or self.preload_webview is not None
+        ):
+            return
+        rss_before = get_process_tree_rss()
+
+        url = self.get_url()
+        back, forward = self.get_history()
+        self.pending_zoom = self.webview.GetZoom()
+        self.webview.Destroy()
+        self.webview = None
+        if self.cache_stats_timer is not None:
+            self.cache_stats_timer.Stop()
+            self.cache_stats_timer = None
+        self.placeholder = wx.Panel(self.view)
+        self.discarded = True
+        if url:
+            # Reloaded like a page from the history, see OnLoadComplete
+            self.pending_url = url
+            self.history_back = back
+            self.history_forward = forward
+            self.history_base = url
+            self.loading_from_history = True
+
+        if rss_before is None:
+            logging.info("Discarded the WebView of a hidden window")
+        else:
+            wx.CallLater(
+                DISCARD_MEASURE_DELAY_MS, self.log_reclaimed_memory, rss_before
+            )
+
+    def log_reclaimed_memory(self, rss_before):
+        rss_after = get_process_tree_rss()
+        if rss_after is None:
+            return
+        logging.info(
+            "Discarded the WebView of a hidden window, reclaimed {} ({} -> {})".format(
+                format_mb(max(0, rss_before - rss_after)),
+                format_mb(rss_before),
+                format_mb(rss_after),
+            )
+        )
+
     def show(self):
-        self.view.Show()
+        if self.webview is None:
+            # Keep the focus on the window that is loading.
+            self.view.ShowWithoutActivating()
+        else:
+            self.view.Show()
 
     def close(self):
         self.view.Close()
@@ -195,9 +465,19 @@ class KolibriView(object):
         self.view.ShowFullScreen(enable)
 
     def load_url(self, url):
+        if self.webview is None:
+            self.pending_url = url
+            return
+        if self.waiting_for_kolibri and get_app_option("PRELOAD_KOLIBRI"):
+            self.waiting_for_kolibri = False
+            wx.CallAfter(self.preload, url)
+            return
+        self.waiting_for_kolibri = False
         wx.CallAfter(self.webview.LoadURL, url)
 
     def zoom(self, zoom_in):
+        if self.webview is None:
+            return
         index_change = 1 if zoom_in else -1
         current_zoom = self.webview.GetZoom()
         current_index = ZOOM_LEVELS.index(current_zoom)
@@ -205,31 +485,152 @@ class KolibriView(object):
         if new_index < 0 or new_index >= len(ZOOM_LEVELS):
             return
         self.webview.SetZoom(ZOOM_LEVELS[new_index])
+        self.app.save_state()
 
     def get_url(self):
+        if self.webview is None:
+            return self.pending_url
         return self.webview.GetCurrentURL()
 
+    def get_state(self):
+        """This window's entry in the saved app state."""
+        state = {
+            GEOMETRY: list(self.view.GetRect()),
+            ZOOM: self.webview.GetZoom() if self.webview else self.pending_zoom,
+            FOCUSED: self.view.IsActive(),
+        }
+        if self.webview is None or self.waiting_for_kolibri:
+            # Not loaded yet, keep the URL it is going to restore
+            url = self.pending_url
+        else:
+            url = self.get_url()
+            if not url.startswith(self.app.kolibri_origin):
+                url = None
+        if url:
+            state[URL] = url
+        return state
+
     def clear_history(self):
-        self.webview.ClearHistory()
+        if self.webview is not None:
+            self.webview.ClearHistory()
+
+    def get_history(self):
+        """
+        The URLs before the current page, nearest last, and after it, nearest
+        first. A page loaded from the history kept across WebView recreations
+        (history_base) is not part of the WebView's own history, which only
+        holds what was visited after it.
+        """
+        if self.webview is None:
+            return list(self.history_back), list(self.history_forward)
+        back = [item.GetUrl() for item in self.webview.GetBackwardHistory()]
+        forward = [item.GetUrl() for item in self.webview.GetForwardHistory()]
+        if self.history_base is None:
+            return back, forward
+        if not back and not forward and self.get_url() == self.history_base:
+            return list(self.history_back), list(self.history_forward)
+        return self.history_back + [self.history_base] + back, forward
+
+    def load_from_history(self, url, back, forward):
+        self.history_back = back
+        self.history_forward = forward
+        self.history_base = url
+        self.loading_from_history = True
+        self.load_url(url)
 
     def OnClose(self, event):
         if WINDOWS:
             # On Windows, just hide the window.
             self.view.Hide()
+            self.schedule_discard()
         else:
             self.shutdown()
             event.Skip()
 
+    def OnActivate(self, event):
+        if event.GetActive() and self.webview is None:
+            # Created outside of the activation event handling.
+            wx.CallAfter(self.ensure_webview)
+        self.OnGeometryChange(event)
+
+    def OnShow(self, event):
+        event.Skip()
+        if event.IsShown():
+            self.cancel_discard()
+            if self.discarded:
+                # Shown again, e.g. from the tray icon or by a second launch.
+                wx.CallAfter(self.ensure_webview)
+
+    def OnGeometryChange(self, event):
+        event.Skip()
+        if self.preload_webview is not None and isinstance(event, wx.SizeEvent):
+            # The frame only sizes its child while it has a single one.
+            self.layout_preload()
+        if self in self.app.windows and not self.view.IsIconized():
+            self.app.save_state()
+
     def OnBeforeLoad(self, event):
         if not self.app.should_load_url(event.URL):
             event.Veto()
 
+    def OnPreloadComplete(self, event):
+        if self.app.kolibri_origin and event.GetURL().startswith(
+            self.app.kolibri_origin
+        ):
+            tracer.mark("first Kolibri page loaded", url=event.GetURL())
+        if self.preload_swap.page_loaded():
+            self.swap_in_preload()
+
+    def OnScriptMessage(self, event):
+        if self.preload_webview is None:
+            return
+        if self.preload_swap.message_received(event.GetString()):
+            self.swap_in_preload()
+
     def OnLoadComplete(self, event):
+        self.on_page_loaded(event.GetURL())
+
+    def on_page_loaded(self, url):
+        if self.app.kolibri_origin and url.startswith(self.app.kolibri_origin):
+            tracer.mark("first Kolibri page loaded", url=url)
+            if not self.app.kolibri_loaded:
+                self.app.on_kolibri_loaded()
+            if self.cache_stats_timer is not None:
+                self.cache_stats_timer.Stop()
+            self.cache_stats_timer = wx.CallLater(
+                CACHE_STATS_DELAY_MS, self.log_cache_stats, url
+            )
+        else:
+            tracer.mark("first loader page shown")
+            # Progress reported before the loading screen was ready to show it
+            wx.CallAfter(self.show_progress, self.app.startup_progress)
+
         # Make sure that any attempts to use back functionality don't take us back to the loading screen
         # For more info, see: https://stackoverflow.com/questions/8103532/how-to-clear-webview-history-in-android
         if self.is_showing_loader:
             self.clear_history()
             self.is_showing_loader = False
+        elif self.loading_from_history:
+            # The history before and after this page is kept in history_back and
+            # history_forward, going back to it must not leave it in the WebView's.
+            self.clear_history()
+            self.loading_from_history = False
+
+        self.app.save_state()
+
+    def log_cache_stats(self, url):
+        self.cache_stats_timer = None
+        if self.webview is None:
+            return
+        try:
+            stats = parse_cache_stats(self.webview.RunScript(CACHE_STATS_SCRIPT))
+        except Exception as e:
+            logging.debug("Could not read the WebView cache statistics: {}".format(e))
+            return
+        if stats:
+            logging.info(
+                "WebView cache for {}: {}".format(url, format_cache_stats(stats))
+            )
 
     def on_documentation(self, event):
         webbrowser.open("https://kolibri.readthedocs.io/en/latest/")
@@ -255,22 +656,43 @@ class KolibriView(object):
             subprocess.call(["xdg-open", os.environ["KOLIBRI_HOME"]])
 
     def on_back(self, event):
-        self.webview.GoBack()
+        # Without a WebView, e.g. in a restored or discarded window, only the
+        # history kept across WebView recreations is available.
+        if self.webview is not None and self.webview.CanGoBack():
+            self.webview.GoBack()
+            return
+        back, forward = self.get_history()
+        if back:
+            self.load_from_history(back.pop(), back, [self.get_url()] + forward)
 
     def on_forward(self, event):
-        self.webview.GoForward()
+        if self.webview is not None and self.webview.CanGoForward():
+            self.webview.GoForward()
+            return
+        back, forward = self.get_history()
+        if forward:
+            self.load_from_history(forward.pop(0), back + [self.get_url()], forward)
 
     def on_reload(self, event):
+        if self.webview is None:
+            return
         self.webview.Reload()
 
     def on_undo(self, event):
+        if self.webview is None:
+            return
         self.webview.Undo()
 
     def on_redo(self, event):
+        if self.webview is None:
+            return
         self.webview.Redo()
 
     def on_actual_size(self, event):
+        if self.webview is None:
+            return
         self.webview.SetZoom(html2.WEBVIEW_ZOOM_MEDIUM)
+        self.app.save_state()
 
     def on_zoom_in(self, event):
         self.zoom(True)
@@ -279,9 +701,14 @@ class KolibriView(object):
         self.zoom(False)
 
     def shutdown(self):
+        self.cancel_preload_timer()
+        if self.cache_stats_timer is not None:
+            self.cache_stats_timer.Stop()
+            self.cache_stats_timer = None
         if self in self.app.windows:
             self.app.windows.remove(self)
+        # Recorded with the last window still in it, so that it is restored next time
+        self.app.save_state(self)
         if not self.app.windows:
-            self.app.save_state(self)
             # No more open windows, run shutdown
             wx.CallAfter(self.app.shutdown)
@@ -0,0 +1,102 @@
+"""
+Post-SERVING warm up.
+
+The first request the WebView makes otherwise pays for cold URL resolvers,
+template compilation, session lookups and SQLite page cache misses. Right after
+the server starts serving, warm_up_then requests the app initialize URL and a
+configurable list of hot API endpoints over loopback, and only then reports the
+server as ready, or once the deadline has passed, whichever comes first.
+"""
+import http.client
+import time
+from threading import Lock
+from threading import Thread
+from threading import Timer
+
+from kolibri_app.logger import logging
+from kolibri_app.options import get_app_option
+from kolibri_app.startup_progress import FINISHED
+from kolibri_app.startup_progress import progress
+from kolibri_app.startup_progress import STARTED
+from kolibri_app.startup_progress import WARM_UP
+from kolibri_app.tracer import tracer
+
+REQUEST_TIMEOUT = 10
+
+
+def _request(port, path):
+    """Issue one loopback GET and return its latency in seconds."""
+    start = time.perf_counter()
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=REQUEST_TIMEOUT)
+    try:
+        connection.request("GET", path)
+        response = connection.getresponse()
+        response.read()
+    finally:
+        connection.close()
+    return time.perf_counter() - start
+
+
+def _warm_up(port, paths):
+    start = time.perf_counter()
+    with tracer.span("warm-up", paths=len(paths)):
+        for path in paths:
+            try:
+                # The first request is what the WebView would have paid for,
+                # the second one shows what it pays now.
+                cold = _request(port, path)
+                warm = _request(port, path)
+            except (OSError, http.client.HTTPException) as e:
+                logging.warning("Warm up request for {} failed: {}".format(path, e))
+                continue
+            logging.info(
+                "Warm up {}: first request {:.0f} ms, after warm up {:.0f} ms".format(
+                    path, cold * 1000, warm * 1000
+                )
+            )
+    logging.info(
+        "Warm up finished in {:.0f} ms".format((time.perf_counter() - start) * 1000)
+    )
+
+
+def warm_up_then(port, callback):
+    """
+    Warm up the server listening on port in a background thread and call
+    callback exactly once, when warm up finishes or the deadline passes.
+    """
+    if not get_app_option("WARMUP_ENABLED"):
+        callback()
+        return
+
+    from kolibri.core.device.utils import app_initialize_url
+
+    paths = [app_initialize_url()] + list(get_app_option("WARMUP_PATHS"))
+    deadline = get_app_option("WARMUP_DEADLINE")
+
+    lock = Lock()
+    state = {"done": False}
+    progress.report(WARM_UP, STARTED)
+
+    def finish(reason):
+        with lock:
+            if state["done"]:
+                return
+            state["done"] = True
+        if reason == "deadline":
+            logging.info(
+                "Warm up still running after {} s, loading Kolibri anyway".format(
+                    deadline
+                )
+            )
+        timer.cancel()
+        progress.report(WARM_UP, FINISHED)
+        callback()
+
+    def run():
+        _warm_up(port, paths)
+        finish("complete")
+
+    timer = Timer(deadline, finish, args=("deadline",))
+    timer.daemon = True
+    timer.start()
+    Thread(target=run, daemon=True).start()
@@ -0,0 +1,234 @@
+"""
+Server health watchdog.
+
+Once Kolibri is loaded, a background thread requests a cheap Kolibri endpoint
+every WATCHDOG_INTERVAL seconds and keeps the latencies in a rolling histogram,
+which is summarized in the log every REPORT_INTERVAL seconds. Where the server
+runs in another process, the age of the last reply on the IPC channel is checked
+as well, which tells a hung Django apart from a hung or dead server process.
+
+After WATCHDOG_FAILURES probes in a row fail or time out, the server is
+considered hung and WATCHDOG_POLICY decides what happens: "notify" tells the
+user, "restart" restarts the server where the server manager can (and tells the
+user otherwise), "none" only logs it. When the server runs in the UI process,
+the stacks of all its threads are logged to show where it is stuck.
+"""
+import bisect
+import collections
+import http.client
+import sys
+import threading
+import time
+import traceback
+
+import wx
+
+from kolibri_app.logger import logging
+from kolibri_app.options import get_app_option
+
+PROBE_PATH = "/api/public/info/"
+
+# Upper bounds in milliseconds of the histogram buckets, the last one is open
+BUCKET_BOUNDS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# Probes kept in the rolling histogram, an hour at the default interval
+HISTORY_SIZE = 240
+# Seconds between two latency summaries in the log
+REPORT_INTERVAL = 600
+
+POLICY_NOTIFY = "notify"
+POLICY_RESTART = "restart"
+POLICY_NONE = "none"
+
+
+class LatencyHistogram(object):
+    """Latencies of the last HISTORY_SIZE probes, None for a failed probe."""
+
+    def __init__(self, size=HISTORY_SIZE):
+        self.samples = collections.deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, latency):
+        with self._lock:
+            self.samples.append(latency)
+
+    def snapshot(self):
+        """Counts per bucket, failures and percentiles of the current window."""
+        with self._lock:
+            samples = list(self.samples)
+        latencies = sorted(sample * 1000 for sample in samples if sample is not None)
+        buckets = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        for latency in latencies:
+            buckets[bisect.bisect_left(BUCKET_BOUNDS_MS, latency)] += 1
+        return {
+            "count": len(samples),
+            "failures": len(samples) - len(latencies),
+            "buckets": buckets,
+            "p50": _percentile(latencies, 0.5),
+            "p95": _percentile(latencies, 0.95),
+            "p99": _percentile(latencies, 0.99),
+            "max": latencies[-1] if latencies else None,
+        }
+
+    def summary(self):
+        snapshot = self.snapshot()
+        if snapshot["count"] == snapshot["failures"]:
+            return "{} probes, all failed".format(snapshot["count"])
+        return "{} probes, p50 {:.0f} ms, p95 {:.0f} ms, p99 {:.0f} ms, max {:.0f} ms, {} failed".format(
+            snapshot["count"],
+            snapshot["p50"],
+            snapshot["p95"],
+            snapshot["p99"],
+            snapshot["max"],
+            snapshot["failures"],
+        )
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def probe(port, timeout):
+    """
+    Request PROBE_PATH and return its latency in seconds. Raises OSError or
+    HTTPException if the server does not answer in time or answers with an error.
+    """
+    start = time.perf_counter()
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        connection.request("GET", PROBE_PATH)
+        response = connection.getresponse()
+        response.read()
+    finally:
+        connection.close()
+    if response.status >= 500:
+        raise http.client.HTTPException("HTTP {}".format(response.status))
+    return time.perf_counter() - start
+
+
+def format_thread_stacks():
+    """The current stack of every thread of this process."""
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    parts = []
+    for ident, frame in sys._current_frames().items():
+        if ident == threading.get_ident():
+            continue
+        parts.append(
+            'Thread "{}":\n{}'.format(
+                names.get(ident, ident), "".join(traceback.format_stack(frame))
+            )
+        )
+    return "\n".join(parts)
+
+
+class ServerWatchdog(object):
+    """
+    Probes the server listening on port until stopped. The server manager may
+    provide get_heartbeat_age(), the seconds since the server last answered on
+    the IPC channel, and restart_server(), which returns True if it restarts
+    the server.
+    """
+
+    def __init__(self, app, port):
+        self.app = app
+        self.port = port
+        self.histogram = LatencyHistogram()
+        self.interval = get_app_option("WATCHDOG_INTERVAL")
+        self.timeout = get_app_option("WATCHDOG_TIMEOUT")
+        self.max_failures = get_app_option("WATCHDOG_FAILURES")
+        self.policy = get_app_option("WATCHDOG_POLICY")
+        self.failures = 0
+        self.hung = False
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="server watchdog", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _run(self):
+        last_report = time.monotonic()
+        while not self._stop_event.wait(self.interval):
+            self.check()
+            if time.monotonic() - last_report >= REPORT_INTERVAL:
+                last_report = time.monotonic()
+                logging.info("Server latency: {}".format(self.histogram.summary()))
+
+    def check(self):
+        try:
+            latency = probe(self.port, self.timeout)
+            error = None
+        except (OSError, http.client.HTTPException) as e:
+            latency = None
+            error = e
+        self.histogram.add(latency)
+        if self._stop_event.is_set():
+            # Shut down or restarted while the probe was running
+            return
+
+        if latency is not None:
+            if latency > self.timeout / 2:
+                logging.warning(
+                    "Server took {:.0f} ms to answer {}".format(
+                        latency * 1000, PROBE_PATH
+                    )
+                )
+            self.failures = 0
+            if self.hung:
+                self.hung = False
+                logging.info("Server is responding again")
+                wx.CallAfter(self.app.on_server_recovered)
+            return
+
+        self.failures += 1
+        logging.warning(
+            "Server health probe failed ({}/{}): {}".format(
+                self.failures, self.max_failures, error
+            )
+        )
+        if self.failures >= self.max_failures and not self.hung:
+            self.hung = True
+            self.on_hung()
+
+    def diagnose(self):
+        manager = self.app.server_manager
+        get_heartbeat_age = getattr(manager, "get_heartbeat_age", None)
+        if get_heartbeat_age is None:
+            return "the server thread in the app process does not answer HTTP requests"
+        age = get_heartbeat_age()
+        if age is not None and age < self.interval + self.timeout:
+            return (
+                "the server process is alive but Kolibri does not answer HTTP requests"
+            )
+        return "the server process does not answer HTTP requests nor IPC messages"
+
+    def on_hung(self):
+        diagnosis = self.diagnose()
+        logging.error(
+            "Server is not responding after {} probes: {}. Latency before: {}".format(
+                self.failures, diagnosis, self.histogram.summary()
+            )
+        )
+        if getattr(self.app.server_manager, "server_in_process", False):
+            logging.error(
+                "Stacks of the app threads:\n{}".format(format_thread_stacks())
+            )
+
+        if self.policy == POLICY_NONE:
+            return
+        if self.policy == POLICY_RESTART:
+            restart_server = getattr(self.app.server_manager, "restart_server", None)
+            if restart_server is not None and restart_server():
+                logging.info("Restarting the unresponsive server")
+                # A new watchdog starts once the new server is ready.
+                self.stop()
+                return
+            logging.warning("This server cannot be restarted from the app")
+        wx.CallAfter(self.app.on_server_unresponsive)
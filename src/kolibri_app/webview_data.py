@@ -0,0 +1,216 @@
+"""
+Persistent, size-bounded WebView data directory.
+
+On Windows, the WebView2 user data folder, with the HTTP cache, the compiled
+script cache, cookies and local storage of the Kolibri pages, is kept in
+KOLIBRI_HOME/webview/<user> next to the rest of Kolibri's data. An installed
+app shares KOLIBRI_HOME between all the accounts of the computer, but each of
+them gets a folder of its own, so that they neither share the Kolibri session
+cookie nor contend for one user data folder. WebView2 reads the folder and
+additional browser arguments from the environment when the first WebView is
+created, so configure_webview_data() must run before that.
+
+Chromium keeps its HTTP cache within the size it is given, but not its code and
+GPU caches, and none of them may be deleted while it runs. So a background
+thread measures the caches after every start, and when together they exceed
+WEBVIEW_CACHE_SIZE it leaves a marker for the next start, which moves them out
+of the way before the first WebView is created and deletes them in the
+background. Cookies and storage are never deleted.
+
+On macOS and Linux, WKWebView and WebKitGTK keep a persistent cache in a data
+directory of their own, which wx does not offer a way to move.
+
+CACHE_STATS_SCRIPT counts where the resources of a page came from, using the
+Resource Timing entries of the page: a resource transferred without any bytes
+came from the cache, one transferred with fewer bytes than its body was
+revalidated with the server, any other came from the server.
+"""
+import getpass
+import json
+import os
+import re
+import shutil
+import threading
+
+from kolibri.utils.conf import KOLIBRI_HOME
+
+from kolibri_app.constants import WINDOWS
+from kolibri_app.logger import logging
+from kolibri_app.options import get_app_option
+from kolibri_app.process_stats import format_mb
+from kolibri_app.process_stats import MB
+
+
+def get_user_dir_name():
+    """A folder name for the account running the app."""
+    try:
+        user = getpass.getuser()
+    except (KeyError, OSError):
+        # No user name in the environment nor a password database entry
+        user = "default"
+    return re.sub(r'[\\/:*?"<>|]', "_", user).strip(". ") or "_"
+
+
+DATA_DIR = os.path.join(KOLIBRI_HOME, "webview", get_user_dir_name())
+TRASH_DIR = os.path.join(DATA_DIR, "trash")
+TRIM_MARKER = os.path.join(DATA_DIR, "trim_caches")
+
+USER_DATA_FOLDER_ENVVAR = "WEBVIEW2_USER_DATA_FOLDER"
+BROWSER_ARGUMENTS_ENVVAR = "WEBVIEW2_ADDITIONAL_BROWSER_ARGUMENTS"
+
+# Caches that WebView2 rebuilds on its own, relative to its user data folder
+CACHE_DIRS = (
+    os.path.join("EBWebView", "Default", "Cache"),
+    os.path.join("EBWebView", "Default", "Code Cache"),
+    os.path.join("EBWebView", "Default", "GPUCache"),
+    os.path.join("EBWebView", "GrShaderCache"),
+    os.path.join("EBWebView", "ShaderCache"),
+)
+
+# Share of WEBVIEW_CACHE_SIZE given to the HTTP cache, the rest is left for the
+# code and GPU caches
+HTTP_CACHE_SHARE = 0.75
+
+# How long after a page has loaded its cache statistics are logged, so that the
+# resources the page loads once it is shown are counted as well
+CACHE_STATS_DELAY_MS = 10000
+
+CACHE_STATS_SCRIPT = """(function () {
+    var stats = {resources: 0, cached: 0, cachedBytes: 0, revalidated: 0, fetched: 0, fetchedBytes: 0};
+    performance.getEntriesByType("resource").forEach(function (entry) {
+        // Responses without a body, or cross-origin ones without timing details
+        if (!entry.decodedBodySize) {
+            return;
+        }
+        stats.resources++;
+        if (entry.transferSize === 0) {
+            stats.cached++;
+            stats.cachedBytes += entry.decodedBodySize;
+        } else if (entry.transferSize < entry.encodedBodySize) {
+            stats.revalidated++;
+        } else {
+            stats.fetched++;
+            stats.fetchedBytes += entry.transferSize;
+        }
+    });
+    return JSON.stringify(stats);
+})()"""
+
+
+def get_cache_size():
+    """WEBVIEW_CACHE_SIZE in bytes, 0 to leave the caches to the backend."""
+    return max(0, get_app_option("WEBVIEW_CACHE_SIZE")) * MB
+
+
+def get_dir_size(path):
+    size = 0
+    for directory, _, names in os.walk(path):
+        for name in names:
+            try:
+                size += os.path.getsize(os.path.join(directory, name))
+            except OSError:
+                pass
+    return size
+
+
+def move_caches_to_trash():
+    """
+    Move the caches out of the way before WebView2 starts, which is quick,
+    and leave deleting them to the background thread. Returns whether all of
+    them were moved.
+    """
+    moved = True
+    for index, cache_dir in enumerate(CACHE_DIRS):
+        path = os.path.join(DATA_DIR, cache_dir)
+        if not os.path.isdir(path):
+            continue
+        try:
+            os.makedirs(TRASH_DIR, exist_ok=True)
+            os.replace(
+                path, os.path.join(TRASH_DIR, "{}-{}".format(os.getpid(), index))
+            )
+        except OSError as e:
+            # e.g. a WebView2 process of the previous run has not exited yet
+            logging.warning("Could not clear the WebView cache {}: {}".format(path, e))
+            moved = False
+    return moved
+
+
+def check_caches(max_size):
+    """Run by the background thread."""
+    shutil.rmtree(TRASH_DIR, ignore_errors=True)
+    size = sum(get_dir_size(os.path.join(DATA_DIR, path)) for path in CACHE_DIRS)
+    if size > max_size:
+        logging.info(
+            "WebView caches use {} of {}, they will be cleared at the next start".format(
+                format_mb(size), format_mb(max_size)
+            )
+        )
+        try:
+            with open(TRIM_MARKER, "w"):
+                pass
+        except OSError as e:
+            logging.warning(
+                "Could not schedule clearing the WebView caches: {}".format(e)
+            )
+    else:
+        logging.info(
+            "WebView caches use {} of {}".format(format_mb(size), format_mb(max_size))
+        )
+
+
+def configure_webview_data():
+    """
+    Point WebView2 at the data folder in KOLIBRI_HOME and bound its caches.
+    Must be called before the first WebView is created.
+    """
+    if not WINDOWS:
+        logging.debug("The WebView keeps its data in the backend's own directory")
+        return
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    os.environ[USER_DATA_FOLDER_ENVVAR] = DATA_DIR
+
+    max_size = get_cache_size()
+    if not max_size:
+        return
+    # Keep any arguments set for debugging, e.g. --remote-debugging-port
+    arguments = os.environ.get(BROWSER_ARGUMENTS_ENVVAR, "").split()
+    arguments.append("--disk-cache-size={}".format(int(max_size * HTTP_CACHE_SHARE)))
+    os.environ[BROWSER_ARGUMENTS_ENVVAR] = " ".join(arguments)
+
+    if os.path.exists(TRIM_MARKER) and move_caches_to_trash():
+        os.remove(TRIM_MARKER)
+        logging.info("Cleared the WebView caches")
+
+    threading.Thread(
+        target=check_caches, args=(max_size,), name="webview caches", daemon=True
+    ).start()
+
+
+def parse_cache_stats(result):
+    """
+    The statistics returned by CACHE_STATS_SCRIPT, from the (success, output)
+    of WebView.RunScript. Some backends return the JSON string JSON-encoded
+    once more.
+    """
+    if not isinstance(result, tuple) or not result[0]:
+        return None
+    try:
+        stats = json.loads(result[1])
+        if isinstance(stats, str):
+            stats = json.loads(stats)
+    except (TypeError, ValueError):
+        return None
+    return stats if isinstance(stats, dict) else None
+
+
+def format_cache_stats(stats):
+    return "{} resources, {} from the cache ({:.1f} MB), {} revalidated, {} from the server ({:.1f} MB)".format(
+        stats.get("resources", 0),
+        stats.get("cached", 0),
+        stats.get("cachedBytes", 0) / MB,
+        stats.get("revalidated", 0),
+        stats.get("fetched", 0),
+        stats.get("fetchedBytes", 0) / MB,
+    )
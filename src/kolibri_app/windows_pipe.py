@@ -0,0 +1,25 @@
+"""
+Framing shared by both ends of the named pipe between the UI process and the
+Windows server subprocess, kept apart so the UI does not import the server side.
+"""
+import json
+
+import win32file
+import winerror
+
+PIPE_BUFFER_SIZE = 65536
+
+
+def read_pipe_message(pipe):
+    """
+    Read one whole message from a message-mode pipe, which arrives in several
+    chunks when it is larger than the read buffer. Returns None if the read failed.
+    """
+    chunks = []
+    while True:
+        hr, data = win32file.ReadFile(pipe, PIPE_BUFFER_SIZE)
+        if hr != winerror.ERROR_SUCCESS and hr != winerror.ERROR_MORE_DATA:
+            return None
+        chunks.append(data if isinstance(data, bytes) else data.encode("utf-8"))
+        if hr == winerror.ERROR_SUCCESS:
+            return json.loads(b"".join(chunks).decode("utf-8"))
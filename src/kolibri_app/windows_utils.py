@@ -5,7 +5,7 @@ import win32service
 
 from kolibri_app.constants import SERVICE_NAME
 from kolibri_app.logger import logging
-from kolibri_app.server_process_windows import ServerProcess
+from kolibri_app.tracer import tracer
 from kolibri_app.windows_registry import update_tray_icon_startup
 
 
@@ -88,7 +88,14 @@ def handle_windows_commands():
 
     # This block is the entry point for the server subprocess
     if "--run-as-server" in sys.argv:
+        # Before anything is logged, the UI process owns kolibri-app.txt
+        from kolibri_app.log_forwarding import install_log_forwarding
+
+        install_log_forwarding()
         logging.info("Starting in server mode...")
+        tracer.process_name = "Kolibri server"
+        from kolibri_app.server_process_windows import ServerProcess
+
         server = ServerProcess()
         server.run()
         sys.exit(0)
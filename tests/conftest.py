@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The same paths as PYTHON_EXEC_WITH_PATH in the Makefile
+for path in reversed((os.path.join(ROOT, "src"), os.path.join(ROOT, "kolibrisrc"))):
+    if os.path.isdir(path) and path not in sys.path:
+        sys.path.insert(0, path)
+
+# Kolibri reads KOLIBRI_HOME once, when it is first imported, so the tests
+# share one of their own. Tests that need a fresh one use run_kolibri_code.
+os.environ["KOLIBRI_HOME"] = tempfile.mkdtemp(prefix="kolibri-app-tests-")
+
+# Puts the dependencies bundled with Kolibri, Django among them, on sys.path
+import kolibri  # noqa: E402, F401
+
+
+@pytest.fixture
+def kolibri_home(tmp_path):
+    home = tmp_path / "kolibri_home"
+    home.mkdir()
+    return home
+
+
+@pytest.fixture
+def wx(monkeypatch):
+    """
+    Stands in for wxPython, which the tests run without. Its CallAfter runs
+    the callback right away.
+    """
+    module = types.ModuleType("wx")
+    module.CallAfter = lambda callback, *args, **kwargs: callback(*args, **kwargs)
+    monkeypatch.setitem(sys.modules, "wx", module)
+    return module
+
+
+@pytest.fixture
+def run_kolibri_code(tmp_path, kolibri_home):
+    """
+    Run Python code in a new process with kolibri_home as KOLIBRI_HOME, for
+    tests of what only happens once per process, like initialize().
+    """
+
+    def run(code, env=None, timeout=600):
+        process_env = dict(os.environ, KOLIBRI_HOME=str(kolibri_home), **(env or {}))
+        process_env["PYTHONPATH"] = os.pathsep.join(sys.path)
+        return subprocess.run(
+            [sys.executable, "-c", textwrap.dedent(code)],
+            env=process_env,
+            cwd=str(tmp_path),
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+        )
+
+    return run
@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+# Settings are computed once, when the module is imported
+READ_SETTINGS = """
+import json
+
+from kolibri_app import django_app_settings as settings
+
+template_options = settings.TEMPLATES[0]
+print("SETTINGS", json.dumps({
+    "session_engine": settings.SESSION_ENGINE,
+    "app_dirs": template_options.get("APP_DIRS"),
+    "loaders": template_options["OPTIONS"].get("loaders"),
+}))
+"""
+
+CACHED_LOADERS = [
+    [
+        "django.template.loaders.cached.Loader",
+        [
+            "django.template.loaders.filesystem.Loader",
+            "django.template.loaders.app_directories.Loader",
+        ],
+    ]
+]
+
+
+@pytest.fixture
+def read_settings(run_kolibri_code):
+    def read(**options):
+        env = {"KOLIBRI_APP_" + name: value for name, value in options.items()}
+        result = run_kolibri_code(READ_SETTINGS, env=env)
+        assert result.returncode == 0, result.stderr
+        for line in result.stdout.splitlines():
+            if line.startswith("SETTINGS "):
+                return json.loads(line.split(" ", 1)[1])
+        raise AssertionError(result.stdout)
+
+    return read
+
+
+def test_desktop_caching(read_settings):
+    settings = read_settings()
+    assert settings["session_engine"] == "kolibri_app.sessions"
+    assert settings["app_dirs"] is False
+    assert settings["loaders"] == CACHED_LOADERS
+
+
+def test_desktop_caching_off(read_settings):
+    settings = read_settings(DESKTOP_CACHING="0")
+    assert settings["session_engine"] != "kolibri_app.sessions"
+    assert settings["loaders"] is None
+
+
+def test_process_local_sessions_are_not_shared_by_workers(read_settings):
+    settings = read_settings(MULTIPROCESS_SERVING="1")
+    assert settings["session_engine"] != "kolibri_app.sessions"
+    # Every process can cache its own templates
+    assert settings["loaders"] == CACHED_LOADERS
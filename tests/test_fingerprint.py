@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from kolibri_app import fingerprint
+from kolibri_app.options import registry_initialized
+
+# The app redirects stdout to its log, so the result goes to a file
+INITIALIZE = """
+from kolibri.main import enable_plugin
+
+enable_plugin("kolibri_app")
+
+from kolibri_app.fingerprint import initialize_kolibri
+
+fast_path = initialize_kolibri()
+with open("fast_path.json", "w") as f:
+    f.write(repr(fast_path))
+"""
+
+
+@pytest.fixture
+def initialize(run_kolibri_code, tmp_path):
+    def run(env=None):
+        result = run_kolibri_code(INITIALIZE, env=env)
+        assert result.returncode == 0, result.stderr
+        return json.loads((tmp_path / "fast_path.json").read_text().lower())
+
+    return run
+
+
+def test_fast_path_on_unchanged_install(initialize, kolibri_home):
+    # A new KOLIBRI_HOME needs the full path, which stores the fingerprint
+    assert initialize() is False
+    assert (kolibri_home / "app_initialize_fingerprint.json").exists()
+    assert initialize() is True
+    assert initialize(env={"KOLIBRI_APP_INITIALIZE_FAST_PATH": "false"}) is False
+
+
+def test_full_path_on_mismatch(initialize, kolibri_home):
+    assert initialize() is False
+    path = kolibri_home / "app_initialize_fingerprint.json"
+    stored = json.loads(path.read_text())
+    # As after an upgrade of the app
+    path.write_text(json.dumps(dict(stored, app_version="0.0.1")))
+    assert initialize() is False
+    assert json.loads(path.read_text()) == stored
+
+
+@pytest.fixture
+def home(kolibri_home, monkeypatch):
+    monkeypatch.setattr(fingerprint, "KOLIBRI_HOME", str(kolibri_home))
+    monkeypatch.setattr("kolibri.utils.conf.KOLIBRI_HOME", str(kolibri_home))
+    for envvar in ("KOLIBRI_DATABASE_NAME", "KOLIBRI_JOB_STORAGE_FILEPATH"):
+        monkeypatch.delenv(envvar, raising=False)
+    return kolibri_home
+
+
+def test_database_paths(home):
+    paths = fingerprint.get_database_paths()
+    assert paths["default"] == str(home / "db.sqlite3")
+    assert paths["sessions"] == str(home / "sessions.sqlite3")
+    assert paths["job_storage"] == str(home / "job_storage.sqlite3")
+
+
+def test_database_paths_from_options(home, monkeypatch):
+    (home / "options.ini").write_text(
+        "[Database]\nDATABASE_NAME = main.sqlite3\n"
+        "[Tasks]\nJOB_STORAGE_FILEPATH = jobs/storage.sqlite3\n"
+    )
+    monkeypatch.setenv("KOLIBRI_DATABASE_NAME", "other.sqlite3")
+    paths = fingerprint.get_database_paths()
+    assert paths["default"] == str(home / "other.sqlite3")
+    assert paths["job_storage"] == str(home / "jobs" / "storage.sqlite3")
+    assert not registry_initialized()
+
+
+def test_no_fingerprint_without_databases(home):
+    assert fingerprint.compute_fingerprint() is None
+    assert not registry_initialized()
@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from kolibri_app.loading_progress import get_progress_text
+from kolibri_app.loading_progress import progress_script
+from kolibri_app.startup_progress import INITIALIZE
+from kolibri_app.startup_progress import MIGRATIONS
+from kolibri_app.startup_progress import PROGRESS
+from kolibri_app.startup_progress import SERVER
+from kolibri_app.startup_progress import STARTED
+from kolibri_app.startup_progress import WARM_UP
+
+
+@pytest.mark.parametrize(
+    "phase,text",
+    [
+        (INITIALIZE, "Starting Kolibri"),
+        (MIGRATIONS, "Updating the database"),
+        (SERVER, "Starting the server"),
+        (WARM_UP, "Almost ready"),
+    ],
+)
+def test_text_per_phase(phase, text):
+    assert get_progress_text({"phase": phase, "status": STARTED}) == text
+
+
+def test_migrations_are_counted():
+    event = {"phase": MIGRATIONS, "status": PROGRESS, "done": 3, "total": 120}
+    assert get_progress_text(event) == "Updating the database (3 of 120)"
+
+
+def test_unknown_phases_show_nothing():
+    assert get_progress_text({"phase": "something else"}) is None
+    assert progress_script({"phase": "something else"}) is None
+
+
+def test_script_shows_the_text():
+    script = progress_script({"phase": WARM_UP, "status": STARTED})
+    assert script.endswith('})("Almost ready");')
+    assert 'getElementById("kolibri-app-progress")' in script
+
+
+def test_text_is_escaped(monkeypatch):
+    text = 'Say "hi"</script>\n'
+    monkeypatch.setattr(
+        "kolibri_app.loading_progress.get_progress_text", lambda event: text
+    )
+    script = progress_script({"phase": INITIALIZE})
+    assert script.endswith("})(" + json.dumps(text) + ");")
+    assert "\n" not in script.rsplit("})(", 1)[1]
@@ -0,0 +1,103 @@
+import gzip
+import logging
+import os
+
+import pytest
+
+from kolibri_app import log_files
+from kolibri_app.log_files import compress_rotated_logs
+from kolibri_app.log_files import CompressingTimedRotatingFileHandler
+from kolibri_app.log_files import enforce_retention
+
+
+class Maintenance(object):
+    def __init__(self):
+        self.requests = 0
+
+    def request(self):
+        self.requests += 1
+
+
+@pytest.fixture
+def log_root(tmp_path):
+    root = tmp_path / "logs"
+    (root / "archive").mkdir(parents=True)
+    return root
+
+
+def write_rotated(log_root, name, date, content="", compressed=False):
+    path = log_root / "archive" / "{}-{}.txt".format(name, date)
+    if compressed:
+        path = path.with_name(path.name + ".gz")
+        with gzip.open(str(path), "wt", encoding="utf-8") as f:
+            f.write(content)
+    else:
+        path.write_text(content, encoding="utf-8")
+    return path
+
+
+def test_rollover_is_compressed(log_root, monkeypatch):
+    maintenance = Maintenance()
+    monkeypatch.setattr(log_files, "log_maintenance", maintenance)
+    handler = CompressingTimedRotatingFileHandler(
+        filename=str(log_root / "kolibri-app.txt"), encoding="utf-8", when="midnight"
+    )
+    handler.emit(logging.makeLogRecord({"msg": "before rollover"}))
+    handler.doRollover()
+    handler.emit(logging.makeLogRecord({"msg": "after rollover"}))
+    handler.close()
+    assert maintenance.requests == 1
+
+    compress_rotated_logs(str(log_root))
+    archived = os.listdir(str(log_root / "archive"))
+    assert len(archived) == 1
+    assert archived[0].startswith("kolibri-app-")
+    assert archived[0].endswith(".txt.gz")
+    with gzip.open(str(log_root / "archive" / archived[0]), "rt") as f:
+        assert f.read() == "before rollover\n"
+    assert (log_root / "kolibri-app.txt").read_text() == "after rollover\n"
+
+
+def test_compression_skips_compressed_and_live_logs(log_root):
+    write_rotated(log_root, "kolibri", "2026-01-01", "first\n", compressed=True)
+    write_rotated(log_root, "kolibri", "2026-01-02", "second\n")
+    (log_root / "kolibri.txt").write_text("live\n")
+    compress_rotated_logs(str(log_root))
+    assert sorted(os.listdir(str(log_root / "archive"))) == [
+        "kolibri-2026-01-01.txt.gz",
+        "kolibri-2026-01-02.txt.gz",
+    ]
+    with gzip.open(str(log_root / "archive" / "kolibri-2026-01-01.txt.gz"), "rt") as f:
+        assert f.read() == "first\n"
+    assert (log_root / "kolibri.txt").read_text() == "live\n"
+
+
+def test_handler_keeps_a_count_cap(log_root):
+    handler = CompressingTimedRotatingFileHandler(
+        filename=str(log_root / "kolibri-app.txt"), when="midnight", delay=True
+    )
+    assert handler.backupCount == log_files.DEFAULT_BACKUP_COUNT
+
+
+def test_retention_count_per_log(log_root):
+    for day in range(1, 6):
+        write_rotated(log_root, "kolibri-app", "2026-01-0{}".format(day), "app")
+        write_rotated(log_root, "kolibri", "2026-01-0{}".format(day), "kolibri")
+    enforce_retention(str(log_root), 2, 0)
+    assert sorted(os.listdir(str(log_root / "archive"))) == [
+        "kolibri-2026-01-04.txt",
+        "kolibri-2026-01-05.txt",
+        "kolibri-app-2026-01-04.txt",
+        "kolibri-app-2026-01-05.txt",
+    ]
+
+
+def test_retention_bytes_removes_the_oldest(log_root):
+    write_rotated(log_root, "kolibri", "2026-01-01", "a" * 100)
+    write_rotated(log_root, "kolibri-app", "2026-01-02", "b" * 100)
+    write_rotated(log_root, "kolibri", "2026-01-03", "c" * 100)
+    enforce_retention(str(log_root), 0, 250)
+    assert sorted(os.listdir(str(log_root / "archive"))) == [
+        "kolibri-2026-01-03.txt",
+        "kolibri-app-2026-01-02.txt",
+    ]
@@ -0,0 +1,123 @@
+import logging
+import sys
+
+import pytest
+
+from kolibri_app import log_forwarding
+from kolibri_app.log_forwarding import ForwardingLogHandler
+from kolibri_app.log_forwarding import record_to_dict
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+        self.closed = False
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+    def close(self):
+        self.closed = True
+        super().close()
+
+
+@pytest.fixture
+def fallback():
+    return ListHandler()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(log_forwarding.time, "monotonic", lambda: clock[0])
+    return clock
+
+
+@pytest.fixture
+def forwarder(fallback, clock):
+    return ForwardingLogHandler(fallback)
+
+
+def log(handler, msg, **kwargs):
+    handler.handle(logging.makeLogRecord(dict(msg=msg, levelno=logging.INFO, **kwargs)))
+
+
+def messages(entries):
+    return [entry["msg"] for entry in entries]
+
+
+def test_records_are_held_for_the_ui(forwarder, fallback):
+    forwarder.client_connected()
+    log(forwarder, "one")
+    log(forwarder, "two")
+    assert messages(forwarder.drain()) == ["one", "two"]
+    assert forwarder.drain() == []
+    assert fallback.messages == []
+
+
+def test_records_are_held_until_a_ui_connects(forwarder, fallback, clock):
+    clock[0] += log_forwarding.DETACHED_GRACE_PERIOD - 1
+    log(forwarder, "starting")
+    forwarder.client_connected()
+    assert messages(forwarder.drain()) == ["starting"]
+    assert fallback.messages == []
+
+
+def test_fallback_once_detached(forwarder, fallback, clock):
+    forwarder.client_connected()
+    log(forwarder, "held")
+    forwarder.client_disconnected()
+    log(forwarder, "still held")
+    clock[0] += log_forwarding.DETACHED_GRACE_PERIOD
+    log(forwarder, "written")
+    assert fallback.messages == ["held", "still held", "written"]
+    assert forwarder.drain() == []
+
+
+def test_oldest_records_spill_to_the_fallback(forwarder, fallback, monkeypatch):
+    monkeypatch.setattr(log_forwarding, "MAX_BUFFERED_RECORDS", 2)
+    forwarder.client_connected()
+    for msg in ("one", "two", "three"):
+        log(forwarder, msg)
+    assert fallback.messages == ["one"]
+    assert messages(forwarder.drain()) == ["two", "three"]
+
+
+def test_drain_limit(forwarder):
+    forwarder.client_connected()
+    for msg in ("one", "two", "three"):
+        log(forwarder, msg)
+    assert messages(forwarder.drain(limit=2)) == ["one", "two"]
+    assert messages(forwarder.drain(limit=2)) == ["three"]
+
+
+def test_close_writes_what_is_left(forwarder, fallback):
+    forwarder.client_connected()
+    log(forwarder, "left")
+    forwarder.close()
+    assert fallback.messages == ["left"]
+    assert fallback.closed
+
+
+def test_record_to_dict_formats_the_traceback():
+    try:
+        raise ValueError("broken")
+    except ValueError:
+        record = logging.makeLogRecord(
+            {"msg": "failed %s", "args": ("twice",), "exc_info": sys.exc_info()}
+        )
+    entry = record_to_dict(record)
+    assert entry["msg"] == "failed twice"
+    assert entry["exc_text"].endswith("ValueError: broken")
+    # What the UI process writes
+    replayed = logging.makeLogRecord(entry)
+    assert "ValueError: broken" in logging.Formatter().format(replayed)
+
+
+def test_worker_log_file(monkeypatch, tmp_path):
+    monkeypatch.setattr(log_forwarding, "LOG_ROOT", str(tmp_path))
+    monkeypatch.setattr(log_forwarding.log_listener, "handlers", ())
+    log_forwarding.install_worker_log(2)
+    (handler,) = log_forwarding.log_listener.handlers
+    assert handler.baseFilename == str(tmp_path / "kolibri-app-worker-2.txt")
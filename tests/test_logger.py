@@ -0,0 +1,131 @@
+import logging
+import queue
+import threading
+
+import pytest
+
+from kolibri_app import logger
+from kolibri_app.logger import BoundedQueueHandler
+from kolibri_app.logger import LoggerWriter
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append((record.levelno, record.getMessage()))
+
+
+def make_logger(name, handler, level=logging.DEBUG):
+    test_logger = logging.getLogger("kolibri_app_tests." + name)
+    test_logger.propagate = False
+    test_logger.handlers = [handler]
+    test_logger.setLevel(level)
+    return test_logger
+
+
+@pytest.fixture
+def log_queue(monkeypatch):
+    monkeypatch.setattr(logger, "LOG_QUEUE_BLOCK_TIMEOUT", 0.01)
+    return queue.Queue(2)
+
+
+def drain(log_queue):
+    messages = []
+    while not log_queue.empty():
+        record = log_queue.get_nowait()
+        messages.append((record.levelno, record.getMessage()))
+    return messages
+
+
+def test_queue_keeps_records_while_there_is_room(log_queue):
+    handler = BoundedQueueHandler(log_queue)
+    test_logger = make_logger("room", handler)
+    test_logger.info("one")
+    test_logger.warning("two")
+    assert drain(log_queue) == [(logging.INFO, "one"), (logging.WARNING, "two")]
+    assert handler.dropped == 0
+
+
+def test_full_queue_drops_and_reports(log_queue):
+    handler = BoundedQueueHandler(log_queue)
+    test_logger = make_logger("full", handler)
+    test_logger.info("one")
+    test_logger.info("two")
+    test_logger.debug("dropped")
+    # Warnings wait for room, but not for ever
+    test_logger.error("dropped too")
+    assert handler.dropped == 2
+    assert drain(log_queue) == [(logging.INFO, "one"), (logging.INFO, "two")]
+
+    test_logger.info("three")
+    assert drain(log_queue) == [
+        (logging.INFO, "three"),
+        (logging.WARNING, "Dropped 2 log records because the log queue was full"),
+    ]
+    assert handler.dropped == 0
+
+
+def test_warnings_wait_for_room(log_queue, monkeypatch):
+    monkeypatch.setattr(logger, "LOG_QUEUE_BLOCK_TIMEOUT", 5)
+    handler = BoundedQueueHandler(log_queue)
+    test_logger = make_logger("wait", handler)
+    test_logger.info("one")
+    test_logger.info("two")
+
+    threading.Timer(0.1, log_queue.get_nowait).start()
+    test_logger.warning("kept")
+    assert handler.dropped == 0
+    assert drain(log_queue) == [(logging.INFO, "two"), (logging.WARNING, "kept")]
+
+
+def test_dropped_count_survives_a_full_queue(log_queue):
+    handler = BoundedQueueHandler(log_queue)
+    test_logger = make_logger("survives", handler)
+    test_logger.info("one")
+    test_logger.info("two")
+    test_logger.info("dropped")
+    log_queue.get_nowait()
+    # Room for the record, but not for the summary
+    test_logger.info("three")
+    assert handler.dropped == 1
+    log_queue.get_nowait()
+    log_queue.get_nowait()
+    test_logger.info("four")
+    assert drain(log_queue) == [
+        (logging.INFO, "four"),
+        (logging.WARNING, "Dropped 1 log records because the log queue was full"),
+    ]
+
+
+@pytest.fixture
+def written():
+    return ListHandler()
+
+
+def test_writer_logs_lines(written):
+    writer = LoggerWriter(make_logger("lines", written), logging.WARNING)
+    writer.write("Traceback (most recent call last):\n  File")
+    writer.write(' "x.py"\nValueError\n')
+    assert written.messages == [
+        (logging.WARNING, "Traceback (most recent call last):"),
+        (logging.WARNING, '  File "x.py"'),
+        (logging.WARNING, "ValueError"),
+    ]
+
+
+def test_writer_flushes_partial_lines(written):
+    writer = LoggerWriter(make_logger("flush", written), logging.INFO)
+    writer.write("no newline")
+    assert written.messages == []
+    writer.flush()
+    assert written.messages == [(logging.INFO, "no newline")]
+
+
+def test_writer_skips_disabled_levels(written):
+    writer = LoggerWriter(make_logger("disabled", written, logging.INFO), logging.DEBUG)
+    assert writer.write("print output\n") == len("print output\n")
+    writer.flush()
+    assert written.messages == []
@@ -0,0 +1,209 @@
+import json
+import logging
+import math
+import types
+
+import pytest
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import Http404
+
+from kolibri_app import metrics
+from kolibri_app.metrics import Metric
+from kolibri_app.metrics import MetricsMiddleware
+from kolibri_app.metrics import RequestStats
+from kolibri_app.metrics import RouteStats
+
+
+class Request(object):
+    def __init__(self, remote_addr="127.0.0.1", method="GET", route=None):
+        self.META = {"REMOTE_ADDR": remote_addr}
+        self.method = method
+        self.path = "/" + (route or "")
+        if route is not None:
+            self.resolver_match = types.SimpleNamespace(route=route, view_name="view")
+
+
+class Response(object):
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class Connection(object):
+    """Runs the execute wrappers of the middleware around a query."""
+
+    def __init__(self):
+        self.wrappers = []
+
+    def execute_wrapper(self, wrapper):
+        connection = self
+
+        class Wrapping(object):
+            def __enter__(self):
+                connection.wrappers.append(wrapper)
+
+            def __exit__(self, *exc_info):
+                connection.wrappers.remove(wrapper)
+
+        return Wrapping()
+
+    def execute(self, sql):
+        def execute(sql, params, many, context):
+            return "result"
+
+        (wrapper,) = self.wrappers
+        return wrapper(execute, sql, (), False, {})
+
+
+@pytest.fixture
+def connection(monkeypatch):
+    connection = Connection()
+    monkeypatch.setattr(
+        metrics, "connections", types.SimpleNamespace(all=lambda: [connection])
+    )
+    return connection
+
+
+@pytest.fixture
+def metrics_enabled(monkeypatch, connection):
+    monkeypatch.setenv("KOLIBRI_APP_METRICS_ENABLED", "1")
+
+
+@pytest.mark.parametrize("remote_addr", ["127.0.0.1", "::1"])
+def test_local_requests_are_allowed(metrics_enabled, remote_addr):
+    metrics._check_access(Request(remote_addr))
+
+
+@pytest.mark.parametrize("remote_addr", ["192.168.1.20", "10.0.0.1", "", None])
+def test_other_addresses_are_refused(metrics_enabled, remote_addr):
+    with pytest.raises(Http404):
+        metrics._check_access(Request(remote_addr))
+
+
+def test_refused_while_disabled(monkeypatch):
+    monkeypatch.setenv("KOLIBRI_APP_METRICS_ENABLED", "0")
+    with pytest.raises(Http404):
+        metrics._check_access(Request())
+    with pytest.raises(MiddlewareNotUsed):
+        MetricsMiddleware(lambda request: Response(200))
+
+
+def test_middleware_records_requests(metrics_enabled, monkeypatch):
+    stats = RequestStats(buckets=(0.1, 1.0))
+    monkeypatch.setattr(metrics, "request_stats", stats)
+    middleware = MetricsMiddleware(lambda request: Response(404))
+    assert middleware(Request(method="PROPFIND")).status_code == 404
+
+    def fail(request):
+        raise ValueError("broken view")
+
+    with pytest.raises(ValueError):
+        MetricsMiddleware(fail)(Request())
+    assert stats.counts == {("other", "4xx"): 1, ("GET", "5xx"): 1}
+    assert stats.in_flight == 0
+
+
+def test_latency_histogram_is_cumulative():
+    stats = RequestStats(buckets=(0.1, 1.0))
+    for duration in (0.05, 0.1, 0.5, 2.0):
+        stats.started()
+        stats.finished("GET", 200, duration)
+    histogram = {metric.name: metric for metric in stats.metrics()}[
+        "kolibri_app_http_request_duration_seconds"
+    ]
+    assert histogram.samples == [
+        ("_bucket", {"le": "0.1"}, 2),
+        ("_bucket", {"le": "1.0"}, 3),
+        ("_bucket", {"le": "+Inf"}, 4),
+        ("_sum", {}, 2.65),
+        ("_count", {}, 4),
+    ]
+
+
+def test_prometheus_format():
+    text = metrics.render_prometheus(
+        [Metric("requests", "counter", "Requests.", [("", {"path": 'a"b'}, 3)])]
+    )
+    assert text == (
+        "# HELP requests Requests.\n"
+        "# TYPE requests counter\n"
+        'requests{path="a\\"b"} 3\n'
+    )
+
+
+def test_route_histograms():
+    stats = RouteStats(buckets=(0.1, 1.0), max_routes=2)
+    stats.observe("api/a/", 0.05)
+    stats.observe("api/b/", 0.5)
+    stats.observe("api/c/", 0.5)
+    stats.observe("api/a/", 2.0)
+    # Constant memory: a third pattern is counted as other
+    assert sorted(stats.histograms) == ["api/a/", "api/b/", "other"]
+    assert stats.histograms["api/a/"] == [1, 0, 1, 2.05]
+
+
+def test_route_percentiles():
+    stats = RouteStats(buckets=(0.1, 1.0))
+    assert stats.percentile("api/a/", 0.5) is None
+    for duration in [0.05] * 90 + [0.5] * 9 + [5.0]:
+        stats.observe("api/a/", duration)
+    assert stats.percentile("api/a/", 0.5) == 0.1
+    assert stats.percentile("api/a/", 0.9) == 0.1
+    assert stats.percentile("api/a/", 0.95) == 1.0
+    assert stats.percentile("api/a/", 0.99) == 1.0
+    assert stats.percentile("api/a/", 1.0) == math.inf
+
+    quantiles = {
+        labels["quantile"]: value
+        for _, labels, value in stats.metrics()[1].samples
+        if labels["route"] == "api/a/"
+    }
+    assert quantiles == {"0.5": 0.1, "0.95": 1.0, "0.99": 1.0}
+    assert "+Inf" in metrics.render_prometheus(
+        [metrics.Metric("p", "gauge", "P.", [("", {}, math.inf)])]
+    )
+
+
+@pytest.fixture
+def slow_requests(monkeypatch):
+    handler = logging.Handler()
+    handler.messages = []
+    handler.emit = lambda record: handler.messages.append(record.getMessage())
+    monkeypatch.setattr(metrics.slow_request_logger, "handlers", [handler])
+    monkeypatch.setattr(metrics.slow_request_logger, "propagate", False)
+    monkeypatch.setattr(metrics, "route_stats", RouteStats())
+    return handler.messages
+
+
+def test_slow_request_is_logged(
+    metrics_enabled, connection, slow_requests, monkeypatch
+):
+    monkeypatch.setenv("KOLIBRI_APP_SLOW_REQUEST_THRESHOLD", "0.000001")
+    request = Request(route="api/content/<pk>/")
+
+    def view(request):
+        middleware.process_view(request, None, (), {})
+        connection.execute("SELECT 1")
+        connection.execute("SELECT 2")
+        return Response(200)
+
+    middleware = MetricsMiddleware(view)
+    middleware(request)
+    assert len(slow_requests) == 1
+    prefix, entry = slow_requests[0].split(": ", 1)
+    assert prefix == "Slow request"
+    entry = json.loads(entry)
+    assert entry["route"] == "api/content/<pk>/"
+    assert entry["path"] == "/api/content/<pk>/"
+    assert entry["status"] == 200
+    assert entry["db_queries"] == 2
+    assert entry["total_ms"] >= entry["view_ms"] >= entry["db_ms"]
+    assert metrics.route_stats.percentile("api/content/<pk>/", 0.5) is not None
+
+
+def test_fast_requests_are_not_logged(metrics_enabled, slow_requests, monkeypatch):
+    monkeypatch.setenv("KOLIBRI_APP_SLOW_REQUEST_THRESHOLD", "60")
+    MetricsMiddleware(lambda request: Response(200))(Request())
+    monkeypatch.setenv("KOLIBRI_APP_SLOW_REQUEST_THRESHOLD", "0")
+    MetricsMiddleware(lambda request: Response(200))(Request())
+    assert slow_requests == []
+    assert list(metrics.route_stats.histograms) == ["unmatched"]
@@ -0,0 +1,92 @@
+import pytest
+
+from kolibri_app import options
+
+INITIALIZE_AFTER_OPTION = """
+from kolibri.main import enable_plugin
+from kolibri.main import initialize
+
+from kolibri_app.options import get_app_option
+
+print("WARMUP_DEADLINE", get_app_option("WARMUP_DEADLINE"))
+enable_plugin("kolibri_app")
+initialize()
+print("WARMUP_DEADLINE", get_app_option("WARMUP_DEADLINE"))
+"""
+
+
+@pytest.fixture
+def options_ini(kolibri_home, monkeypatch):
+    monkeypatch.setattr("kolibri.utils.conf.KOLIBRI_HOME", str(kolibri_home))
+    for envvar in ("KOLIBRI_APP_WARMUP_ENABLED", "KOLIBRI_APP_WARMUP_DEADLINE"):
+        monkeypatch.delenv(envvar, raising=False)
+    return kolibri_home / "options.ini"
+
+
+def test_default_before_initialize(options_ini):
+    assert options.get_app_option("WARMUP_DEADLINE") == 3.0
+
+
+def test_options_ini_before_initialize(options_ini):
+    options_ini.write_text(
+        "[KolibriApp]\nWARMUP_ENABLED = False\nWARMUP_DEADLINE = 5\n"
+    )
+    assert options.get_app_option("WARMUP_ENABLED") is False
+    assert options.get_app_option("WARMUP_DEADLINE") == 5.0
+
+
+def test_envvar_overrides_options_ini(options_ini, monkeypatch):
+    options_ini.write_text("[KolibriApp]\nWARMUP_DEADLINE = 5\n")
+    monkeypatch.setenv("KOLIBRI_APP_WARMUP_DEADLINE", "1.5")
+    assert options.get_app_option("WARMUP_DEADLINE") == 1.5
+
+
+def test_invalid_values_fall_back_to_default(options_ini):
+    options_ini.write_text("[KolibriApp]\nWARMUP_DEADLINE = soon\n")
+    assert options.get_app_option("WARMUP_DEADLINE") == 3.0
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    [
+        ("true", True),
+        ("On", True),
+        ("1", True),
+        ("no", False),
+        ("FALSE", False),
+        ("0", False),
+        # Misspelt values do not turn the option off
+        ("ture", True),
+        ("enabled", True),
+        ("", True),
+    ],
+)
+def test_boolean_values(options_ini, monkeypatch, value, expected):
+    monkeypatch.setenv("KOLIBRI_APP_WARMUP_ENABLED", value)
+    assert options.get_app_option("WARMUP_ENABLED") is expected
+
+
+def test_unreadable_options_ini(options_ini):
+    options_ini.write_text("WARMUP_DEADLINE = 5\n")
+    assert options.read_options_ini(options.SECTION) == {}
+
+
+def test_reading_does_not_load_the_registry(run_kolibri_code, kolibri_home):
+    (kolibri_home / "options.ini").write_text("[KolibriApp]\nWARMUP_DEADLINE = 5\n")
+    result = run_kolibri_code(INITIALIZE_AFTER_OPTION)
+    assert result.returncode == 0, result.stderr
+    # Kolibri logs to stdout as well
+    deadlines = [
+        line.split()[1]
+        for line in result.stdout.splitlines()
+        if line.startswith("WARMUP_DEADLINE ")
+    ]
+    assert deadlines == ["5.0", "5.0"]
+
+
+def test_unknown_choice_falls_back_to_default(options_ini, monkeypatch):
+    monkeypatch.delenv("KOLIBRI_APP_SERVER_MODE", raising=False)
+    options_ini.write_text("[KolibriApp]\nSERVER_MODE = fork\n")
+    assert options.get_app_option("SERVER_MODE") == "thread"
+    options_ini.write_text("[KolibriApp]\nSERVER_MODE = subprocess\n")
+    assert options.get_app_option("SERVER_MODE") == "subprocess"
@@ -0,0 +1,60 @@
+from kolibri_app.preload import PRELOAD_HANDLER
+from kolibri_app.preload import PRELOAD_READY
+from kolibri_app.preload import PRELOAD_READY_SCRIPT
+from kolibri_app.preload import PreloadSwap
+
+
+def test_ready_script_posts_to_the_handler():
+    assert (
+        'window.{}.postMessage("{}")'.format(PRELOAD_HANDLER, PRELOAD_READY)
+        in PRELOAD_READY_SCRIPT
+    )
+
+
+def test_swap_once_loaded_and_ready():
+    swap = PreloadSwap(can_signal=True)
+    assert not swap.page_loaded()
+    assert swap.message_received(PRELOAD_READY)
+    # Only once
+    assert not swap.message_received(PRELOAD_READY)
+    assert not swap.timed_out()
+
+
+def test_ready_before_the_load_event():
+    swap = PreloadSwap(can_signal=True)
+    assert not swap.message_received(PRELOAD_READY)
+    assert swap.page_loaded()
+
+
+def test_other_messages_are_ignored():
+    swap = PreloadSwap(can_signal=True)
+    swap.page_loaded()
+    assert not swap.message_received("something else")
+    assert not swap.swapped
+
+
+def test_swap_on_load_without_script_messages():
+    swap = PreloadSwap(can_signal=False)
+    assert swap.page_loaded()
+
+
+def test_timeout_swaps_anyway():
+    swap = PreloadSwap(can_signal=True)
+    swap.page_loaded()
+    assert swap.timed_out()
+    assert not swap.message_received(PRELOAD_READY)
+
+
+def test_timeout_before_the_page_loaded():
+    swap = PreloadSwap(can_signal=True)
+    assert swap.timed_out()
+    assert not swap.loaded
+    assert not swap.page_loaded()
+
+
+def test_reloading_waits_for_the_new_page():
+    swap = PreloadSwap(can_signal=True)
+    swap.page_loaded()
+    swap.reloading()
+    assert not swap.message_received(PRELOAD_READY)
+    assert swap.page_loaded()
@@ -0,0 +1,79 @@
+import itertools
+
+import pytest
+
+from kolibri_app import rendezvous
+from kolibri_app.rendezvous import StartupRendezvous
+from kolibri_app.tracer import StartupTracer
+
+pytestmark = pytest.mark.usefixtures("wx")
+
+
+@pytest.fixture
+def tracer(monkeypatch):
+    """A tracer whose clock advances by one second on every reading."""
+    tracer = StartupTracer()
+    tracer._events.clear()
+    clock = itertools.count(step=10**6)
+    monkeypatch.setattr(tracer, "now", lambda: next(clock))
+    monkeypatch.setattr(rendezvous, "tracer", tracer)
+    return tracer
+
+
+@pytest.fixture
+def calls():
+    return []
+
+
+@pytest.fixture
+def meeting(calls, tracer):
+    return StartupRendezvous(lambda *args, **kwargs: calls.append((args, kwargs)))
+
+
+def test_ui_ready_first(meeting, calls):
+    meeting.ui_started()
+    meeting.server_started()
+    meeting.ui_ready()
+    assert calls == []
+    meeting.server_ready(8080, root_url="/")
+    assert calls == [((8080,), {"root_url": "/"})]
+
+
+def test_server_ready_first(meeting, calls):
+    meeting.server_started()
+    meeting.ui_started()
+    meeting.server_ready(8080)
+    assert calls == []
+    meeting.ui_ready()
+    assert calls == [((8080,), {})]
+
+
+def test_server_ready_after_meeting_goes_straight_through(meeting, calls):
+    meeting.ui_ready()
+    meeting.server_ready(8080)
+    # e.g. once the server has been restarted on another port
+    meeting.server_ready(8081)
+    assert calls == [((8080,), {}), ((8081,), {})]
+
+
+def test_overlap_is_traced(meeting, tracer):
+    meeting.ui_started()  # 0 s
+    meeting.server_started()  # 1 s
+    meeting.ui_ready()  # 2 s
+    meeting.server_ready(8080)  # 3 s
+    spans = {
+        event["name"]: (event["ts"], event["dur"])
+        for event in tracer._events
+        if event["ph"] == "X"
+    }
+    assert spans == {
+        "UI construction": (0, 2 * 10**6),
+        "server bootstrap": (10**6, 2 * 10**6),
+        "startup overlap": (10**6, 10**6),
+    }
+
+
+def test_no_overlap_without_start_times(meeting, tracer):
+    meeting.ui_ready()
+    meeting.server_ready(8080)
+    assert tracer._events == []
@@ -0,0 +1,111 @@
+import gettext
+import json
+import struct
+
+import pytest
+
+from kolibri_app import resource_cache
+from kolibri_app.resource_cache import CACHE_FILE
+from kolibri_app.resource_cache import ResourceCache
+
+# A catalog without messages
+EMPTY_MO = struct.pack("<7I", 0x950412DE, 0, 0, 28, 28, 0, 28)
+
+
+@pytest.fixture
+def package_root(tmp_path):
+    root = tmp_path / "kolibri_app"
+    for lang in ("en", "fr", "pt-br"):
+        page = root / "assets" / lang / "loading.html"
+        page.parent.mkdir(parents=True)
+        page.write_text("loading " + lang)
+    catalog = root / "locales" / "fr" / "LC_MESSAGES" / "wxapp.mo"
+    catalog.parent.mkdir(parents=True)
+    catalog.write_bytes(EMPTY_MO)
+    return root
+
+
+@pytest.fixture
+def make_cache(package_root, kolibri_home, monkeypatch):
+    monkeypatch.setattr(resource_cache, "KOLIBRI_HOME", str(kolibri_home))
+
+    def make(languages):
+        cache = ResourceCache(languages)
+        cache.root = package_root
+        return cache
+
+    return make
+
+
+def read_cache_file(kolibri_home):
+    with open(str(kolibri_home / CACHE_FILE)) as f:
+        return json.load(f)
+
+
+def test_resolves_and_persists(make_cache, kolibri_home):
+    cache = make_cache(["fr_FR"])
+    assert isinstance(cache.translations(), gettext.GNUTranslations)
+    assert cache.loader_html("fr-fr") == "loading fr"
+    assert read_cache_file(kolibri_home)["entries"] == {
+        "catalog": "locales/fr/LC_MESSAGES/wxapp.mo",
+        "loader_page": "assets/fr/loading.html",
+    }
+
+
+def test_later_launch_uses_the_cache(make_cache, monkeypatch):
+    cache = make_cache(["fr_FR"])
+    cache.translations()
+    cache.loader_html("fr-fr")
+
+    def resolve(*args):
+        raise AssertionError("resolved again")
+
+    monkeypatch.setattr(ResourceCache, "_resolve_catalog", resolve)
+    monkeypatch.setattr(ResourceCache, "_resolve_loader_page", resolve)
+    cache = make_cache(["fr_FR"])
+    assert isinstance(cache.translations(), gettext.GNUTranslations)
+    assert cache.loader_html("fr-fr") == "loading fr"
+
+
+def test_loader_page_fallbacks(make_cache):
+    assert make_cache(["pt_BR"]).loader_html("pt-br") == "loading pt-br"
+    assert make_cache(["fr_CA"]).loader_html("fr-ca") == "loading fr"
+    assert make_cache(["de_DE"]).loader_html("de-de") == "loading en"
+
+
+def test_no_catalog(make_cache):
+    assert isinstance(make_cache(["de_DE"]).translations(), gettext.NullTranslations)
+
+
+def test_locale_change_invalidates(make_cache, kolibri_home):
+    make_cache(["fr_FR"]).loader_html("fr-fr")
+    assert make_cache(["pt_BR"]).loader_html("pt-br") == "loading pt-br"
+    assert read_cache_file(kolibri_home)["key"]["languages"] == ["pt_BR"]
+
+
+def test_version_change_invalidates(make_cache, kolibri_home, monkeypatch):
+    make_cache(["fr_FR"]).loader_html("fr-fr")
+    cache_file = kolibri_home / CACHE_FILE
+    cached = read_cache_file(kolibri_home)
+    cached["entries"]["loader_page"] = "assets/en/loading.html"
+    cache_file.write_text(json.dumps(cached))
+    monkeypatch.setattr("kolibri_app.__version__", "0.0.0")
+    assert make_cache(["fr_FR"]).loader_html("fr-fr") == "loading fr"
+
+
+def test_missing_cached_file_is_resolved_again(make_cache, package_root):
+    make_cache(["fr_FR"]).loader_html("fr-fr")
+    (package_root / "assets" / "fr" / "loading.html").unlink()
+    assert make_cache(["fr_FR"]).loader_html("fr-fr") == "loading en"
+
+
+def test_corrupt_cache_file(make_cache, kolibri_home):
+    (kolibri_home / CACHE_FILE).write_text("{")
+    assert make_cache(["fr_FR"]).loader_html("fr-fr") == "loading fr"
+
+
+def test_loader_page_is_read_once(make_cache, package_root):
+    cache = make_cache(["fr_FR"])
+    assert cache.loader_html("fr-fr") == "loading fr"
+    (package_root / "assets" / "fr" / "loading.html").write_text("changed")
+    assert cache.loader_html("fr-fr") == "loading fr"
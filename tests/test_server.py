@@ -0,0 +1,59 @@
+import socket
+
+import pytest
+
+from kolibri_app import server
+from kolibri_app.server import PORT_FILE
+
+
+@pytest.fixture
+def deployment(kolibri_home, monkeypatch):
+    monkeypatch.setattr(server, "KOLIBRI_HOME", str(kolibri_home))
+    options = {"Deployment": {"HTTP_PORT": 0, "LISTEN_ADDRESS": "127.0.0.1"}}
+    monkeypatch.setattr(server, "OPTIONS", options)
+    return options["Deployment"]
+
+
+@pytest.fixture
+def listening_socket():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.listen()
+    yield sock
+    sock.close()
+
+
+def free_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def test_first_launch_uses_an_ephemeral_port(deployment):
+    assert server.get_http_port() == 0
+
+
+def test_last_port_is_reused(deployment):
+    port = free_port()
+    server.remember_port(port)
+    assert server.get_last_port() == port
+    assert server.get_http_port() == port
+
+
+def test_last_port_in_use_falls_back_to_an_ephemeral_port(deployment, listening_socket):
+    server.remember_port(listening_socket.getsockname()[1])
+    assert server.get_http_port() == 0
+
+
+def test_configured_port_wins(deployment):
+    deployment["HTTP_PORT"] = 8080
+    server.remember_port(free_port())
+    assert server.get_http_port() == 8080
+
+
+def test_unreadable_port_file(deployment, kolibri_home):
+    (kolibri_home / PORT_FILE).write_text('{"port": "next"}')
+    assert server.get_last_port() is None
+    assert server.get_http_port() == 0
@@ -0,0 +1,388 @@
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+import pytest
+
+from kolibri_app import server_process_posix
+from kolibri_app.log_forwarding import ForwardingLogHandler
+from kolibri_app.server_process_posix import get_server_socket_path
+from kolibri_app.server_process_posix import get_versions
+from kolibri_app.server_process_posix import make_private_dir
+from kolibri_app.server_process_posix import MessageReader
+from kolibri_app.server_process_posix import send_message
+from kolibri_app.server_process_posix import ServerProcess
+from kolibri_app.server_process_posix import UnixSocketIpcPlugin
+from kolibri_app.server_process_posix import versions_match
+from kolibri_app.startup_progress import FINISHED
+from kolibri_app.startup_progress import INITIALIZE
+from kolibri_app.startup_progress import progress
+from kolibri_app.startup_progress import STARTED
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(socket, "AF_UNIX"), reason="The POSIX server needs Unix sockets"
+)
+
+
+@pytest.fixture
+def socket_pair():
+    left, right = socket.socketpair()
+    left.settimeout(5)
+    right.settimeout(5)
+    yield left, right
+    left.close()
+    right.close()
+
+
+def test_reader_splits_messages(socket_pair):
+    left, right = socket_pair
+    left.sendall(b'{"type": "poll"}\n{"type": "shutdown"}\n')
+    reader = MessageReader(right)
+    assert reader.read() == {"type": "poll"}
+    assert reader.read() == {"type": "shutdown"}
+
+
+def test_reader_joins_partial_messages(socket_pair):
+    left, right = socket_pair
+    reader = MessageReader(right)
+    data = '{"type": "updates", "logs": ["é"]}\n'.encode("utf-8")
+
+    def send_in_pieces():
+        for i in range(len(data)):
+            left.sendall(data[i : i + 1])
+
+    sender = threading.Thread(target=send_in_pieces)
+    sender.start()
+    assert reader.read() == {"type": "updates", "logs": ["é"]}
+    sender.join()
+
+
+def test_reader_returns_none_once_closed(socket_pair):
+    left, right = socket_pair
+    send_message(left, {"type": "poll"})
+    left.close()
+    reader = MessageReader(right)
+    assert reader.read() == {"type": "poll"}
+    assert reader.read() is None
+
+
+def test_socket_path_in_kolibri_home(monkeypatch):
+    monkeypatch.setattr(server_process_posix, "KOLIBRI_HOME", "/home/learner/.kolibri")
+    assert get_server_socket_path() == "/home/learner/.kolibri/kolibri-app-server.sock"
+
+
+def test_socket_path_fallback_for_long_paths(monkeypatch):
+    home = "/home/learner/" + "a" * 120
+    monkeypatch.setattr(server_process_posix, "KOLIBRI_HOME", home)
+    path = get_server_socket_path()
+    assert os.path.dirname(path) == os.path.join(
+        tempfile.gettempdir(), "kolibri-app-{}".format(os.getuid())
+    )
+    assert len(path.encode("utf-8")) <= server_process_posix.MAX_SOCKET_PATH
+    # The same for every process of that KOLIBRI_HOME, different for another
+    assert get_server_socket_path() == path
+    monkeypatch.setattr(server_process_posix, "KOLIBRI_HOME", home + "b")
+    assert get_server_socket_path() != path
+
+
+def test_private_dir(tmp_path):
+    path = str(tmp_path / "kolibri-app")
+    make_private_dir(path)
+    assert os.stat(path).st_mode & 0o777 == 0o700
+    # Existing and still private
+    make_private_dir(path)
+
+
+def test_private_dir_rejects_shared_dirs(tmp_path):
+    path = tmp_path / "kolibri-app"
+    path.mkdir()
+    path.chmod(0o777)
+    with pytest.raises(RuntimeError):
+        make_private_dir(str(path))
+
+
+def test_versions_match():
+    assert versions_match(dict(get_versions(), type="server_ready"))
+    assert not versions_match(dict(get_versions(), app_version="0.0.1"))
+    # Servers from before the versions were sent
+    assert not versions_match({"type": "server_ready", "port": 8080})
+
+
+class Bus(object):
+    def __init__(self):
+        self.transitioned = threading.Event()
+        self.state = None
+
+    def subscribe(self, channel, callback, priority=None):
+        pass
+
+    def transition(self, state):
+        self.state = state
+        self.transitioned.set()
+
+
+@pytest.fixture
+def socket_dir():
+    # Short enough for sun_path, unlike pytest's tmp_path
+    directory = tempfile.mkdtemp(prefix="kas")
+    yield directory
+    for name in os.listdir(directory):
+        os.unlink(os.path.join(directory, name))
+    os.rmdir(directory)
+
+
+@pytest.fixture
+def bus():
+    return Bus()
+
+
+@pytest.fixture
+def make_plugin(socket_dir, bus, monkeypatch):
+    monkeypatch.setattr(server_process_posix, "ACCEPT_TIMEOUT", 0.05)
+    plugins = []
+
+    def make():
+        plugin = UnixSocketIpcPlugin(bus)
+        plugin.socket_path = os.path.join(socket_dir, "server.sock")
+        plugins.append(plugin)
+        return plugin
+
+    yield make
+    for plugin in plugins:
+        plugin.STOP()
+
+
+@pytest.fixture
+def plugin(make_plugin):
+    plugin = make_plugin()
+    plugin.START()
+    return plugin
+
+
+@pytest.fixture
+def client(plugin):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(5)
+    sock.connect(plugin.socket_path)
+    reader = MessageReader(sock)
+
+    def request(message):
+        send_message(sock, message)
+        return reader.read()
+
+    yield request
+    sock.close()
+
+
+def mark_ready(plugin):
+    plugin.ready_port = 8080
+    plugin.ready_root_url = "http://localhost:8080/app/api/initialize/token"
+    plugin.server_ready_event.set()
+
+
+SERVER_READY = dict(
+    get_versions(),
+    type="server_ready",
+    port=8080,
+    root_url="http://localhost:8080/app/api/initialize/token",
+)
+
+
+def test_server_info_once_ready(plugin, client):
+    mark_ready(plugin)
+    assert client({"type": "request_server_info"}) == SERVER_READY
+
+
+def test_server_info_while_starting(plugin, client):
+    assert client({"type": "request_server_info"}) == dict(
+        get_versions(), type="server_starting"
+    )
+
+
+def test_poll_sends_logs_and_readiness(plugin, client, monkeypatch):
+    forwarder = ForwardingLogHandler(logging.NullHandler())
+    monkeypatch.setattr(server_process_posix, "get_log_forwarder", lambda: forwarder)
+    forwarder.handle(logging.makeLogRecord({"msg": "migrating", "levelno": 20}))
+    progress.drain()
+    progress.report(INITIALIZE, STARTED)
+    reply = client({"type": "poll"})
+    assert reply["type"] == "updates"
+    assert reply["server_ready"] is False
+    assert [entry["msg"] for entry in reply["logs"]] == ["migrating"]
+    assert [(event["phase"], event["status"]) for event in reply["progress"]] == [
+        (INITIALIZE, STARTED)
+    ]
+
+    progress.report(INITIALIZE, FINISHED)
+    mark_ready(plugin)
+    reply = client({"type": "poll"})
+    assert reply["server_ready"] is True
+    assert reply["logs"] == []
+    # Events are only sent once
+    assert [(event["phase"], event["status"]) for event in reply["progress"]] == [
+        (INITIALIZE, FINISHED)
+    ]
+    assert reply["progress"][0]["duration"] >= 0
+    assert client({"type": "poll"})["progress"] == []
+    assert client({"type": "request_server_info"}) == SERVER_READY
+
+
+def test_shutdown_while_initializing(plugin, client, bus):
+    plugin.bus = None
+    assert client({"type": "shutdown"}) is None
+    assert plugin.shutdown_requested
+    assert bus.state is None
+
+
+def test_shutdown(plugin, client, bus):
+    # No reply, the server hangs up
+    assert client({"type": "shutdown"}) is None
+    assert bus.transitioned.wait(5)
+    assert bus.state == "EXITED"
+
+
+def test_attach_reads_the_idle_timeout(plugin, monkeypatch):
+    # Bundled with Kolibri, importable once Kolibri set up its environment
+    from magicbus.process import ProcessBus
+
+    assert plugin.idle_timeout is None
+    monkeypatch.setenv("KOLIBRI_APP_SERVER_IDLE_TIMEOUT", "60")
+    bus = ProcessBus()
+    plugin.attach(bus)
+    assert plugin.idle_timeout == 60
+    assert plugin.on_server_start in bus.listeners["SERVING"]
+    assert plugin.STOP in bus.listeners["STOP"]
+
+
+def test_idle_timeout(plugin, bus):
+    plugin.idle_timeout = 0.1
+    plugin.accept_thread.join(5)
+    assert not plugin.accept_thread.is_alive()
+    assert bus.transitioned.wait(5)
+    assert bus.state == "EXITED"
+
+
+def test_no_idle_timeout_while_connected(plugin, client):
+    plugin.idle_timeout = 0.1
+    plugin.accept_thread.join(0.5)
+    assert plugin.accept_thread.is_alive()
+    mark_ready(plugin)
+    assert client({"type": "request_server_info"}) == SERVER_READY
+
+
+def test_stop_removes_the_socket(plugin):
+    plugin.STOP()
+    assert not os.path.exists(plugin.socket_path)
+
+
+def test_stale_socket_is_replaced(make_plugin):
+    plugin = make_plugin()
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(plugin.socket_path)
+    stale.close()
+    plugin.START()
+    mark_ready(plugin)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(5)
+        sock.connect(plugin.socket_path)
+        send_message(sock, {"type": "request_server_info"})
+        assert MessageReader(sock).read() == SERVER_READY
+
+
+def test_running_server_keeps_its_socket(plugin, client, make_plugin):
+    second = make_plugin()
+    with pytest.raises(RuntimeError):
+        second.START()
+    second.STOP()
+    assert os.path.exists(plugin.socket_path)
+    mark_ready(plugin)
+    assert client({"type": "request_server_info"}) == SERVER_READY
+
+
+def test_socket_removed_after_an_error(monkeypatch):
+    directory = tempfile.mkdtemp(prefix="kas")
+    socket_path = os.path.join(directory, "server.sock")
+    monkeypatch.setattr(
+        server_process_posix, "get_server_socket_path", lambda: socket_path
+    )
+
+    def initialize_kolibri(self):
+        assert os.path.exists(socket_path)
+        raise RuntimeError("Attempted to update plugins when registry is initialized")
+
+    monkeypatch.setattr(ServerProcess, "_initialize_kolibri", initialize_kolibri)
+    with pytest.raises(SystemExit):
+        ServerProcess().run()
+    assert not os.path.exists(socket_path)
+    os.rmdir(directory)
+
+
+def connect(path, timeout):
+    deadline = time.monotonic() + timeout
+    while True:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(path)
+            return sock
+        except OSError:
+            sock.close()
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def test_server_process_on_a_new_kolibri_home():
+    home = tempfile.mkdtemp(prefix="kah")
+    env = dict(
+        os.environ,
+        KOLIBRI_HOME=home,
+        DJANGO_SETTINGS_MODULE="kolibri_app.django_app_settings",
+        PYTHONPATH=os.pathsep.join(sys.path),
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-m", "kolibri_app", "--run-as-server"],
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    socket_path = os.path.join(home, server_process_posix.SOCKET_NAME)
+    try:
+        sock = connect(socket_path, timeout=60)
+        sock.settimeout(600)
+        reader = MessageReader(sock)
+        send_message(sock, {"type": "request_server_info"})
+        assert reader.read()["type"] == "server_starting"
+        while True:
+            send_message(sock, {"type": "poll"})
+            if reader.read()["server_ready"]:
+                break
+            time.sleep(0.25)
+        send_message(sock, {"type": "request_server_info"})
+        reply = reader.read()
+        assert reply["type"] == "server_ready"
+        assert versions_match(reply)
+        with urllib.request.urlopen(
+            "http://localhost:{}/api/public/info/".format(reply["port"]), timeout=60
+        ) as response:
+            assert response.status == 200
+        send_message(sock, {"type": "shutdown"})
+        # The plugin removes the socket once the bus stopped. The process may
+        # still wait for Kolibri's jobs, e.g. its pingback without a network.
+        deadline = time.monotonic() + 60
+        while os.path.exists(socket_path) and process.poll() is None:
+            assert time.monotonic() < deadline
+            time.sleep(0.1)
+        assert process.poll() in (None, 0)
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        shutil.rmtree(home, ignore_errors=True)
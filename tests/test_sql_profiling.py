@@ -0,0 +1,137 @@
+import json
+import logging
+
+import pytest
+
+from kolibri_app import sql_profiling
+from kolibri_app.sql_profiling import query_shape
+from kolibri_app.sql_profiling import QueryRecorder
+from kolibri_app.sql_profiling import SqlProfile
+
+CHILDREN = 'SELECT "id" FROM "contentnode" WHERE "parent_id" = ?'
+
+
+@pytest.mark.parametrize(
+    "sql,shape",
+    [
+        (
+            "SELECT * FROM node WHERE id = 42 AND title = 'It''s 7'",
+            "SELECT * FROM node WHERE id = ? AND title = ?",
+        ),
+        (
+            'SELECT "t1"."id" FROM "table2" "t1" WHERE "t1"."id" IN (%s, %s, %s)',
+            'SELECT "t1"."id" FROM "table2" "t1" WHERE "t1"."id" IN (...)',
+        ),
+        ("SELECT x FROM y WHERE z in (?,?)", "SELECT x FROM y WHERE z IN (...)"),
+        ("SELECT 1.5,\n\t  2", "SELECT ?, ?"),
+    ],
+)
+def test_query_shape(sql, shape):
+    assert query_shape(sql) == shape
+
+
+def test_shapes_group_queries_for_different_rows():
+    assert query_shape("SELECT * FROM t WHERE id IN (1, 2)") == query_shape(
+        "SELECT * FROM t WHERE id IN (3, 4, 5, 6)"
+    )
+
+
+def run_queries(*queries):
+    """A recorder of one request that ran queries."""
+    recorder = QueryRecorder()
+
+    def execute(sql, params, many, context):
+        return None
+
+    for sql in queries:
+        recorder(execute, sql, (), False, {})
+    return recorder
+
+
+@pytest.fixture
+def warnings(monkeypatch):
+    handler = logging.Handler()
+    handler.messages = []
+    handler.emit = lambda record: handler.messages.append(record.getMessage())
+    monkeypatch.setattr(sql_profiling.logger, "handlers", [handler])
+    monkeypatch.setattr(sql_profiling.logger, "propagate", False)
+    return handler.messages
+
+
+@pytest.fixture
+def profile(tmp_path):
+    return SqlProfile(str(tmp_path / "sql_profiles" / "profile.json"))
+
+
+def children_queries(count):
+    return [CHILDREN.replace("?", str(parent)) for parent in range(count)]
+
+
+def test_recorder_groups_by_shape():
+    recorder = run_queries("SELECT 1", *children_queries(3))
+    assert recorder.count == 4
+    assert {shape: count for shape, (count, _) in recorder.shapes.items()} == {
+        "SELECT ?": 1,
+        CHILDREN: 3,
+    }
+
+
+def test_n_plus_one_is_flagged_once(profile, warnings):
+    n = sql_profiling.N_PLUS_ONE_MIN
+    profile.record("api/content/", run_queries("SELECT 1", *children_queries(n - 1)))
+    assert warnings == []
+    profile.record("api/content/", run_queries(*children_queries(n)))
+    profile.record("api/content/", run_queries(*children_queries(n + 2)))
+    assert warnings == [
+        "Possible N+1 queries in api/content/: {} runs in one request of: {}".format(
+            n, CHILDREN
+        )
+    ]
+
+    stats = profile.routes["api/content/"]
+    assert stats["requests"] == 3
+    assert stats["n_plus_one_requests"] == 2
+    assert stats["max_queries"] == n + 2
+    assert stats["shapes"][CHILDREN]["max_per_request"] == n + 2
+    assert not stats["shapes"]["SELECT ?"]["n_plus_one"]
+
+
+def test_n_plus_one_is_flagged_per_route(profile, warnings):
+    queries = children_queries(sql_profiling.N_PLUS_ONE_MIN)
+    profile.record("api/content/", run_queries(*queries))
+    profile.record("api/lessons/", run_queries(*queries))
+    assert len(warnings) == 2
+
+
+def test_overflow_shapes_are_not_flagged(profile, warnings, monkeypatch):
+    monkeypatch.setattr(sql_profiling, "MAX_SHAPES_PER_ROUTE", 1)
+    profile.record("api/content/", run_queries("SELECT 1"))
+    profile.record("api/content/", run_queries(*children_queries(10)))
+    assert sorted(profile.routes["api/content/"]["shapes"]) == ["SELECT ?", "other"]
+    assert warnings == []
+
+
+def test_report(profile, warnings):
+    profile.record("api/content/", run_queries(*children_queries(6)))
+    profile.record("api/user/", run_queries("SELECT 1"))
+    profile.write()
+    with open(profile.path, encoding="utf-8") as f:
+        report = json.load(f)
+    routes = {stats["route"]: stats for stats in report["routes"]}
+    assert routes["api/content/"]["queries_per_request"] == 6
+    assert [shape["sql"] for shape in routes["api/content/"]["n_plus_one"]] == [
+        CHILDREN
+    ]
+    assert routes["api/user/"]["n_plus_one"] == []
+    assert [shape["sql"] for shape in routes["api/user/"]["top_shapes"]] == ["SELECT ?"]
+
+
+def test_old_reports_are_pruned(tmp_path, monkeypatch):
+    monkeypatch.setattr(sql_profiling, "MAX_REPORT_FILES", 2)
+    for day in range(1, 5):
+        (tmp_path / "sql_profile_2026010{}_000000_1.json".format(day)).write_text("{}")
+    sql_profiling._prune_reports(str(tmp_path))
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "sql_profile_20260103_000000_1.json",
+        "sql_profile_20260104_000000_1.json",
+    ]
@@ -0,0 +1,95 @@
+import sqlite3
+
+import pytest
+from django.db.backends.signals import connection_created
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+from kolibri_app import sqlite_tuning
+
+
+class DjangoConnection(object):
+    """What connection_created sends: Django's wrapper of a DB-API connection."""
+
+    def __init__(self, path, vendor="sqlite"):
+        self.vendor = vendor
+        self.connection = sqlite3.connect(path)
+
+
+def pragma(connection, name):
+    return connection.execute("PRAGMA {}".format(name)).fetchone()[0]
+
+
+@pytest.fixture
+def installed():
+    sqlite_tuning.install()
+    yield
+    connection_created.disconnect(sqlite_tuning.on_connection_created)
+    event.remove(Pool, "connect", sqlite_tuning.on_sqlalchemy_connect)
+
+
+@pytest.fixture
+def database(tmp_path):
+    return str(tmp_path / "db.sqlite3")
+
+
+def test_pragmas_on_connection_created(installed, database):
+    wrapper = DjangoConnection(database)
+    connection_created.send(sender=None, connection=wrapper)
+    connection = wrapper.connection
+    assert pragma(connection, "journal_mode") == "wal"
+    # NORMAL
+    assert pragma(connection, "synchronous") == 1
+    assert pragma(connection, "cache_size") == -16 * 1024
+    # MEMORY
+    assert pragma(connection, "temp_store") == 2
+    assert pragma(connection, "busy_timeout") == 30000
+
+
+def test_pragmas_follow_the_options(installed, database, monkeypatch):
+    monkeypatch.setenv("KOLIBRI_APP_SQLITE_SYNCHRONOUS", "FULL")
+    monkeypatch.setenv("KOLIBRI_APP_SQLITE_CACHE_SIZE", "0")
+    wrapper = DjangoConnection(database)
+    connection_created.send(sender=None, connection=wrapper)
+    assert pragma(wrapper.connection, "synchronous") == 2
+    # SQLite's default
+    assert pragma(wrapper.connection, "cache_size") == -2000
+
+
+def test_other_vendors_are_left_alone(installed):
+    wrapper = DjangoConnection(":memory:", vendor="postgresql")
+    connection_created.send(sender=None, connection=wrapper)
+    assert pragma(wrapper.connection, "temp_store") == 0
+
+
+def test_disabled(database, monkeypatch):
+    monkeypatch.setenv("KOLIBRI_APP_SQLITE_TUNING_ENABLED", "0")
+    sqlite_tuning.install()
+    wrapper = DjangoConnection(database)
+    connection_created.send(sender=None, connection=wrapper)
+    assert pragma(wrapper.connection, "journal_mode") == "delete"
+
+
+def test_busy_timeout_is_never_lowered(database, monkeypatch):
+    monkeypatch.setenv("KOLIBRI_APP_SQLITE_BUSY_TIMEOUT", "1000")
+    connection = sqlite3.connect(database, timeout=5)
+    sqlite_tuning.tune(connection, sqlite_tuning.PROFILE_DEFAULT)
+    assert pragma(connection, "busy_timeout") == 5000
+
+
+def test_content_profile_keeps_the_journal_mode(tmp_path):
+    path = str(tmp_path / ("0" * 32 + ".sqlite3"))
+    connection = sqlite3.connect(path)
+    sqlite_tuning.on_sqlalchemy_connect(connection, None)
+    assert pragma(connection, "journal_mode") == "delete"
+    assert pragma(connection, "cache_size") == -8 * 1024
+    assert pragma(connection, "temp_store") == 2
+
+
+def test_untunable_connection_is_left_alone():
+    class LockedConnection(object):
+        def execute(self, sql):
+            raise sqlite3.OperationalError("database is locked")
+
+    # Logged, not raised: the connection works as well untuned
+    sqlite_tuning.tune(LockedConnection(), sqlite_tuning.PROFILE_DEFAULT)
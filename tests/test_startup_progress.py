@@ -0,0 +1,150 @@
+from types import SimpleNamespace
+
+import pytest
+from django.db.migrations.executor import MigrationExecutor
+
+from kolibri_app import startup_progress
+from kolibri_app.startup_progress import FINISHED
+from kolibri_app.startup_progress import INITIALIZE
+from kolibri_app.startup_progress import MIGRATIONS
+from kolibri_app.startup_progress import PROGRESS
+from kolibri_app.startup_progress import SERVER
+from kolibri_app.startup_progress import STARTED
+from kolibri_app.startup_progress import StartupProgress
+
+
+def statuses(events):
+    return [(event["phase"], event["status"]) for event in events]
+
+
+def test_events_are_buffered_until_drained():
+    progress = StartupProgress()
+    progress.report(INITIALIZE, STARTED)
+    progress.report(MIGRATIONS, PROGRESS, detail="default", done=0, total=3)
+    events = progress.drain()
+    assert statuses(events) == [(INITIALIZE, STARTED), (MIGRATIONS, PROGRESS)]
+    assert events[1]["detail"] == "default"
+    assert (events[1]["done"], events[1]["total"]) == (0, 3)
+    assert progress.drain() == []
+
+
+def test_phase_reports_its_duration():
+    progress = StartupProgress()
+    with progress.phase(INITIALIZE):
+        pass
+    started, finished = progress.drain()
+    assert "duration" not in started
+    assert finished["status"] == FINISHED
+    assert finished["duration"] >= 0
+    assert finished["time"] >= started["time"]
+
+
+def test_phase_finishes_on_errors():
+    progress = StartupProgress()
+    with pytest.raises(RuntimeError):
+        with progress.phase(INITIALIZE):
+            raise RuntimeError()
+    assert statuses(progress.drain()) == [(INITIALIZE, STARTED), (INITIALIZE, FINISHED)]
+
+
+def test_listener_gets_the_events():
+    progress = StartupProgress()
+    received = []
+    progress.listener = received.append
+    progress.report(SERVER, STARTED)
+    assert statuses(received) == [(SERVER, STARTED)]
+    assert progress.drain() == []
+
+
+def test_oldest_events_are_dropped(monkeypatch):
+    monkeypatch.setattr(startup_progress, "MAX_BUFFERED_EVENTS", 2)
+    progress = StartupProgress()
+    for channel in ("ENTER", "IDLE", "START"):
+        progress.report(SERVER, PROGRESS, detail=channel)
+    assert [event["detail"] for event in progress.drain()] == ["IDLE", "START"]
+
+
+class Bus(object):
+    def __init__(self):
+        self.listeners = {}
+
+    def subscribe(self, channel, callback):
+        self.listeners.setdefault(channel, []).append(callback)
+
+    def publish(self, channel, *args):
+        for callback in self.listeners.get(channel, []):
+            callback(*args)
+
+
+def test_report_bus():
+    startup_progress.progress.drain()
+    bus = Bus()
+    startup_progress.report_bus(bus)
+    bus.publish("START")
+    bus.publish("SERVING", 8080)
+    events = startup_progress.progress.drain()
+    assert statuses(events) == [
+        (SERVER, STARTED),
+        (SERVER, PROGRESS),
+        (SERVER, FINISHED),
+    ]
+    assert events[1]["detail"] == "START"
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    """A MigrationExecutor applying a fake plan, with the progress installed."""
+    plan = [
+        (SimpleNamespace(app_label="kolibriauth", name="0001_initial"), False),
+        (SimpleNamespace(app_label="content", name="0002_channel"), False),
+        (SimpleNamespace(app_label="content", name="0001_initial"), True),
+    ]
+    applied = []
+
+    def migrate(self, targets, plan=None, *args, **kwargs):
+        state = None
+        for migration, backwards in plan:
+            if not backwards:
+                state = self.apply_migration(state, migration)
+        return state
+
+    def apply_migration(self, state, migration, *args, **kwargs):
+        applied.append(migration.name)
+        return state
+
+    monkeypatch.setattr(MigrationExecutor, "migrate", migrate)
+    monkeypatch.setattr(MigrationExecutor, "apply_migration", apply_migration)
+    monkeypatch.setattr(MigrationExecutor, "migration_plan", lambda self, t: plan)
+    monkeypatch.setattr(MigrationExecutor, "_reports_progress", False, raising=False)
+    startup_progress.install()
+    # Installed once
+    startup_progress.install()
+
+    executor = MigrationExecutor.__new__(MigrationExecutor)
+    executor.connection = SimpleNamespace(alias="default")
+    executor.applied = applied
+    startup_progress.progress.drain()
+    return executor
+
+
+def test_migrations_are_counted(executor):
+    executor.migrate([("content", "0002_channel")])
+    assert executor.applied == ["0001_initial", "0002_channel"]
+    events = startup_progress.progress.drain()
+    assert statuses(events) == [
+        (MIGRATIONS, STARTED),
+        (MIGRATIONS, PROGRESS),
+        (MIGRATIONS, PROGRESS),
+        (MIGRATIONS, FINISHED),
+    ]
+    assert events[0]["total"] == 2
+    assert [(event["done"], event["detail"]) for event in events[1:3]] == [
+        (1, "kolibriauth.0001_initial"),
+        (2, "content.0002_channel"),
+    ]
+
+
+def test_nothing_to_migrate(executor, monkeypatch):
+    monkeypatch.setattr(MigrationExecutor, "migration_plan", lambda self, t: [])
+    executor.migrate([])
+    assert startup_progress.progress.drain() == []
@@ -0,0 +1,163 @@
+import json
+import os
+
+import pytest
+
+from kolibri_app import state
+from kolibri_app.state import StateStore
+
+WINDOW = {"url": "http://localhost:8080/learn", "geometry": [0, 0, 800, 600]}
+
+
+class Timers(object):
+    """Stands in for threading.Timer, keeping the timers instead of running them."""
+
+    def __init__(self):
+        self.started = []
+
+    def __call__(self, delay, callback):
+        timers = self
+
+        class Timer(object):
+            daemon = False
+            cancelled = False
+
+            def start(self):
+                timers.started.append(self)
+
+            def cancel(self):
+                self.cancelled = True
+
+            def fire(self):
+                callback()
+
+        timer = Timer()
+        timer.delay = delay
+        return timer
+
+    @property
+    def pending(self):
+        return [timer for timer in self.started if not timer.cancelled]
+
+
+@pytest.fixture
+def timers(monkeypatch):
+    timers = Timers()
+    monkeypatch.setattr(state.threading, "Timer", timers)
+    return timers
+
+
+@pytest.fixture
+def state_file(tmp_path):
+    return tmp_path / "app_state.json"
+
+
+@pytest.fixture
+def store(state_file, timers):
+    return StateStore(str(state_file))
+
+
+def read(state_file):
+    return json.loads(state_file.read_text(encoding="utf-8"))
+
+
+def test_changes_are_coalesced(store, state_file, timers):
+    store.set_windows([WINDOW])
+    store.set_windows([dict(WINDOW, zoom=1.5)])
+    store.set_windows([dict(WINDOW, zoom=2.0)])
+    assert len(timers.started) == 1
+    assert timers.started[0].delay == state.WRITE_DELAY
+    assert not state_file.exists()
+
+    timers.started[0].fire()
+    assert read(state_file)["windows"] == [dict(WINDOW, zoom=2.0)]
+
+
+def test_writes_are_spaced(store, timers):
+    store.set_windows([WINDOW])
+    timers.started[0].fire()
+    store.set_windows([dict(WINDOW, zoom=1.5)])
+    assert timers.started[1].delay > state.MIN_WRITE_INTERVAL - 1
+
+
+def test_unchanged_windows_are_not_written(store, timers):
+    store.set_windows([])
+    assert timers.started == []
+
+
+def test_flush_writes_pending_changes(store, state_file, timers):
+    store.set_windows([WINDOW])
+    store.flush()
+    assert read(state_file) == {"version": state.SCHEMA_VERSION, "windows": [WINDOW]}
+    assert timers.pending == []
+
+
+def test_write_replaces_the_file(store, state_file, monkeypatch):
+    store.set_windows([WINDOW])
+    store.flush()
+    replaced = []
+    real_replace = os.replace
+
+    def replace(source, target):
+        # The new state is complete before it takes the old one's place
+        assert json.loads(open(source, encoding="utf-8").read())["windows"] == []
+        assert read(state_file)["windows"] == [WINDOW]
+        replaced.append(target)
+        real_replace(source, target)
+
+    monkeypatch.setattr(state.os, "replace", replace)
+    store.set_windows([])
+    store.flush()
+    assert replaced == [str(state_file)]
+    assert read(state_file)["windows"] == []
+    assert os.listdir(str(state_file.parent)) == [state_file.name]
+
+
+def test_failed_write_is_retried_with_backoff(store, state_file, timers, monkeypatch):
+    disk_full = [True]
+    real_write = store._write
+
+    def write(data):
+        if disk_full[0]:
+            raise OSError("No space left on device")
+        real_write(data)
+
+    monkeypatch.setattr(store, "_write", write)
+    store.set_windows([WINDOW])
+    store.flush()
+    assert [timer.delay for timer in timers.pending] == [state.MIN_WRITE_INTERVAL]
+    timers.pending[0].fire()
+    assert [timer.delay for timer in timers.pending] == [2 * state.MIN_WRITE_INTERVAL]
+
+    store._retry_delay = state.MAX_RETRY_DELAY
+    timers.pending[0].fire()
+    assert [timer.delay for timer in timers.pending] == [state.MAX_RETRY_DELAY]
+
+    disk_full[0] = False
+    timers.pending[0].fire()
+    assert read(state_file)["windows"] == [WINDOW]
+    assert timers.pending == []
+    assert store._retry_delay == 0
+
+
+def test_version_1_state_is_migrated(state_file, timers):
+    state_file.write_text(json.dumps({"URL": "http://localhost:8080/learn"}))
+    store = StateStore(str(state_file))
+    assert store.get_windows() == [
+        {"url": "http://localhost:8080/learn", "focused": True}
+    ]
+
+
+def test_focused_window_comes_first(store):
+    store.set_windows(
+        [WINDOW, dict(WINDOW, url="http://localhost:8080/", focused=True)]
+    )
+    assert [window["url"] for window in store.get_windows()] == [
+        "http://localhost:8080/",
+        WINDOW["url"],
+    ]
+
+
+def test_unreadable_state_starts_afresh(state_file, timers):
+    state_file.write_text("{")
+    assert StateStore(str(state_file)).get_windows() == []
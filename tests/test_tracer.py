@@ -0,0 +1,147 @@
+import json
+import os
+import time
+
+import pytest
+
+from kolibri_app import tracer as tracer_module
+from kolibri_app.tracer import COLD
+from kolibri_app.tracer import LAST_RUN_FILE
+from kolibri_app.tracer import StartupTracer
+from kolibri_app.tracer import TRACE_DIR
+from kolibri_app.tracer import WARM
+
+
+@pytest.fixture
+def make_tracer(monkeypatch, kolibri_home):
+    for envvar in (
+        tracer_module.TRACE_ENV,
+        tracer_module.RUN_ID_ENV,
+        tracer_module.START_TYPE_ENV,
+    ):
+        monkeypatch.delenv(envvar, raising=False)
+    monkeypatch.setattr("kolibri.utils.conf.KOLIBRI_HOME", str(kolibri_home))
+    return StartupTracer
+
+
+@pytest.fixture
+def booted_seconds_ago(monkeypatch):
+    """Pretend the machine booted the given number of seconds ago."""
+
+    def boot(seconds):
+        monkeypatch.setattr(tracer_module.time, "monotonic", lambda: float(seconds))
+
+    return boot
+
+
+def write_last_run(kolibri_home, timestamp):
+    trace_dir = kolibri_home / TRACE_DIR
+    trace_dir.mkdir(exist_ok=True)
+    (trace_dir / LAST_RUN_FILE).write_text(str(timestamp))
+
+
+def test_first_run_is_cold(make_tracer, kolibri_home):
+    tracer = make_tracer()
+    assert tracer.get_start_type(str(kolibri_home)) == COLD
+    last_run = (kolibri_home / TRACE_DIR / LAST_RUN_FILE).read_text()
+    assert float(last_run) == tracer._origin_wall
+
+
+def test_run_since_boot_is_warm(make_tracer, kolibri_home, booted_seconds_ago):
+    booted_seconds_ago(3600)
+    write_last_run(kolibri_home, time.time() - 60)
+    assert make_tracer().get_start_type(str(kolibri_home)) == WARM
+
+
+def test_run_before_boot_is_cold(make_tracer, kolibri_home, booted_seconds_ago):
+    booted_seconds_ago(60)
+    write_last_run(kolibri_home, time.time() - 3600)
+    assert make_tracer().get_start_type(str(kolibri_home)) == COLD
+
+
+def test_unreadable_last_run_is_cold(make_tracer, kolibri_home):
+    write_last_run(kolibri_home, "yesterday")
+    assert make_tracer().get_start_type(str(kolibri_home)) == COLD
+
+
+def test_start_type_is_passed_to_subprocesses(make_tracer, kolibri_home):
+    write_last_run(kolibri_home, time.time())
+    assert make_tracer().get_start_type(str(kolibri_home)) == WARM
+    assert os.environ[tracer_module.START_TYPE_ENV] == WARM
+    # A server subprocess started now labels its run the same way
+    write_last_run(kolibri_home, 0)
+    assert make_tracer().get_start_type(str(kolibri_home)) == WARM
+
+
+def test_mark_is_recorded_once(make_tracer):
+    tracer = make_tracer()
+    assert tracer.since("first page") is None
+    assert tracer.mark("first page")
+    assert not tracer.mark("first page")
+    assert tracer.since("first page") >= 0
+    assert [e["name"] for e in tracer._events].count("first page") == 1
+
+
+def test_events_are_capped(make_tracer, monkeypatch):
+    monkeypatch.setattr(tracer_module, "MAX_EVENTS", 5)
+    tracer = make_tracer()
+    for i in range(10):
+        tracer.instant("event {}".format(i))
+    assert len(tracer._events) == 5
+
+
+def test_trace_bus(make_tracer):
+    class Bus(object):
+        listeners = {}
+
+        def subscribe(self, channel, listener, priority=None):
+            self.listeners[channel] = listener
+
+    bus = Bus()
+    tracer = make_tracer()
+    tracer.trace_bus(bus, channels=("START", "SERVING"))
+    bus.listeners["START"]()
+    bus.listeners["SERVING"]()
+    spans = [e["name"] for e in tracer._events if e["ph"] == "X"]
+    assert spans[-2:] == ["bus created -> START", "bus START -> SERVING"]
+
+
+def test_write_chrome_trace(make_tracer, kolibri_home):
+    tracer = make_tracer()
+    with tracer.span("initialize", fast=True):
+        pass
+    path = tracer.write()
+    assert os.path.dirname(path) == str(kolibri_home / TRACE_DIR)
+    with open(path) as f:
+        trace = json.load(f)
+    assert trace["otherData"]["start_type"] == COLD
+    assert trace["otherData"]["run_id"] == tracer.run_id
+    (span,) = [e for e in trace["traceEvents"] if e["name"] == "initialize"]
+    assert span["ph"] == "X" and span["args"] == {"fast": True}
+    assert any(e["ph"] == "M" for e in trace["traceEvents"])
+    # Only the first call writes
+    assert tracer.write() is None
+
+
+def test_write_keeps_the_newest_traces(make_tracer, kolibri_home, monkeypatch):
+    monkeypatch.setattr(tracer_module, "MAX_TRACE_FILES", 3)
+    trace_dir = kolibri_home / TRACE_DIR
+    trace_dir.mkdir()
+    for i in range(5):
+        old = trace_dir / "startup-old-{}.json".format(i)
+        old.write_text("{}")
+        os.utime(str(old), (i, i))
+    path = make_tracer().write()
+    kept = sorted(name for name in os.listdir(str(trace_dir)) if name.endswith(".json"))
+    assert kept == sorted(
+        [os.path.basename(path), "startup-old-3.json", "startup-old-4.json"]
+    )
+
+
+def test_disabled(make_tracer, monkeypatch, kolibri_home):
+    monkeypatch.setenv(tracer_module.TRACE_ENV, "0")
+    tracer = make_tracer()
+    tracer.instant("event")
+    assert tracer._events == []
+    assert tracer.write() is None
+    assert not (kolibri_home / TRACE_DIR).exists()
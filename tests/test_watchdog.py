@@ -0,0 +1,151 @@
+import http.client
+
+import pytest
+
+
+class App(object):
+    def __init__(self, server_manager):
+        self.server_manager = server_manager
+        self.calls = []
+
+    def on_server_unresponsive(self):
+        self.calls.append("unresponsive")
+
+    def on_server_recovered(self):
+        self.calls.append("recovered")
+
+
+class ServerManager(object):
+    """A server manager of a server in another process."""
+
+    def __init__(self, heartbeat_age=None, can_restart=True):
+        self.heartbeat_age = heartbeat_age
+        self.can_restart = can_restart
+        self.restarts = 0
+
+    def get_heartbeat_age(self):
+        return self.heartbeat_age
+
+    def restart_server(self):
+        self.restarts += 1
+        return self.can_restart
+
+
+@pytest.fixture
+def watchdog(wx, monkeypatch):
+    from kolibri_app import watchdog
+
+    monkeypatch.setattr(watchdog, "wx", wx)
+    return watchdog
+
+
+@pytest.fixture
+def probes(watchdog, monkeypatch):
+    """Results of the next probes, a latency in seconds or None for a failure."""
+    results = []
+
+    def probe(port, timeout):
+        latency = results.pop(0)
+        if latency is None:
+            raise http.client.HTTPException("HTTP 502")
+        return latency
+
+    monkeypatch.setattr(watchdog, "probe", probe)
+    return results
+
+
+@pytest.fixture
+def make_watchdog(watchdog):
+    def make(server_manager=None, policy="notify", max_failures=3):
+        dog = watchdog.ServerWatchdog(App(server_manager or ServerManager()), 8080)
+        dog.policy = policy
+        dog.max_failures = max_failures
+        dog.timeout = 5
+        return dog
+
+    return make
+
+
+def run_checks(dog, probes, results):
+    probes.extend(results)
+    for _ in results:
+        dog.check()
+
+
+def test_hung_after_consecutive_failures(make_watchdog, probes):
+    dog = make_watchdog()
+    run_checks(dog, probes, [None, None])
+    assert not dog.hung
+    run_checks(dog, probes, [None])
+    assert dog.hung
+    assert dog.app.calls == ["unresponsive"]
+    # Reported once, not on every failure after that
+    run_checks(dog, probes, [None, None])
+    assert dog.app.calls == ["unresponsive"]
+
+
+def test_success_resets_the_count(make_watchdog, probes):
+    dog = make_watchdog()
+    run_checks(dog, probes, [None, None, 0.01, None, None])
+    assert not dog.hung
+    assert dog.failures == 2
+    assert dog.app.calls == []
+
+
+def test_recovery(make_watchdog, probes):
+    dog = make_watchdog()
+    run_checks(dog, probes, [None, None, None, 0.01])
+    assert not dog.hung
+    assert dog.failures == 0
+    assert dog.app.calls == ["unresponsive", "recovered"]
+
+
+def test_restart_policy(make_watchdog, probes):
+    manager = ServerManager()
+    dog = make_watchdog(manager, policy="restart")
+    run_checks(dog, probes, [None, None, None])
+    assert manager.restarts == 1
+    assert dog.app.calls == []
+    assert dog._stop_event.is_set()
+
+
+def test_restart_policy_notifies_if_it_cannot_restart(make_watchdog, probes):
+    manager = ServerManager(can_restart=False)
+    dog = make_watchdog(manager, policy="restart")
+    run_checks(dog, probes, [None, None, None])
+    assert manager.restarts == 1
+    assert dog.app.calls == ["unresponsive"]
+
+
+def test_none_policy_only_logs(make_watchdog, probes):
+    manager = ServerManager()
+    dog = make_watchdog(manager, policy="none")
+    run_checks(dog, probes, [None, None, None])
+    assert dog.hung
+    assert manager.restarts == 0
+    assert dog.app.calls == []
+
+
+def test_diagnosis(make_watchdog):
+    dog = make_watchdog(ServerManager(heartbeat_age=1))
+    dog.interval = 15
+    assert "process is alive" in dog.diagnose()
+    dog.app.server_manager.heartbeat_age = 60
+    assert "nor IPC messages" in dog.diagnose()
+    dog.app.server_manager.heartbeat_age = None
+    assert "nor IPC messages" in dog.diagnose()
+    dog.app.server_manager = object()
+    assert "server thread in the app process" in dog.diagnose()
+
+
+def test_histogram(watchdog):
+    histogram = watchdog.LatencyHistogram(size=4)
+    for latency in (0.5, 0.005, None, 0.02, 0.2):
+        histogram.add(latency)
+    snapshot = histogram.snapshot()
+    # The oldest sample is gone
+    assert snapshot["count"] == 4
+    assert snapshot["failures"] == 1
+    assert snapshot["buckets"][:5] == [1, 1, 0, 0, 1]
+    assert (snapshot["p50"], snapshot["max"]) == (20, 200)
+    assert watchdog.LatencyHistogram().summary() == "0 probes, all failed"
@@ -0,0 +1,27 @@
+import getpass
+
+import pytest
+
+from kolibri_app.webview_data import get_user_dir_name
+
+
+@pytest.mark.parametrize(
+    "user,name",
+    [
+        ("learner", "learner"),
+        ("DOMAIN\\learner", "DOMAIN_learner"),
+        ("..", "_"),
+        ("a:b*c", "a_b_c"),
+    ],
+)
+def test_user_dir_name(monkeypatch, user, name):
+    monkeypatch.setattr(getpass, "getuser", lambda: user)
+    assert get_user_dir_name() == name
+
+
+def test_user_dir_name_without_user(monkeypatch):
+    def getuser():
+        raise OSError("No username set in the environment")
+
+    monkeypatch.setattr(getpass, "getuser", getuser)
+    assert get_user_dir_name() == "default"